@@ -1,19 +1,233 @@
 import operator
+import threading
+import time
+import ijson
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Iterator
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import serialization
+import tracing
+from adaptive_date_search import adaptive_date_search, cheapest_fare
+from flight_info import FlightSearchParameters, RequestTiming
+from response_cache import ResponseCache
+
+
+class AmadeusAPIError(Exception):
+    """Raised when an Amadeus request fails after its retries are exhausted."""
+
+class _RecordingReader:
+    """File-like wrapper of a response stream that keeps every chunk read from it."""
+    def __init__(self, raw):
+        self.raw = raw
+        self.chunks: list[bytes] = []
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.raw.read(size)
+        self.chunks.append(chunk)
+        return chunk
+
+
+class FlightOfferStream:
+    """
+    Iterates over the offers of a flight-offers response while it downloads, decoding one offer at a time from the
+    response stream so that memory stays flat regardless of the payload size. `meta` and `dictionaries` are filled in
+    once they have been read, which for Amadeus responses is after the last offer.
+    When `on_complete` is given, the raw JSON body is also kept as it is read, and handed to it once the stream has
+    been read to the end, e.g. to add it to the response cache. The body is several times smaller than the offers
+    decoded from it, which are never kept.
+    """
+    SECTIONS = {'meta': 'meta', 'data.item': 'data', 'dictionaries': 'dictionaries'}
+
+    def __init__(self, response: requests.Response = None, flight_results: dict = None,
+                 on_close: Callable[[requests.Response, int], None] = None,
+                 on_complete: Callable[[bytes], None] = None):
+        self.response = response
+        self.flight_results = flight_results
+        self.on_close = on_close
+        self.on_complete = on_complete
+        self.meta = dict()
+        self.dictionaries = dict()
+        self.num_offers = 0
+
+    def __iter__(self) -> Iterator[dict]:
+        if self.flight_results is not None:
+            self.meta = self.flight_results.get('meta', {})
+            self.dictionaries = self.flight_results.get('dictionaries', {})
+            self.num_offers = len(self.flight_results.get('data', []))
+            yield from self.flight_results.get('data', [])
+            return
+
+        # Lets urllib3 undo the gzip/deflate content encoding on the raw stream
+        self.response.raw.decode_content = True
+        builder, section = None, None
+        body = _RecordingReader(self.response.raw) if self.on_complete is not None else self.response.raw
+        try:
+            for prefix, event, value in ijson.parse(body, use_float=True):
+                if builder is None:
+                    if prefix in self.SECTIONS and event == 'start_map':
+                        builder, section = ijson.ObjectBuilder(), prefix
+                    else:
+                        continue
+                builder.event(event, value)
+                if prefix == section and event == 'end_map':
+                    if section == 'data.item':
+                        self.num_offers += 1
+                        yield builder.value
+                    else:
+                        setattr(self, self.SECTIONS[section], builder.value)
+                    builder, section = None, None
+            if self.on_complete is not None:
+                # Only reached when the whole body was read, an abandoned stream is never handed over half-way
+                self.on_complete(b''.join(body.chunks))
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.response is not None and self.on_close is not None:
+            self.on_close(self.response, self.response.raw.tell())
+            self.on_close = None
+        if self.response is not None:
+            self.response.close()
+
+
+class RateLimiter:
+    """
+    Thread-safe client-side limiter that spaces out calls so that no more than `rate` of them start per second.
+    Amadeus enforces its quota per API key, so clients get a process-wide limiter per credentials through
+    `for_credentials`, shared like their AmadeusTokenManager.
+    """
+    _registry: dict[tuple[str, str], 'RateLimiter'] = dict()
+    _registry_lock = threading.Lock()
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError("The rate limit must be a positive number of requests per second.")
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_credentials(cls, auth_endpoint: str, auth_payload: str, rate: float) -> 'RateLimiter':
+        """
+        Returns the limiter of these credentials, creating it with `rate` for their first client. Later clients share
+        it as is, whatever rate they ask for, since the quota they draw from is the same.
+        """
+        key = (auth_endpoint, auth_payload)
+        with cls._registry_lock:
+            if key not in cls._registry:
+                cls._registry[key] = cls(rate)
+            return cls._registry[key]
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class AmadeusTokenManager:
+    """
+    Process-wide cache of Amadeus OAuth tokens, shared by every client using the same credentials.
+    Tokens are reused until shortly before `expires_in` elapses, and concurrent callers that hit an expired token
+    wait on a single refresh instead of each posting to the OAuth endpoint.
+    """
+    EXPIRY_MARGIN_SECONDS = 60
+    _registry: dict[tuple[str, str], 'AmadeusTokenManager'] = dict()
+    _registry_lock = threading.Lock()
+
+    def __init__(self, auth_endpoint: str, auth_payload: str, auth_header: dict[str, str]):
+        self.auth_endpoint = auth_endpoint
+        self.auth_payload = auth_payload
+        self.auth_header = auth_header
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_credentials(cls, auth_endpoint: str, auth_payload: str,
+                        auth_header: dict[str, str]) -> 'AmadeusTokenManager':
+        key = (auth_endpoint, auth_payload)
+        with cls._registry_lock:
+            if key not in cls._registry:
+                cls._registry[key] = cls(auth_endpoint, auth_payload, auth_header)
+            return cls._registry[key]
+
+    def _valid_token(self) -> dict[str, str] | None:
+        # Read once, an invalidate() from another thread between the check and the return must not make it None
+        token, expires_at = self._token, self._expires_at
+        return token if token is not None and time.monotonic() < expires_at else None
+
+    def _request_token(self, send: Callable[..., requests.Response]) -> dict[str, str]:
+        auth = None
+        try:
+            auth = send('POST', self.auth_endpoint, headers=self.auth_header, data=self.auth_payload)
+            auth.raise_for_status()
+        except requests.RequestException as e:
+            raise AmadeusAPIError(f"Failed to get an access token.\n"
+                                  f"Response Body: {auth.text if auth is not None else e}") from e
+        return serialization.loads(auth.content)
+
+    def get_token(self, send: Callable[..., requests.Response]) -> dict[str, str]:
+        """
+        Returns a valid token, requesting a new one through `send(method, url, **kwargs)` when the cached one expired.
+        """
+        token = self._valid_token()
+        if token is not None:
+            return token
+        with self._lock:
+            # Another caller may have refreshed the token while we were waiting on the lock
+            token = self._valid_token()
+            if token is None:
+                requested_at = time.monotonic()
+                with tracing.span('amadeus.auth'):
+                    token = self._request_token(send)
+                lifetime = float(token.get('expires_in', 0)) - self.EXPIRY_MARGIN_SECONDS
+                self._expires_at = requested_at + max(lifetime, 0)
+                self._token = token
+            return token
+
+    def invalidate(self, token: dict[str, str] = None) -> None:
+        """
+        Drops the cached token. When `token` is given, only drops it if it is still the cached one, so a caller
+        holding a stale token does not discard a token that another caller has just refreshed.
+        """
+        with self._lock:
+            if token is None or token is self._token:
+                self._token = None
+                self._expires_at = 0.0
 
-from flight_info import FlightSearchParameters
 
 class AmadeusFlightSearch:
     DATE_FORMAT = "%Y-%m-%d"
+    API_HOST_TEMPLATE = "https://<env>api.amadeus.com"
     AUTH_ENDPOINT_TEMPLATE = "https://<env>api.amadeus.com/v1/security/oauth2/token"
     AUTH_HEADER = {'Content-Type': 'application/x-www-form-urlencoded'}
     FLIGHTS_ENDPOINT_TEMPLATE = "https://<env>api.amadeus.com/<version>/shopping/flight-offers?"
 
     VALID_OPERATORS = {'earlier': operator.sub, 'later': operator.add}
+    # Amadeus Self-Service transactions-per-second quotas per environment
+    DEFAULT_RATE_LIMITS = {'test': 10, 'prod': 40}
+
+    TIMEOUT = (5, 30)  # (connect, read) in seconds
+    MAX_RETRIES = 3
+    BACKOFF_FACTOR = 0.5
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    MAX_TIMINGS = 1000
 
-    def __init__(self, search_params: FlightSearchParameters):
+    def __init__(self, search_params: FlightSearchParameters, session: requests.Session = None,
+                 cache: ResponseCache = None):
         self.search_params = search_params
+        self.cache = cache
+        self.session = session or self.make_session(max(search_params.pool_size, search_params.max_workers or 1))
+        self.request_timings: deque[RequestTiming] = deque(maxlen=self.MAX_TIMINGS)
         self.departure_date = datetime.strptime(search_params.departure_date, self.DATE_FORMAT)
 
         if search_params.return_date:
@@ -37,19 +251,70 @@ class AmadeusFlightSearch:
         else:
             raise ValueError('Environment argument must be either "test" or "prod".')
 
+        if search_params.base_url:
+            # e.g. a local mock_amadeus.MockAmadeusServer, the env still picks the default rate limit
+            api_host = self.API_HOST_TEMPLATE.replace('<env>', 'test.' if search_params.env == 'test' else '')
+            self.auth_endpoint = self.auth_endpoint.replace(api_host, search_params.base_url.rstrip('/'))
+            self.flight_endpoint = self.flight_endpoint.replace(api_host, search_params.base_url.rstrip('/'))
+
+        self.token_manager = AmadeusTokenManager.for_credentials(self.auth_endpoint, self.auth_payload,
+                                                                 self.AUTH_HEADER)
+        self.rate_limiter = RateLimiter.for_credentials(self.auth_endpoint, self.auth_payload,
+                                                        search_params.max_requests_per_second or
+                                                        self.DEFAULT_RATE_LIMITS[search_params.env])
+
+    @classmethod
+    def make_session(cls, pool_size: int = 10) -> requests.Session:
+        """
+        Creates a keep-alive session with a connection pool of `pool_size` per host that retries 429/5xx responses
+        with exponential backoff, honoring any Retry-After header sent by Amadeus.
+        """
+        retry = Retry(total=cls.MAX_RETRIES, backoff_factor=cls.BACKOFF_FACTOR,
+                      status_forcelist=cls.RETRY_STATUS_CODES, allowed_methods=frozenset({'GET', 'POST'}),
+                      respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+        return session
+
+    def _send(self, method: str, url: str, stream: bool = False, **kwargs) -> requests.Response:
+        """
+        Sends a request through the pooled session and records its timing. `response.elapsed` stops once the response
+        headers are parsed, so it covers connecting (when no pooled connection is free) and waiting on the server,
+        while the remainder of the wall time is spent downloading and decoding the body. Streamed responses are timed
+        by `_record_timing` once their body has been consumed.
+        """
+        start = time.perf_counter()
+        response = self.session.request(method, url, timeout=self.TIMEOUT, stream=stream, **kwargs)
+        response.request_start = start
+        if not stream:
+            response.content  # Reads the body so the transfer time is part of the measurement
+            self._record_timing(response, num_bytes=response.raw.tell())
+        return response
+
+    def _record_timing(self, response: requests.Response, num_bytes: int) -> None:
+        total_seconds = time.perf_counter() - response.request_start
+        time_to_headers_seconds = response.elapsed.total_seconds()
+        self.request_timings.append(RequestTiming(method=response.request.method, url=response.request.url,
+                                                  status_code=response.status_code,
+                                                  time_to_headers_seconds=time_to_headers_seconds,
+                                                  transfer_seconds=max(total_seconds - time_to_headers_seconds, 0.0),
+                                                  total_seconds=total_seconds, num_bytes=num_bytes))
+        tracing.increment('api_requests', method=response.request.method, status=response.status_code)
+        tracing.increment('payload_bytes', num_bytes)
+
     def _get_access_token(self) -> dict[str, str]:
-        try:
-            auth = requests.post(self.auth_endpoint, headers=self.AUTH_HEADER, data=self.auth_payload)
-            auth.raise_for_status()
-        except requests.RequestException as e:
-            raise SystemExit(f"Failed to make the request.\nResponse Body: {auth.text}")
-        return auth.json()
+        return self.token_manager.get_token(self._send)
 
-    def make_search_url(self, departure_date: datetime, return_date: datetime | str) -> str:
+    def make_search_url(self, departure_date: datetime, return_date: datetime | str, origin: str = None,
+                        destination: str = None) -> str:
         # TODO: Expose the most used parameters as needed
         search_params = {
-            'originLocationCode': self.search_params.origin,
-            'destinationLocationCode': self.search_params.destination,
+            'originLocationCode': origin or self.search_params.origin,
+            'destinationLocationCode': destination or self.search_params.destination,
             'departureDate': str(departure_date.date()),
             'adults': self.search_params.adults_passengers,
             'children': 0,
@@ -69,44 +334,153 @@ class AmadeusFlightSearch:
             operation = self.VALID_OPERATORS.get(self.search_params.direction)
             return operation(date, timedelta(days=days_to_adjust_by))
 
-    def _get_headers(self) -> dict[str, str]:
-        auth = self._get_access_token()
+    @staticmethod
+    def _get_headers(auth: dict[str, str]) -> dict[str, str]:
         return {'Authorization': f"{auth['token_type']} {auth['access_token']}"}
 
     def find_flights(self, url: str) -> dict[str, str]:
+        with tracing.span('amadeus.find_flights') as span:
+            if self.cache is not None:
+                cache_key = self.cache.make_key(url)
+                cached_results = self.cache.get(cache_key)
+                tracing.increment('cache_lookups', hit=cached_results is not None)
+                if cached_results is not None:
+                    span.set(cached=True)
+                    return cached_results
+
+            flight_results = self._request_flights(url)
+            span.set(cached=False, num_offers=len(flight_results.get('data', [])))
+            if self.cache is not None:
+                self.cache.set(cache_key, flight_results)
+            return flight_results
+
+    def stream_flights(self, url: str) -> FlightOfferStream:
+        """
+        Like `find_flights`, but returns a FlightOfferStream that yields the offers while the response downloads.
+        Cached responses are replayed from the cache, and with a cache the streamed response is added to it once it has
+        been read to the end, so other sessions and later searches can reuse it.
+        """
+        on_complete = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(url)
+            cached_results = self.cache.get(cache_key)
+            tracing.increment('cache_lookups', hit=cached_results is not None)
+            if cached_results is not None:
+                return FlightOfferStream(flight_results=cached_results)
+            on_complete = partial(self.cache.set_serialized, cache_key)
+        return FlightOfferStream(response=self._send_flight_request(url, stream=True), on_close=self._record_timing,
+                                 on_complete=on_complete)
+
+    def _request_flights(self, url: str) -> dict[str, str]:
+        response = self._send_flight_request(url)
+        with tracing.span('amadeus.decode', num_bytes=len(response.content)):
+            return serialization.loads(response.content)
+
+    def _send_flight_request(self, url: str, stream: bool = False) -> requests.Response:
+        flight_results = None
         try:
-            flight_results = requests.get(url, headers=self._get_headers(), timeout=30)
+            auth = self._get_access_token()
+            self.rate_limiter.acquire()
+            flight_results = self._send('GET', url, stream=stream, headers=self._get_headers(auth))
+            if flight_results.status_code == 401:
+                # The token was revoked or expired early, refresh it once and retry
+                flight_results.close()
+                self.token_manager.invalidate(auth)
+                auth = self._get_access_token()
+                self.rate_limiter.acquire()
+                flight_results = self._send('GET', url, stream=stream, headers=self._get_headers(auth))
             flight_results.raise_for_status()
-        except requests.exceptions.Timeout:
-            raise SystemExit("The request timed out. Please try again.")
+        except requests.exceptions.Timeout as e:
+            raise AmadeusAPIError("The request timed out. Please try again.") from e
         except requests.RequestException as e:
-            raise SystemExit(f"Failed to make the request.\nResponse Body: {flight_results.text}")
-        return flight_results.json()
+            raise AmadeusAPIError(f"Failed to make the request.\n"
+                                  f"Response Body: {flight_results.text if flight_results is not None else e}") from e
+        return flight_results
 
     def single_flight_search(self) -> dict[str, any]:
         url = self.make_search_url(departure_date=self.departure_date, return_date=self.return_date)
         return self.find_flights(url)
 
-    def single_direction_bulk_flight_search(self, inclusive_search: bool) -> dict[str, dict[str, any]]:
+    def single_flight_search_stream(self) -> FlightOfferStream:
+        url = self.make_search_url(departure_date=self.departure_date, return_date=self.return_date)
+        return self.stream_flights(url)
+
+    @staticmethod
+    def make_search_key(origin: str, destination: str, departure_date: datetime, return_date: datetime | str) -> str:
+        if type(return_date) == datetime:
+            return f"{origin}-to-{destination} ({departure_date.date()}/{return_date.date()})"
+        return f"{origin}-to-{destination} ({departure_date.date()}/{return_date})"
+
+    def plan_travel_dates(self, inclusive_search: bool) -> list[tuple[datetime, datetime | str]]:
+        """
+        Shifts the departure and return dates by one to `search_range` days in the search direction, starting with the
+        original dates when `inclusive_search` is True.
+        """
         start = 0 if inclusive_search else 1
+        return [(self._adjust_travel_day(self.departure_date, days_to_adjust_by=i),
+                 self._adjust_travel_day(self.return_date, days_to_adjust_by=i))
+                for i in range(start, self.search_params.search_range + 1)]
 
-        response_dict = dict()
-        for i in range(start, self.search_params.search_range + 1):
-            print(f"Running a {i} day {self.search_params.direction} scenario...")
-            departure_date = self._adjust_travel_day(self.departure_date, days_to_adjust_by=i)
-            return_date = self._adjust_travel_day(self.return_date, days_to_adjust_by=i)
+    def _plan_single_direction_searches(self, inclusive_search: bool) -> list[tuple[str, str]]:
+        planned_searches = []
+        for departure_date, return_date in self.plan_travel_dates(inclusive_search):
             url = self.make_search_url(departure_date, return_date)
-            if type(return_date) == datetime:
-                key = f"{self.search_params.origin}-to-{self.search_params.destination} ({departure_date.date()}/{return_date.date()})"
-            else:
-                key = f"{self.search_params.origin}-to-{self.search_params.destination} ({departure_date.date()}/{return_date})"
-            response_dict[key] = self.find_flights(url)
-        return response_dict
+            key = self.make_search_key(self.search_params.origin, self.search_params.destination, departure_date,
+                                       return_date)
+            planned_searches.append((key, url))
+        return planned_searches
+
+    def run_searches(self, planned_searches: list[tuple[str, str]]) -> dict[str, dict[str, any]]:
+        """
+        Runs the planned (key, url) searches, concurrently when `max_workers` is greater than one, and returns the
+        responses keyed in the same order as the plan.
+        """
+        max_workers = self.search_params.max_workers or 1
+        if max_workers == 1 or len(planned_searches) <= 1:
+            response_dict = dict()
+            for key, url in planned_searches:
+                response_dict[key] = self.find_flights(url)
+            return response_dict
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(planned_searches))) as executor:
+            futures = [(key, executor.submit(self.find_flights, url)) for key, url in planned_searches]
+            return {key: future.result() for key, future in futures}
+
+    def single_direction_bulk_flight_search(self, inclusive_search: bool) -> dict[str, dict[str, any]]:
+        return self.run_searches(self._plan_single_direction_searches(inclusive_search))
+
+    def adaptive_bulk_flight_search(self, inclusive_search: bool, max_requests: int = None,
+                                    coarse_step: int = None) -> dict[str, dict[str, any]]:
+        """
+        Like `single_direction_bulk_flight_search`, but only queries the dates picked by `adaptive_date_search`: a
+        sparse pass over the window, then refinements around the cheapest dates and the price jumps, up to
+        `max_requests` searches. Each refinement round runs up to `max_workers` searches concurrently.
+        :return: The responses of the queried dates only, keyed and ordered like the other bulk searches, so the keys
+        report which dates were actually queried.
+        """
+        planned_searches = self._plan_single_direction_searches(inclusive_search)
+        responses = dict()
+
+        def price_of(offsets: list[int]) -> dict[int, float | None]:
+            batch = self.run_searches([planned_searches[offset] for offset in offsets])
+            responses.update(batch)
+            return {offset: cheapest_fare(batch[planned_searches[offset][0]]) for offset in offsets}
+
+        with tracing.span('amadeus.adaptive_search', num_dates=len(planned_searches)) as span:
+            adaptive_date_search(price_of, len(planned_searches), max_requests=max_requests, coarse_step=coarse_step,
+                                 batch_size=self.search_params.max_workers or 1)
+            span.set(num_queried=len(responses))
+        return {key: responses[key] for key, _ in planned_searches if key in responses}
 
     def dual_direction_bulk_flight_search(self) -> list[dict]:
+        # Both directions are planned up front so that they share a single pool of workers
         self.search_params.direction = 'earlier'
-        earlier_departure_responses = self.single_direction_bulk_flight_search(inclusive_search=True)
+        earlier_searches = self._plan_single_direction_searches(inclusive_search=True)
 
         self.search_params.direction = 'later'
-        later_departure_responses = self.single_direction_bulk_flight_search(inclusive_search=False)
+        later_searches = self._plan_single_direction_searches(inclusive_search=False)
+
+        responses = self.run_searches(earlier_searches + later_searches)
+        earlier_departure_responses = {key: responses[key] for key, _ in earlier_searches}
+        later_departure_responses = {key: responses[key] for key, _ in later_searches}
         return [earlier_departure_responses, later_departure_responses]
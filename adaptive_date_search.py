@@ -0,0 +1,121 @@
+import math
+import numpy as np
+import pandas as pd
+from typing import Callable
+
+PriceLookup = Callable[[list[int]], dict[int, float | None]]
+
+
+def cheapest_fare(flight_results: dict) -> float | None:
+    prices = [float(offer['price']['total']) for offer in flight_results.get('data', [])]
+    return min(prices) if prices else None
+
+
+def default_search_budget(num_dates: int) -> int:
+    # A third of the window, and never less than the coarse pass plus a few refinements
+    return max(math.ceil(num_dates / 3), default_coarse_step(num_dates) + 3)
+
+
+def default_coarse_step(num_dates: int) -> int:
+    return max(2, round(math.sqrt(num_dates)))
+
+
+def _gap_priority(low_price: float | None, high_price: float | None) -> float:
+    """
+    Estimated lowest fare inside a gap between two queried dates, lower is refined first. The cheaper end is the
+    baseline and half of the price jump across the gap is subtracted, so both cheap regions and discontinuities (a fare
+    bucket opening or closing somewhere in between) get refined before flat stretches.
+    """
+    prices = [price for price in (low_price, high_price) if price is not None]
+    if not prices:
+        return math.inf
+    return min(prices) - (max(prices) - min(prices)) / 2
+
+
+def adaptive_date_search(price_of: PriceLookup, num_dates: int, max_requests: int = None, coarse_step: int = None,
+                         batch_size: int = 1) -> dict[int, float | None]:
+    """
+    Coarse-to-fine search for the cheapest travel date among offsets 0..num_dates-1. The window is first sampled every
+    `coarse_step` dates (ends included, thinned evenly when the budget can't cover every sample), then the remaining budget goes to the midpoints of the most promising gaps
+    between queried dates, `batch_size` at a time so the lookups of a round can run concurrently.
+    :param price_of: Looks up the cheapest fare of each given offset, None when a date has no offers.
+    :param num_dates: Number of dates in the window.
+    :param max_requests: Maximum number of dates to look up, `default_search_budget` by default.
+    :param coarse_step: Spacing of the initial samples, `default_coarse_step` by default.
+    :param batch_size: Number of dates looked up per refinement round.
+    :return: The cheapest fare of every queried offset, in offset order.
+    """
+    max_requests = default_search_budget(num_dates) if max_requests is None else max_requests
+    coarse_step = coarse_step or default_coarse_step(num_dates)
+
+    coarse_offsets = sorted(set(range(0, num_dates, coarse_step)) | {num_dates - 1})
+    if len(coarse_offsets) > max_requests:
+        # Thin the grid evenly rather than truncating it, so a small budget still samples the whole window
+        coarse_offsets = sorted({coarse_offsets[i] for i in
+                                 np.linspace(0, len(coarse_offsets) - 1, max_requests).round().astype(int)})
+    prices = price_of(coarse_offsets)
+
+    while len(prices) < min(max_requests, num_dates):
+        queried = sorted(prices)
+        gaps = [(_gap_priority(prices[low], prices[high]), -(high - low), low, high)
+                for low, high in zip(queried, queried[1:]) if high - low > 1]
+        if not gaps:
+            break
+        num_lookups = min(batch_size, max_requests - len(prices), len(gaps))
+        prices.update(price_of([(low + high) // 2 for _, _, low, high in sorted(gaps)[:num_lookups]]))
+    return dict(sorted(prices.items()))
+
+
+def synthetic_price_curve(num_dates: int = 60, seed: int = 0) -> np.ndarray:
+    """
+    Generates a fare curve shaped like real date-price data: a base fare, weekly seasonality, a few step changes where
+    fare buckets open or close, and day-to-day noise.
+    """
+    rng = np.random.default_rng(seed)
+    days = np.arange(num_dates)
+    curve = rng.uniform(200, 600) + rng.uniform(10, 60) * np.sin(2 * np.pi * (days + rng.integers(7)) / 7)
+    for step_day in rng.choice(num_dates, size=rng.integers(1, 5), replace=False):
+        curve[step_day:] += rng.normal(0, 80)
+    curve += rng.normal(0, 8, num_dates)
+    return np.maximum(curve, 50).round(2)
+
+
+def simulate_adaptive_search(price_curve: np.ndarray, max_requests: int = None,
+                             coarse_step: int = None) -> dict[str, float]:
+    """
+    Runs the adaptive search against a known price curve.
+    :return: The number of lookups, the fraction of lookups saved compared to querying every date, the best fare found,
+    the true best fare and the regret (relative extra cost of the found date over the best one).
+    """
+    queried_prices = adaptive_date_search(lambda offsets: {offset: float(price_curve[offset]) for offset in offsets},
+                                          len(price_curve), max_requests=max_requests, coarse_step=coarse_step)
+    best_found, true_best = min(queried_prices.values()), float(price_curve.min())
+    return {'num_requests': len(queried_prices), 'requests_saved': 1 - len(queried_prices) / len(price_curve),
+            'best_found': best_found, 'true_best': true_best, 'regret': best_found / true_best - 1}
+
+
+def _uniform_regret(price_curve: np.ndarray, num_requests: int) -> float:
+    offsets = np.linspace(0, len(price_curve) - 1, num_requests).round().astype(int)
+    return float(price_curve[offsets].min() / price_curve.min() - 1)
+
+
+def run_simulation(num_trials: int = 200, num_dates: int = 60, budgets: list[int] = None) -> pd.DataFrame:
+    """
+    Measures requests saved against regret over `num_trials` synthetic price curves for each budget.
+    :return: One row per budget with the mean fraction of requests saved, the mean and 95th percentile regret, how
+    often the true cheapest date was found and, as a baseline, the mean regret of evenly spaced lookups.
+    """
+    budgets = budgets or [default_coarse_step(num_dates) + 3, default_search_budget(num_dates), num_dates // 2]
+    curves = [synthetic_price_curve(num_dates, seed) for seed in range(num_trials)]
+    rows = []
+    for budget in budgets:
+        results = pd.DataFrame([simulate_adaptive_search(curve, max_requests=budget) for curve in curves])
+        rows.append({'max_requests': budget, 'requests_saved': results['requests_saved'].mean(),
+                     'mean_regret': results['regret'].mean(), 'p95_regret': results['regret'].quantile(0.95),
+                     'found_best': (results['regret'] == 0).mean(),
+                     'uniform_mean_regret': np.mean([_uniform_regret(curve, budget) for curve in curves])})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    print(run_simulation().to_string(index=False))
@@ -0,0 +1,126 @@
+import numpy as np
+from rapidfuzz import fuzz, utils, process
+
+
+class AirportAutocomplete:
+    """
+    Fuzzy autocomplete over a fixed set of candidate names (municipalities, airport names, IATA codes, countries).
+    Candidates are normalized and token-sorted once at construction, so scoring a keystroke is a plain `fuzz.ratio`
+    (equivalent to `token_sort_ratio` with `default_process`) over the few hundred candidates that share the most
+    trigrams with the query, instead of re-processing the full candidate list.
+    """
+    MAX_PREFILTER_CANDIDATES = 256
+    # Candidate ids counted per keystroke, the rarest postings are used first
+    MAX_PREFILTER_IDS = 4096
+    PREFIX_LENGTH = 2
+
+    def __init__(self, labels: list[str], kinds: list[str], rows: list[int]):
+        """
+        :param labels: Candidate display names.
+        :param kinds: Kind of each candidate (e.g. "municipality", "airport", "iata", "country").
+        :param rows: Airport data row each candidate refers to.
+        """
+        self.labels = labels
+        self.kinds = np.array(kinds, dtype=object)
+        self.rows = np.array(rows, dtype=int)
+        self.sorted_labels = [self._sort_tokens(utils.default_process(label)) for label in labels]
+
+        trigram_postings: dict[str, list[int]] = dict()
+        prefix_postings: dict[str, list[int]] = dict()
+        for candidate_id, label in enumerate(self.sorted_labels):
+            for trigram in self._trigrams(label):
+                trigram_postings.setdefault(trigram, []).append(candidate_id)
+            for prefix in {token[:length] for token in label.split()
+                           for length in range(1, self.PREFIX_LENGTH + 1)}:
+                prefix_postings.setdefault(prefix, []).append(candidate_id)
+        self.trigram_index = {k: np.array(v, dtype=np.int32) for k, v in trigram_postings.items()}
+        self.prefix_index = {k: np.array(v, dtype=np.int32) for k, v in prefix_postings.items()}
+
+    @classmethod
+    def from_airport_index(cls, airport_index) -> 'AirportAutocomplete':
+        labels, kinds, rows = [], [], []
+        seen = set()
+        for kind, values in (('municipality', airport_index.municipalities), ('airport', airport_index.names),
+                             ('iata', airport_index.iata_codes), ('country', airport_index.country_names)):
+            for row, label in enumerate(values):
+                # Municipalities and countries repeat across airports, only their first airport is kept
+                if label and (kind, label) not in seen:
+                    seen.add((kind, label))
+                    labels.append(label)
+                    kinds.append(kind)
+                    rows.append(row)
+        return cls(labels, kinds, rows)
+
+    @staticmethod
+    def _sort_tokens(processed: str) -> str:
+        return ' '.join(sorted(processed.split()))
+
+    @staticmethod
+    def _trigrams(processed: str) -> set[str]:
+        padded = f"  {processed} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def _prefilter(self, sorted_query: str) -> np.ndarray:
+        if len(sorted_query.replace(' ', '')) < 3:
+            postings = [self.prefix_index.get(token[:self.PREFIX_LENGTH]) for token in sorted_query.split()]
+        else:
+            postings = [self.trigram_index.get(trigram) for trigram in self._trigrams(sorted_query)]
+        postings = sorted((posting for posting in postings if posting is not None), key=len)
+        if not postings:
+            return np.empty(0, dtype=np.int32)
+
+        # Common trigrams (e.g. " sa" in a 100k-name corpus) have postings of thousands of ids that barely narrow the
+        # candidates, counting them dominated the keystroke. The label being typed holds every trigram of the query, so
+        # it is in the rarest postings too.
+        num_ids = np.cumsum([len(posting) for posting in postings])
+        postings = postings[:max(int(np.searchsorted(num_ids, self.MAX_PREFILTER_IDS, side='right')), 1)]
+        if len(postings) == 1:
+            return postings[0][:self.MAX_PREFILTER_CANDIDATES]
+
+        candidate_ids, counts = np.unique(np.concatenate(postings), return_counts=True)
+        if len(candidate_ids) > self.MAX_PREFILTER_CANDIDATES:
+            top = np.argpartition(counts, -self.MAX_PREFILTER_CANDIDATES)[-self.MAX_PREFILTER_CANDIDATES:]
+            candidate_ids = candidate_ids[top]
+        return candidate_ids
+
+    def suggest(self, query: str, limit: int = 5, score_cutoff: float = 60,
+                kinds: tuple[str, ...] = None) -> list[tuple[str, float, str, int]]:
+        """
+        Ranks the candidates most similar to `query`.
+        :param query: Raw user input.
+        :param limit: Maximum number of suggestions.
+        :param score_cutoff: Minimum score (0-100) for a suggestion, lower scoring candidates are skipped early.
+        :param kinds: Optional subset of candidate kinds to consider.
+        :return: A list of (label, score, kind, airport row) tuples, best first.
+        """
+        sorted_query = self._sort_tokens(utils.default_process(query))
+        if not sorted_query:
+            return []
+
+        candidate_ids = self._prefilter(sorted_query)
+        if kinds is not None:
+            candidate_ids = candidate_ids[np.isin(self.kinds[candidate_ids], kinds)]
+        choices = [self.sorted_labels[candidate_id] for candidate_id in candidate_ids]
+        matches = process.extract(sorted_query, choices, scorer=fuzz.ratio, processor=None, limit=limit,
+                                  score_cutoff=score_cutoff)
+        return [(self.labels[candidate_ids[i]], score, self.kinds[candidate_ids[i]], int(self.rows[candidate_ids[i]]))
+                for _, score, i in matches]
+
+    def suggest_batch(self, queries: list[str], limit: int = 5, score_cutoff: float = 60,
+                      workers: int = -1) -> list[list[tuple[str, float, str, int]]]:
+        """
+        Scores many queries against every candidate at once with `process.cdist`, spreading the work over `workers`
+        threads. Meant for offline batches where the per-query prefilter isn't worth it.
+        """
+        sorted_queries = [self._sort_tokens(utils.default_process(query)) for query in queries]
+        scores = process.cdist(sorted_queries, self.sorted_labels, scorer=fuzz.ratio, processor=None,
+                               score_cutoff=score_cutoff, dtype=np.uint8, workers=workers)
+
+        limit = min(limit, len(self.labels))
+        suggestions = []
+        for query_scores in scores:
+            top = np.argpartition(query_scores, -limit)[-limit:]
+            top = top[np.argsort(query_scores[top])[::-1]]
+            suggestions.append([(self.labels[i], float(query_scores[i]), self.kinds[i], int(self.rows[i]))
+                                for i in top if query_scores[i] > 0])
+        return suggestions
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+import serialization
+
+AIRPORT_DATA_PATH = 'data/airports_data.json'
+AIRPORT_ARTIFACT_DIR = 'data/airports_compiled'
+STRING_FIELDS = ['iata_code', 'name', 'country_code', 'country_name', 'region_name', 'municipality', 'type']
+
+
+def records_to_columns(airport_data: list[dict]) -> dict[str, np.ndarray]:
+    """
+    Converts the airport records into columns: object arrays for the string fields and latitude/longitude in radians,
+    NaN where the coordinates are missing.
+    :param airport_data: List of airport records as stored in the JSON reference data.
+    :return: Dictionary mapping column names to arrays.
+    """
+    columns = {field: np.array([details.get(field) for details in airport_data], dtype=object)
+               for field in STRING_FIELDS}
+    for field in ('latitude', 'longitude'):
+        degrees = np.array([details.get(f'{field}_deg') for details in airport_data], dtype=float)
+        columns[f'{field}_rad'] = np.radians(degrees)
+    return columns
+
+
+def compile_airport_dataset(json_path: str = AIRPORT_DATA_PATH, artifact_dir: str = AIRPORT_ARTIFACT_DIR) -> None:
+    """
+    Compiles the JSON airport data into a directory of `.npy` files that can be memory-mapped: the coordinates in
+    radians and, per string field, an int32 code array indexing into an interned table of the field's unique values.
+    The files are written to a staging directory that is then renamed into place, so workers compiling on the same
+    cold start never expose a half-written artifact to each other.
+    """
+    columns = records_to_columns(serialization.load_file(json_path))
+    parent_dir = os.path.dirname(os.path.abspath(artifact_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=f'.{os.path.basename(artifact_dir)}-', dir=parent_dir)
+    try:
+        os.chmod(staging_dir, 0o755)
+        for field in STRING_FIELDS:
+            values = np.array(['' if value is None else value for value in columns[field]], dtype=str)
+            table, codes = np.unique(values, return_inverse=True)
+            np.save(os.path.join(staging_dir, f'{field}.table.npy'), table)
+            np.save(os.path.join(staging_dir, f'{field}.codes.npy'), codes.astype(np.int32))
+        for field in ('latitude_rad', 'longitude_rad'):
+            np.save(os.path.join(staging_dir, f'{field}.npy'), columns[field])
+        _swap_in_directory(staging_dir, artifact_dir)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _swap_in_directory(staging_dir: str, artifact_dir: str) -> None:
+    # os.replace only renames a directory over a missing or empty one, so an existing artifact is moved aside first
+    stale_dir = None
+    if os.path.isdir(artifact_dir):
+        stale_dir = tempfile.mkdtemp(prefix=f'.{os.path.basename(artifact_dir)}-stale-',
+                                     dir=os.path.dirname(os.path.abspath(artifact_dir)))
+        try:
+            os.replace(artifact_dir, stale_dir)
+        except FileNotFoundError:
+            pass  # Another worker moved it aside first
+    try:
+        os.replace(staging_dir, artifact_dir)
+    except OSError:
+        pass  # Another worker swapped in its own compilation of the same data first
+    finally:
+        if stale_dir is not None:
+            shutil.rmtree(stale_dir, ignore_errors=True)
+
+
+def _artifact_files(artifact_dir: str) -> list[str]:
+    return ([os.path.join(artifact_dir, f'{field}.{part}.npy') for field in STRING_FIELDS for part in ('table', 'codes')]
+            + [os.path.join(artifact_dir, f'{field}.npy') for field in ('latitude_rad', 'longitude_rad')])
+
+
+def is_artifact_current(json_path: str = AIRPORT_DATA_PATH, artifact_dir: str = AIRPORT_ARTIFACT_DIR) -> bool:
+    files = _artifact_files(artifact_dir)
+    if not all(os.path.exists(file) for file in files):
+        return False
+    return min(os.path.getmtime(file) for file in files) >= os.path.getmtime(json_path)
+
+
+def load_airport_artifact(artifact_dir: str = AIRPORT_ARTIFACT_DIR) -> dict[str, np.ndarray]:
+    """
+    Loads the compiled airport data. The coordinates and string codes are memory-mapped, so their pages are shared by
+    every app worker reading the same artifact. The string columns are expanded per process into object arrays of
+    references into the decoded tables, each unique string being a single Python object.
+    """
+    columns = dict()
+    for field in STRING_FIELDS:
+        table = np.load(os.path.join(artifact_dir, f'{field}.table.npy')).astype(object)
+        codes = np.load(os.path.join(artifact_dir, f'{field}.codes.npy'), mmap_mode='r')
+        columns[field] = table[codes]
+    for field in ('latitude_rad', 'longitude_rad'):
+        columns[field] = np.load(os.path.join(artifact_dir, f'{field}.npy'), mmap_mode='r')
+    return columns
+
+
+def load_airport_columns(json_path: str = AIRPORT_DATA_PATH, artifact_dir: str = AIRPORT_ARTIFACT_DIR,
+                         compile_if_stale: bool = True) -> dict[str, np.ndarray]:
+    """
+    Loads the airport columns from the compiled artifact, compiling it first when it is missing or older than the JSON.
+    Falls back to parsing the JSON when the artifact can't be built or read, e.g. on a read-only file system or when
+    another process left a truncated file behind.
+    """
+    try:
+        if not is_artifact_current(json_path, artifact_dir):
+            if not compile_if_stale:
+                return records_to_columns(serialization.load_file(json_path))
+            compile_airport_dataset(json_path, artifact_dir)
+        return load_airport_artifact(artifact_dir)
+    except (OSError, ValueError, EOFError):
+        return records_to_columns(serialization.load_file(json_path))
+
+
+if __name__ == '__main__':
+    compile_airport_dataset()
+    print(f"Compiled {AIRPORT_DATA_PATH} into {AIRPORT_ARTIFACT_DIR}")
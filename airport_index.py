@@ -0,0 +1,141 @@
+import threading
+import numpy as np
+from functools import cached_property
+from sklearn.neighbors import BallTree
+
+import tracing
+from airport_autocomplete import AirportAutocomplete
+from airport_dataset import AIRPORT_ARTIFACT_DIR, AIRPORT_DATA_PATH, STRING_FIELDS, load_airport_columns, \
+    records_to_columns
+
+EARTH_RADIUS_MILES = 3959.0
+
+
+class AirportIndex:
+    """
+    Read-only lookup structures over the airport reference data. Building one loads the data set and fits a BallTree,
+    so the app shares a single instance per process through `get_airport_index` instead of rebuilding it per lookup.
+    """
+    def __init__(self, columns: dict[str, np.ndarray]):
+        """
+        :param columns: Airport columns as produced by `airport_dataset.load_airport_columns`.
+        """
+        self.columns = columns
+        self.iata_codes = columns['iata_code']
+        self.names = columns['name']
+        self.country_codes = columns['country_code']
+        self.country_names = columns['country_name']
+        self.municipalities = columns['municipality']
+        self.types = columns['type']
+
+        self.iata_to_row = {iata_code: row for row, iata_code in enumerate(self.iata_codes)}
+        self.iata_to_airport = {iata_code: f"{name}, {country_code} ({iata_code})" for iata_code, name, country_code
+                                in zip(self.iata_codes, self.names, self.country_codes)}
+
+        self.municipality_to_rows: dict[str, list[int]] = dict()
+        for row, municipality in enumerate(self.municipalities):
+            self.municipality_to_rows.setdefault(municipality, []).append(row)
+        self.unique_cities = list(self.municipality_to_rows.keys())
+        # Airports of a city are often stored with their district, e.g. "Paris (Orly, Val-de-Marne)"
+        self.city_to_rows: dict[str, list[int]] = dict()
+        for municipality, rows in self.municipality_to_rows.items():
+            if municipality:
+                self.city_to_rows.setdefault(self.city_name(municipality), []).extend(rows)
+
+        rad_latitudes, rad_longitudes = columns['latitude_rad'], columns['longitude_rad']
+        self.latitudes = np.degrees(rad_latitudes)
+        self.longitudes = np.degrees(rad_longitudes)
+
+        # The tree only holds airports with known coordinates, `coordinate_rows` maps its points back to data rows
+        self.coordinate_rows = np.flatnonzero(~np.isnan(self.latitudes) & ~np.isnan(self.longitudes))
+        self.airport_coordinates = np.column_stack((self.latitudes[self.coordinate_rows],
+                                                    self.longitudes[self.coordinate_rows]))
+        with tracing.span('airports.build_tree', num_airports=len(self.coordinate_rows)):
+            self.tree = BallTree(np.column_stack((rad_latitudes[self.coordinate_rows],
+                                                  rad_longitudes[self.coordinate_rows])), metric='haversine')
+
+    @classmethod
+    def from_records(cls, airport_data: list[dict]) -> 'AirportIndex':
+        return cls(records_to_columns(airport_data))
+
+    @cached_property
+    def airport_data(self) -> list[dict]:
+        """The airport records as dictionaries, materialized on first access for callers that need whole records."""
+        fields = [field for field in STRING_FIELDS if field in self.columns]
+        return [dict({field: self.columns[field][row] for field in fields},
+                     latitude_deg=float(self.latitudes[row]), longitude_deg=float(self.longitudes[row]))
+                for row in range(len(self))]
+
+    @cached_property
+    def autocomplete(self) -> AirportAutocomplete:
+        return AirportAutocomplete.from_airport_index(self)
+
+    def query_radius(self, coords: tuple[float, float], radius_miles: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the airports within `radius_miles` of `coords`, nearest first.
+        :param coords: Target (latitude, longitude) in degrees.
+        :param radius_miles: Search radius in miles.
+        :return: A tuple of the matching airport data rows and their distances in miles.
+        """
+        rad_target_coords = np.radians(np.asarray(coords, dtype=float).reshape(1, -1))
+        indices, distances = self.tree.query_radius(rad_target_coords, r=radius_miles / EARTH_RADIUS_MILES,
+                                                    return_distance=True, sort_results=True)
+        return self.coordinate_rows[indices[0]], distances[0] * EARTH_RADIUS_MILES
+
+    @staticmethod
+    def city_name(municipality: str) -> str:
+        """Lowercased municipality name without the parenthesized district, e.g. "paris" for "Paris (Orly)"."""
+        return municipality.split('(', 1)[0].strip().lower()
+
+    def municipality_centroid(self, municipality: str) -> tuple[float, float] | None:
+        """
+        Approximates a city's coordinates from its large airports, including those stored under a district of the city
+        (e.g. "Paris (Roissy-en-France, Val-d'Oise)" for "Paris"). Same-named cities are told apart by country and the
+        one with the most large airports wins, so "Paris" is Paris, France rather than Paris, Texas.
+        :param municipality: Municipality name as it appears in the airport data.
+        :return: The (latitude, longitude) centroid in degrees, or None if the city is unknown or has no large airport,
+        in which case only a geocoder can place it reliably.
+        """
+        rows = np.array(self.city_to_rows.get(self.city_name(municipality), []), dtype=int)
+        rows = rows[(self.types[rows] == 'large_airport') & ~np.isnan(self.latitudes[rows]) &
+                    ~np.isnan(self.longitudes[rows])]
+        if not rows.size:
+            return None
+
+        countries, first_rows, counts = np.unique(self.country_codes[rows], return_index=True, return_counts=True)
+        # Ties go to the country listed first in the data
+        country = countries[np.lexsort((first_rows, -counts))[0]]
+        country_rows = rows[self.country_codes[rows] == country]
+        return float(self.latitudes[country_rows].mean()), float(self.longitudes[country_rows].mean())
+
+    def airport_label(self, row: int) -> str:
+        return self.iata_to_airport[self.iata_codes[row]]
+
+    @classmethod
+    def from_json(cls, path: str = AIRPORT_DATA_PATH) -> 'AirportIndex':
+        return cls(load_airport_columns(path, compile_if_stale=False))
+
+    @classmethod
+    def load(cls, path: str = AIRPORT_DATA_PATH, artifact_dir: str = AIRPORT_ARTIFACT_DIR) -> 'AirportIndex':
+        return cls(load_airport_columns(path, artifact_dir))
+
+    def __len__(self) -> int:
+        return len(self.iata_codes)
+
+
+_airport_indexes: dict[str, AirportIndex] = dict()
+_airport_indexes_lock = threading.Lock()
+
+
+def get_airport_index(path: str = AIRPORT_DATA_PATH, artifact_dir: str = AIRPORT_ARTIFACT_DIR) -> AirportIndex:
+    """
+    Returns the process-wide AirportIndex for `path`, building it on first use from the compiled artifact in
+    `artifact_dir` (or the JSON itself when the artifact can't be used).
+    :param path: Path to the airport reference data.
+    :param artifact_dir: Directory of the compiled airport data.
+    :return: The shared AirportIndex.
+    """
+    with _airport_indexes_lock:
+        if path not in _airport_indexes:
+            _airport_indexes[path] = AirportIndex.load(path, artifact_dir)
+        return _airport_indexes[path]
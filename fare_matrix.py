@@ -0,0 +1,87 @@
+import threading
+import pandas as pd
+from collections import OrderedDict
+from functools import cached_property
+
+from process_search_results import _offer_key_columns
+
+DEPARTURE_COLUMN = 'query_departure_date'
+RETURN_COLUMN = 'query_return_date'
+
+
+class FareMatrix:
+    """
+    Date-price views over the output of `process_search_results.aggregate_bulk_flight_search`: the cheapest fare per
+    (departure, return) date pair, the cheapest option per day and the k cheapest options per pair. Every view is
+    computed with vectorized groupby/pivot operations and memoized on the instance.
+    """
+    def __init__(self, bulk_results: pd.DataFrame, max_stops: int = None, carriers: tuple[str, ...] = None):
+        """
+        :param bulk_results: Aggregated bulk search results.
+        :param max_stops: Only keep offers whose itineraries have at most this many stops.
+        :param carriers: Only keep itineraries whose first segment is flown by one of these carriers (names as mapped
+        by `map_flight_metadata`).
+        """
+        results = bulk_results
+        offer_keys = _offer_key_columns(results)
+        if max_stops is not None:
+            # An offer qualifies when every one of its itineraries (e.g. outbound and return) does
+            offer_stops = results.groupby(offer_keys, observed=True)['num_of_stops'].transform('max')
+            results = results[offer_stops <= max_stops]
+        if carriers:
+            results = results[results['carrier_1'].isin(carriers)]
+        # Round-trip offers span one row per itinerary at the same price, each offer is counted once
+        results = results.drop_duplicates(offer_keys)
+        # One-way searches have no return date, they are kept as a single NaT column
+        self.results = results.sort_values([DEPARTURE_COLUMN, RETURN_COLUMN, 'total_price'], na_position='first')
+        self._groups = self.results.groupby([DEPARTURE_COLUMN, RETURN_COLUMN], sort=False, dropna=False)
+
+    @cached_property
+    def price_grid(self) -> pd.DataFrame:
+        """Minimum price per pair, departure dates as rows and return dates as columns."""
+        return self._groups['total_price'].min().unstack(RETURN_COLUMN).sort_index().sort_index(axis=1)
+
+    @cached_property
+    def cheapest_per_day(self) -> pd.DataFrame:
+        """The cheapest itinerary per queried departure date."""
+        # Rows are already sorted by price within each date, so the first one per date is the cheapest
+        return self.results.groupby(DEPARTURE_COLUMN, sort=True).head(1).set_index(DEPARTURE_COLUMN)
+
+    def top_k_per_cell(self, k: int = 5) -> pd.DataFrame:
+        """The k cheapest itineraries per (departure, return) pair, cheapest first."""
+        return self._groups.head(k)
+
+    def cheapest_pair(self) -> tuple | None:
+        """The (departure, return) date pair with the lowest fare, or None when there are no results."""
+        prices = self._groups['total_price'].min()
+        return prices.idxmin() if len(prices) else None
+
+
+_fare_matrices: OrderedDict[tuple, FareMatrix] = OrderedDict()
+_fare_matrices_lock = threading.Lock()
+MAX_CACHED_FARE_MATRICES = 32
+
+
+def get_fare_matrix(search_key: str, bulk_results: pd.DataFrame, max_stops: int = None,
+                    carriers: tuple[str, ...] = None) -> FareMatrix:
+    """
+    Returns the FareMatrix of a search, reusing the one built on a previous call (e.g. an earlier Streamlit rerun) for
+    the same search and filters.
+    :param search_key: Identifies the search that produced `bulk_results`, e.g. its origin, destination and dates.
+    :param bulk_results: Aggregated bulk search results, only used when the matrix isn't cached yet.
+    :param max_stops: Only keep offers whose itineraries have at most this many stops.
+    :param carriers: Only keep itineraries whose first segment is flown by one of these carriers (mapped names).
+    :return: The FareMatrix.
+    """
+    key = (search_key, max_stops, tuple(sorted(carriers)) if carriers else None)
+    with _fare_matrices_lock:
+        if key in _fare_matrices:
+            _fare_matrices.move_to_end(key)
+            return _fare_matrices[key]
+
+    fare_matrix = FareMatrix(bulk_results, max_stops=max_stops, carriers=carriers)
+    with _fare_matrices_lock:
+        _fare_matrices[key] = fare_matrix
+        while len(_fare_matrices) > MAX_CACHED_FARE_MATRICES:
+            _fare_matrices.popitem(last=False)
+    return fare_matrix
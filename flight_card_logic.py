@@ -1,27 +1,35 @@
-import textwrap
+from datetime import timedelta
+from decimal import Decimal
 import streamlit as st
-import streamlit.components.v1 as components
 
+import tracing
 from flight_info import Segment
 from parse_flight_offers import get_flight_time, get_next_day_arrival_str, transform_duration_str, calc_time_difference
 
-def get_card_height(leg_num: int, base_height: int = 150) -> int:
-    """
-    Calculates the height for the flight card based on the number of legs.
-    :param base_height: base height in pixels.
-    :param leg_num: Number of flight legs.
-    :return: Calculated height in pixels as an integer.
-    """
-    additional_height_per_segment = 90
-    return base_height + additional_height_per_segment * (leg_num - 1)
+SORT_OPTIONS = ['Price', 'Duration', 'Stops']
+DEFAULT_PAGE_SIZE = 20
+PAGE_SIZE_OPTIONS = [10, 20, 50, 100]
+
+CARD_STYLE = ("border: 1px solid #444; border-radius: 8px; padding: 20px; margin-bottom: 15px; background-color: #222; "
+              "color: white;")
+DETAIL_STYLE = ("margin-bottom: 10px; padding: 10px; border: 1px solid #555; border-radius: 5px; "
+                "background-color: #333; color: #aaa;")
+
+def _compact_html(html: str) -> str:
+    # Markdown treats indented lines as code blocks and blank lines as the end of an HTML block
+    return ''.join(line.strip() for line in html.splitlines())
+
+def _price_html(price) -> str:
+    # A bare "$" would start an inline LaTeX formula in st.markdown once two prices are on the page
+    return f"&#36;{price}"
 
 # <div style="font-size: 12px; color: #aaa;">Operated by LIST OF AIRLINES</div>
-def display_flight_card(flight_legs: dict[str, list[Segment]], carriers: dict[str, str]) -> None:
+def render_flight_summary_html(flight_legs: dict[str, list[Segment]], carriers: dict[str, str]) -> str:
     """
-    Renders an HTML flight card displaying summarized flight details and pricing information.
+    Builds the summary row of a flight card: times, carrier, stops, duration and route per leg, then price and cabin.
     :param flight_legs: Dictionary mapping leg identifiers to lists of Segment objects.
     :param carriers: Dictionary mapping carrier codes to carrier names.
-    :return: None.
+    :return: The HTML of the summary row.
     """
     left_html = ""
     for leg_key, leg in flight_legs.items():
@@ -36,7 +44,7 @@ def display_flight_card(flight_legs: dict[str, list[Segment]], carriers: dict[st
         route_str = f"{leg[0].departure_airport} – {leg[-1].arrival_airport}"
 
         # Retrieve the carrier name.
-        carrier_name = carriers.get(leg[0].carrier_code, "Unknown Carrier").title()
+        carrier_name = carriers.get(leg[0].carrier_code, leg[0].carrier_code).title()
 
         itinerary_html = f"""
         <div style="margin-bottom: 10px;">
@@ -54,14 +62,24 @@ def display_flight_card(flight_legs: dict[str, list[Segment]], carriers: dict[st
         left_html += itinerary_html
 
     # Build the right section HTML.
+    first_segment = next(iter(flight_legs.values()))[0]
+    per_traveler_html = ""
+    if first_segment.fare.traveler_count > 1:
+        per_traveler_price = first_segment.fare.price_per_traveler.quantize(Decimal('0.01'))
+        per_traveler_html = f"""
+            <p style="font-size: 12px; margin: 0; color: #aaa;">
+                {_price_html(per_traveler_price)} per traveler
+            </p>
+        """
     right_html = f"""
     <div style="margin-bottom: 10px;">
         <div style="text-align: right;">
             <p style="font-size: 20px; font-weight: bold; margin: 0;">
-                ${flight_legs[(list(flight_legs.keys()))[0]][0].offer_price}
+                {_price_html(first_segment.offer_price)}
             </p>
+            {per_traveler_html}
             <p style="font-size: 12px; margin: 0; color: #aaa;">
-                {flight_legs[(list(flight_legs.keys()))[0]][0].cabin_type.title()}
+                {first_segment.cabin_type.title()}
             </p>
             <button style="background-color: #0a7d0a; color: white; padding: 10px 15px; border: none; border-radius: 5px; cursor: pointer; margin-top: 10px; font-size: 14px;">
                 Select
@@ -70,19 +88,9 @@ def display_flight_card(flight_legs: dict[str, list[Segment]], carriers: dict[st
     </div>
     """
 
-    # Combine left and right sections into one card.
-    card_html = textwrap.dedent(f"""
-        <div style="
-            border: 1px solid #444;
-            border-radius: 8px;
-            padding: 20px;
-            margin-bottom: 15px;
-            background-color: #222;
-            color: white;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        ">
+    # Combine left and right sections into one row.
+    return f"""
+        <div style="display: flex; justify-content: space-between; align-items: center;">
             <div style="flex: 4;">
                 {left_html}
             </div>
@@ -90,48 +98,106 @@ def display_flight_card(flight_legs: dict[str, list[Segment]], carriers: dict[st
                 {right_html}
             </div>
         </div>
-    """)
-    components.html(card_html, height=get_card_height(len(flight_legs)))
-
+    """
 
-def display_collapsable_card(flight_legs: dict[str, list[Segment]], carriers: dict[str, str]) -> None:
+def render_flight_details_html(flight_legs: dict[str, list[Segment]], carriers: dict[str, str]) -> str:
     """
-    Displays detailed flight segment information in a collapsible card (using a Streamlit expander).
+    Builds the per-segment details of a flight card (flights and layovers) as a collapsible <details> element, which
+    the browser toggles without a Streamlit rerun.
     :param flight_legs: Dictionary mapping leg identifiers to lists of Segment objects.
     :param carriers: Dictionary mapping carrier codes to carrier names.
+    :return: The HTML of the details element.
+    """
+    details_html = ""
+    for leg in flight_legs.values():
+        for i, current_flight in enumerate(leg):
+            airline = carriers.get(current_flight.carrier_code, current_flight.carrier_code)
+            departure_time = get_flight_time(current_flight.departure_time)
+            arrival_time = get_flight_time(current_flight.arrival_time)
+            flight_duration = transform_duration_str(current_flight.flight_duration)
+            details_html += f"""
+            <div style="{DETAIL_STYLE}">
+                <b style="font-size: 14px;">{current_flight.departure_airport} to {current_flight.arrival_airport}</b><br>
+                {airline.title()} {current_flight.flight_number}<br>
+                {departure_time} - {arrival_time} ({flight_duration})
+            </div>
+            """
+            if i != len(leg) - 1:
+                layover_duration = calc_time_difference(current_flight.arrival_time, leg[i + 1].departure_time)
+                details_html += f"""
+                <div style="{DETAIL_STYLE}">
+                    <b>{layover_duration} • Change planes in {current_flight.arrival_airport}</b>
+                </div>
+                """
+    return f"""
+        <details style="margin-top: 10px;">
+            <summary style="cursor: pointer; color: #aaa;">Flight Details</summary>
+            {details_html}
+        </details>
+    """
+
+@tracing.traced('render.flight_cards')
+def render_flight_cards_html(cards: list[dict[str, list[Segment]]], carriers: dict[str, str]) -> str:
+    """
+    Builds the HTML of many flight cards at once, so a whole page is sent to the browser as a single element.
+    :param cards: Flight legs of each card.
+    :param carriers: Dictionary mapping carrier codes to carrier names.
+    :return: The compacted HTML of the cards.
+    """
+    return _compact_html(''.join(
+        f"""<div style="{CARD_STYLE}">{render_flight_summary_html(flight_legs, carriers)}"""
+        f"""{render_flight_details_html(flight_legs, carriers)}</div>"""
+        for flight_legs in cards))
+
+def leg_duration(leg: list[Segment]) -> timedelta:
+    """
+    Time spent on a leg, its flights plus the connections between them. Unlike `Segment.total_duration`, which is the
+    duration of the whole itinerary, it only covers the leg when an itinerary is split at a major stop.
+    """
+    # Both ends of a connection are local times at the same airport, so their difference holds across time zones
+    connections = (following.departure_time - segment.arrival_time for segment, following in zip(leg, leg[1:]))
+    return sum((segment.flight_duration for segment in leg), start=sum(connections, start=timedelta()))
+
+def sort_flight_cards(cards: list[dict[str, list[Segment]]], sort_by: str) -> list[dict[str, list[Segment]]]:
+    """
+    Sorts flight cards by price, total duration or total number of stops, ties broken by price.
+    :param cards: Flight legs of each card.
+    :param sort_by: One of SORT_OPTIONS.
+    :return: The sorted cards.
+    """
+    def price(flight_legs):
+        return next(iter(flight_legs.values()))[0].offer_price
+
+    if sort_by == 'Price':
+        return sorted(cards, key=price)
+    if sort_by == 'Duration':
+        return sorted(cards, key=lambda flight_legs: (sum(map(leg_duration, flight_legs.values()), start=timedelta()),
+                                                      price(flight_legs)))
+    if sort_by == 'Stops':
+        return sorted(cards, key=lambda flight_legs: (sum(len(leg) - 1 for leg in flight_legs.values()),
+                                                      price(flight_legs)))
+    raise ValueError(f"Unknown sort option {sort_by}, expected one of {SORT_OPTIONS}.")
+
+def display_flight_cards(cards: list[dict[str, list[Segment]]], carriers: dict[str, str], key: str = 'results') -> None:
+    """
+    Displays flight cards sorted by the selected option, one page at a time. The shown cards are rendered into a
+    single markdown element and a "Load more" button extends the list by another page.
+    :param cards: Flight legs of each card.
+    :param carriers: Dictionary mapping carrier codes to carrier names.
+    :param key: Prefix of the widget and session state keys, unique per results view.
     :return: None.
     """
-    with st.expander("Flight Details", expanded=False):
-        for k, leg in flight_legs.items():
-            for i in range(len(leg)):
-                current_flight = leg[i]
-                airline = carriers.get(current_flight.carrier_code)
-                # aircraft = aircrafts.get(current_flight.aircraft_code)
-                departure_time = get_flight_time(current_flight.departure_time)
-                arrival_time = get_flight_time(current_flight.arrival_time)
-                flight_duration = transform_duration_str(current_flight.flight_duration)
-                st.markdown(
-                    f"""
-                    <div style="margin-bottom: 10px; padding: 10px; border: 1px solid #555; border-radius: 5px; background-color: #333;">
-                        <p style="color: #aaa;">
-                            <b style="font-size: 14;">{current_flight.departure_airport} to {current_flight.arrival_airport}</b><br>
-                            {airline.title()} {current_flight.flight_number}<br>
-                            {departure_time} - {arrival_time} ({flight_duration})<br>
-                        </p>
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-                if i != len(leg) - 1:
-                    layover_duration = calc_time_difference(current_flight.arrival_time, leg[i + 1].departure_time)
-                    st.markdown(
-                        f"""
-                        <div style="margin-bottom: 10px; padding: 10px; border: 1px solid #555; border-radius: 5px; background-color: #333;">
-                            <p style="color: #aaa;">
-                                <b> {layover_duration} • Change planes in {current_flight.arrival_airport}</b><br>
-                            </p>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
+    sort_col, page_size_col = st.columns([3, 1])
+    sort_by = sort_col.radio("Sort by", options=SORT_OPTIONS, horizontal=True, key=f'{key}_sort_by')
+    page_size = page_size_col.selectbox("Per page", options=PAGE_SIZE_OPTIONS,
+                                        index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE), key=f'{key}_page_size')
+
+    num_shown_key = f'{key}_num_shown'
+    num_shown = max(st.session_state.get(num_shown_key, page_size), page_size)
+    shown_cards = sort_flight_cards(cards, sort_by)[:num_shown]
+    st.markdown(render_flight_cards_html(shown_cards, carriers), unsafe_allow_html=True)
 
+    st.caption(f"Showing {len(shown_cards)} of {len(cards)} flights")
+    if num_shown < len(cards) and st.button("Load more", key=f'{key}_load_more'):
+        st.session_state[num_shown_key] = num_shown + page_size
+        st.rerun()
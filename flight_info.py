@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
 
 @dataclass
 class FlightSearchParameters:
@@ -13,21 +15,103 @@ class FlightSearchParameters:
     return_date: str = None
     search_range: int = None
     direction: str = None
+    max_workers: int = 1
+    max_requests_per_second: float = None
+    pool_size: int = 10
+    base_url: str = None  # Overrides the Amadeus API host, e.g. to run against a mock server
 
-@dataclass
-class Segment:
-    offer_price: str
+# Offers are parsed into slotted dataclasses. They aren't frozen: a frozen dataclass sets every field through
+# object.__setattr__, which made parsing several times slower than building the string-typed Segment it replaced.
+@dataclass(slots=True)
+class Fare:
+    price: Decimal
     currency: str
-    total_duration: str
-    bookable_seats: str
+    bookable_seats: int
+    traveler_count: int = 1
+
+    @property
+    def price_per_traveler(self) -> Decimal:
+        return self.price / self.traveler_count
+
+@dataclass(slots=True)
+class Segment:
+    fare: Fare
+    total_duration: timedelta
     segment_id: str
     departure_airport: str
-    departure_time: str
+    departure_time: datetime
     arrival_airport: str
-    arrival_time: str
+    arrival_time: datetime
     carrier_code: str
     flight_number: str
     aircraft_code: str
-    stops: str
-    flight_duration: str
-    cabin_type: str
\ No newline at end of file
+    stops: int
+    flight_duration: timedelta
+    cabin_type: str
+
+    # Offer-level fields are shared through `fare` instead of being copied onto every segment
+    @property
+    def offer_price(self) -> Decimal:
+        return self.fare.price
+
+    @property
+    def currency(self) -> str:
+        return self.fare.currency
+
+    @property
+    def bookable_seats(self) -> int:
+        return self.fare.bookable_seats
+
+@dataclass(slots=True)
+class Itinerary:
+    duration: timedelta
+    segments: tuple[Segment, ...]
+
+@dataclass(slots=True)
+class Offer:
+    offer_id: str
+    fare: Fare
+    itineraries: tuple[Itinerary, ...]
+
+    @property
+    def segments(self) -> list[Segment]:
+        return [segment for itinerary in self.itineraries for segment in itinerary.segments]
+
+@dataclass(frozen=True, slots=True)
+class FlightDictionaries:
+    carriers: dict[str, str]
+    aircraft: dict[str, str]
+    locations: dict[str, dict]
+
+    def carrier_name(self, carrier_code: str, default: str = "Unknown Carrier") -> str:
+        return self.carriers.get(carrier_code, default)
+
+    def aircraft_name(self, aircraft_code: str, default: str = "Unknown Aircraft") -> str:
+        return self.aircraft.get(aircraft_code, default)
+
+    def city_code(self, iata_code: str) -> str:
+        # Airports missing from the locations dictionary are treated as their own city
+        return self.locations.get(iata_code, {}).get('cityCode', iata_code)
+
+@dataclass
+class RequestTiming:
+    method: str
+    url: str
+    status_code: int
+    time_to_headers_seconds: float  # Connecting (if no pooled connection was free) plus the server's response time
+    transfer_seconds: float
+    total_seconds: float
+    num_bytes: int  # Bytes received on the wire, before content decoding
+
+@dataclass
+class FareObservations:
+    num_observations: int
+    first_price: Decimal
+    last_price: Decimal
+    min_price: Decimal
+    max_price: Decimal
+
+    @property
+    def price_delta(self) -> Decimal:
+        # Change between the first and the latest time the itinerary was seen, negative when it got cheaper
+        return self.last_price - self.first_price
@@ -1,19 +1,93 @@
-import json
+import os
+import time
+import pandas as pd
 import streamlit as st
+from contextlib import nullcontext
 from datetime import timedelta
+from typing import Iterable
+from geopy import Bing
 
-from AmadeusClient import AmadeusFlightSearch
-from flight_info import FlightSearchParameters, Segment
-from flight_card_logic import display_flight_card, display_collapsable_card
-from parse_flight_offers import get_flight_offer_segments
+import tracing
+from AmadeusClient import AmadeusFlightSearch, FlightOfferStream
+from airport_index import AirportIndex, get_airport_index
+from geocoding import CityGeocoder
+from flight_info import FlightSearchParameters, Itinerary, Offer, Segment
+from flight_card_logic import DEFAULT_PAGE_SIZE, display_flight_cards, render_flight_cards_html
+from parse_flight_offers import get_flight_dictionaries, iter_flight_offers
 from nearby_airport_suggestions import NearbyAirportSuggestions
+from response_cache import ResponseCache, SQLiteResponseCache
+from route_matrix import RouteMatrixSearch, nearby_airport_codes
+
+RESPONSE_CACHE_PATH = '.cache/flight_offers.sqlite'
+RESPONSE_CACHE_TTL_SECONDS = 15 * 60
+GEOCODE_CACHE_PATH = '.cache/geocodes.sqlite'
+STREAM_RENDER_BATCH_SIZE = 5
+MAX_SESSION_SEARCHES = 5
+MAX_ROUTE_MATRIX_REQUESTS = 20
 
 # <img src="https://via.placeholder.com/32" alt="Airline Logo" style="width: 32px; height: 32px; margin-right: 10px;">
 # <div style="background-color: #0066ff; padding: 4px 8px; border-radius: 4px; font-size: 12px; margin-right: 10px;">Best</div>
 
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the flight-offer response cache shared by every Streamlit session. It is backed by SQLite so that several
+    app processes serve repeated searches from the same entries.
+    :return: The shared response cache.
+    """
+    return SQLiteResponseCache(RESPONSE_CACHE_PATH, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS)
+
+@st.cache_resource
+def get_city_geocoder() -> CityGeocoder:
+    """
+    Returns the city geocoder shared by every Streamlit session. Cities from the airport data are resolved locally,
+    other lookups go to Bing behind a persistent cache.
+    :return: The shared city geocoder.
+    """
+    return CityGeocoder(get_airport_index(), remote_geocoder=Bing(api_key=st.secrets["prod"]["BING_API_KEY"]),
+                        cache=SQLiteResponseCache(GEOCODE_CACHE_PATH))
+
+@st.cache_resource
+def get_known_carriers() -> dict[str, str]:
+    """
+    Returns the carrier names collected from previous responses. Streamed results only receive the response's
+    carriers dictionary after the last offer, so cards rendered before that fall back to these names.
+    :return: Dictionary mapping carrier codes to carrier names.
+    """
+    return dict()
+
+def get_search_key(search_type: str, origin: str, destination: str, departure_date, return_date,
+                   num_of_passengers: int, search_range: int, direction: str, nearby_airports: bool = False) -> tuple:
+    """Identifies a search by the parameters that change its results."""
+    return (search_type, origin, destination, str(departure_date), str(return_date) if return_date else None,
+            num_of_passengers, search_range, direction, nearby_airports)
+
+def get_session_results(search_key: tuple) -> tuple[list[dict[str, list[Segment]]], dict[str, str]] | None:
+    """
+    Returns the flight cards and carrier names of a search made earlier in this session, so reruns triggered by other
+    widgets (sorting, paging, ...) neither call the API nor parse the offers again.
+    :param search_key: Output of `get_search_key`.
+    :return: The (cards, carriers) of the search, or None if it wasn't made or its results are older than the response
+    cache TTL.
+    """
+    entry = st.session_state.get('search_results', dict()).get(search_key)
+    if entry is None or time.time() - entry['searched_at'] > RESPONSE_CACHE_TTL_SECONDS:
+        tracing.increment('session_cache_lookups', hit=False)
+        return None
+    tracing.increment('session_cache_lookups', hit=True)
+    return entry['cards'], entry['carriers']
+
+def set_session_results(search_key: tuple, cards: list[dict[str, list[Segment]]], carriers: dict[str, str]) -> None:
+    search_results = st.session_state.setdefault('search_results', dict())
+    search_results.pop(search_key, None)
+    search_results[search_key] = {'cards': cards, 'carriers': carriers, 'searched_at': time.time()}
+    # Only the most recent searches are kept, the oldest one is the first inserted
+    while len(search_results) > MAX_SESSION_SEARCHES:
+        search_results.pop(next(iter(search_results)))
+
 def fetch_flights(search_type: str, origin: str, destination: str, departure_date: str,
                   return_date: str, num_of_passengers: int, search_range: int, direction: str,
-                  env: str = 'prod', version: str = 'v2') -> dict:
+                  env: str = 'prod', version: str = 'v2', max_workers: int = 4) -> dict:
     """
     Fetches flight search results using the AmadeusFlightSearch client based on user input parameters.
     :param search_type: Type of search (e.g., "Simple Search", "Unidirectional Wide Search", "Bidirectional Wide Search").
@@ -26,6 +100,7 @@ def fetch_flights(search_type: str, origin: str, destination: str, departure_dat
     :param env: Environment code for amadeus search ("prod" or "test").
     :param version: Version code for amadeus search (v2 default for the FlightSearch endpoint).
     :param num_of_passengers: Number of flight passengers.
+    :param max_workers: Maximum number of concurrent requests for wide searches.
     :return: A dictionary containing the flight search results.
     """
     results = None
@@ -40,10 +115,11 @@ def fetch_flights(search_type: str, origin: str, destination: str, departure_dat
         adults_passengers=num_of_passengers,
         return_date=return_date.strftime("%Y-%m-%d") if return_date else None,
         search_range=search_range if search_type != "Simple Search" else None,
-        direction=direction if search_type == "Unidirectional Wide Search" else None
+        direction=direction if search_type == "Unidirectional Wide Search" else None,
+        max_workers=max_workers if search_type != "Simple Search" else 1
     )
 
-    amadeus_client = AmadeusFlightSearch(params)
+    amadeus_client = AmadeusFlightSearch(params, cache=get_response_cache())
 
     try:
         if search_type == 'Simple Search':
@@ -58,28 +134,110 @@ def fetch_flights(search_type: str, origin: str, destination: str, departure_dat
         st.error('Something went wrong. Perhaps the airport codes are invalid?')
     return results
 
-def get_alternative_airport_codes(airport_city_map: dict) -> dict:
+def fetch_route_matrix(origin: str, destination: str, departure_date: str, return_date: str, num_of_passengers: int,
+                       airport_index: AirportIndex, env: str = 'prod', version: str = 'v2',
+                       max_workers: int = 4) -> dict[str, dict]:
     """
-    Generates a mapping of city codes to alternative airport codes based on the airport-city data.
-    :param airport_city_map: Dictionary mapping airport identifiers to their details (including cityCode).
-    :return: A dictionary mapping city codes to alternative airport codes or lists of codes.
+    Searches every pair of airports near the origin and the destination (e.g. SFO/OAK/SJC to JFK/LGA/EWR), within a
+    budget of MAX_ROUTE_MATRIX_REQUESTS searches.
+    :param origin: Origin airport code.
+    :param destination: Destination airport code.
+    :param departure_date: Departure date as a datetime object.
+    :param return_date: Return date as a datetime object (if applicable).
+    :param num_of_passengers: Number of flight passengers.
+    :param airport_index: Shared index over the airport reference data.
+    :param env: Environment code for amadeus search ("prod" or "test").
+    :param version: Version code for amadeus search (v2 default for the FlightSearch endpoint).
+    :param max_workers: Maximum number of concurrent requests.
+    :return: The responses of the searched airport pairs, keyed by search key.
     """
-    alternative_airports = dict()
-    for k, v in airport_city_map.items():
-        if v['cityCode'] in alternative_airports.keys():
-            alternative_airports[v['cityCode']] = [k, alternative_airports[v['cityCode']]]
-        else:
-            alternative_airports[v['cityCode']] = k
-    return alternative_airports
+    params = FlightSearchParameters(
+        api_key=st.secrets["prod"]["AMADEUS_PROD_API_KEY"],
+        api_secret=st.secrets["prod"]["AMADEUS_PROD_API_SECRET"],
+        env=env,
+        version=version,
+        origin=origin,
+        destination=destination,
+        departure_date=departure_date.strftime("%Y-%m-%d"),
+        adults_passengers=num_of_passengers,
+        return_date=return_date.strftime("%Y-%m-%d") if return_date else None,
+        max_workers=max_workers
+    )
+
+    route_matrix = RouteMatrixSearch(AmadeusFlightSearch(params, cache=get_response_cache()),
+                                     origins=nearby_airport_codes(origin, airport_index),
+                                     destinations=nearby_airport_codes(destination, airport_index),
+                                     max_requests=MAX_ROUTE_MATRIX_REQUESTS)
+    try:
+        responses = route_matrix.run()
+    except Exception as e:
+        st.error('Something went wrong. Perhaps the airport codes are invalid?')
+        return dict()
+    if route_matrix.failed_searches:
+        st.warning(f"{len(route_matrix.failed_searches)} airport pair(s) couldn't be searched.")
+    return responses
+
+def fetch_flight_stream(origin: str, destination: str, departure_date: str, return_date: str, num_of_passengers: int,
+                        env: str = 'prod', version: str = 'v2') -> FlightOfferStream | None:
+    """
+    Starts a simple flight search whose offers are decoded while the response downloads.
+    :param origin: Origin airport code.
+    :param destination: Destination airport code.
+    :param departure_date: Departure date as a datetime object.
+    :param return_date: Return date as a datetime object (if applicable).
+    :param num_of_passengers: Number of flight passengers.
+    :param env: Environment code for amadeus search ("prod" or "test").
+    :param version: Version code for amadeus search (v2 default for the FlightSearch endpoint).
+    :return: A FlightOfferStream over the search results, or None if the search failed.
+    """
+    params = FlightSearchParameters(
+        api_key=st.secrets["prod"]["AMADEUS_PROD_API_KEY"],
+        api_secret=st.secrets["prod"]["AMADEUS_PROD_API_SECRET"],
+        env=env,
+        version=version,
+        origin=origin,
+        destination=destination,
+        departure_date=departure_date.strftime("%Y-%m-%d"),
+        adults_passengers=num_of_passengers,
+        return_date=return_date.strftime("%Y-%m-%d") if return_date else None
+    )
+
+    try:
+        return AmadeusFlightSearch(params, cache=get_response_cache()).single_flight_search_stream()
+    except Exception as e:
+        st.error('Something went wrong. Perhaps the airport codes are invalid?')
+
+def get_city_airports(locations: dict[str, dict]) -> dict[str, frozenset[str]]:
+    """
+    Indexes the airports of a response by the city they serve, e.g. NYC to {JFK, LGA, EWR}.
+    :param locations: The response's location dictionary, mapping airport codes to their details (including cityCode).
+    :return: A dictionary mapping city codes to the set of their airport codes.
+    """
+    city_airports = dict()
+    for airport_code, location in locations.items():
+        city_airports.setdefault(location['cityCode'], set()).add(airport_code)
+    return {city_code: frozenset(airport_codes) for city_code, airport_codes in city_airports.items()}
 
 def get_unique_municipalities(airport_data: dict) -> list[str]:
     return list(set([sub_dict['municipality'] for sub_dict in airport_data]))
 
-def check_user_airport_input(user_input: str, iata_to_airport: dict, airport_data: list[dict]) -> str:
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_airport_suggestions(user_input: str, _airport_index: AirportIndex) -> dict[str, str]:
+    """
+    Returns the airport suggestions for a city or airport name, cached by input so reruns skip the fuzzy matching,
+    geocoding and radius queries.
+    :param user_input: The airport input provided by the user.
+    :param _airport_index: Shared index over the airport reference data, not part of the cache key.
+    :return: Dictionary mapping suggestion labels to IATA codes.
+    """
+    suggestion_generator = NearbyAirportSuggestions(user_input, _airport_index, geocoder=get_city_geocoder())
+    return suggestion_generator.fetch_airport_suggestions()
+
+def check_user_airport_input(user_input: str, iata_to_airport: dict, airport_index: AirportIndex) -> str:
     """
     Validates the user's airport input. If the input directly matches a key in the provided dictionary, it is accepted;
     otherwise, it presents suggested cities based on fuzzy matching.
-    :param airport_data:
+    :param airport_index: Shared index over the airport reference data.
     :param user_input: The airport input provided by the user.
     :param iata_to_airport: Dictionary mapping full airport strings to their IATA codes.
     :return: The validated airport code or selected suggestion.
@@ -89,8 +247,7 @@ def check_user_airport_input(user_input: str, iata_to_airport: dict, airport_dat
             st.write(f"Selected Airport: {iata_to_airport[user_input.upper()]}")
             return user_input
         else:
-            suggestion_generator = NearbyAirportSuggestions(user_input, airport_data)
-            airport_suggestions = suggestion_generator.fetch_airport_suggestions()
+            airport_suggestions = get_airport_suggestions(user_input, airport_index)
 
             if airport_suggestions:
                 selected_airport = st.selectbox("Select a Nearby Airport:", options=airport_suggestions.keys())
@@ -101,18 +258,19 @@ def check_user_airport_input(user_input: str, iata_to_airport: dict, airport_dat
                 st.write("No matching airport found. Perhaps you misspelled it?")
 
 
-def get_flight_search_parameters(iata_to_airport: dict, airport_data: list[dict]) -> tuple:
+def get_flight_search_parameters(iata_to_airport: dict, airport_index: AirportIndex) -> tuple:
     """
     Collects flight search parameters from the user and validates airport inputs.
-    :param airport_data:
+    :param airport_index: Shared index over the airport reference data.
     :param iata_to_airport: Dictionary mapping IATA codes to the full airport strings.
     :return: A tuple containing the origin, destination, departure date, return date, and major stops.
     """
     origin = st.text_input("From? (City or Airport Code)").upper()
-    origin = check_user_airport_input(user_input=origin, iata_to_airport=iata_to_airport, airport_data=airport_data)
+    origin = check_user_airport_input(user_input=origin, iata_to_airport=iata_to_airport, airport_index=airport_index)
 
     destination = st.text_input("To? (City or Airport Code)").upper()
-    destination = check_user_airport_input(user_input=destination, iata_to_airport=iata_to_airport, airport_data=airport_data)
+    destination = check_user_airport_input(user_input=destination, iata_to_airport=iata_to_airport,
+                                           airport_index=airport_index)
 
     departure_date = st.date_input("Departure Date", value='today', min_value='today')
     return_date = st.date_input("Return Date (Optional)", value=None, min_value=departure_date + timedelta(days=1))
@@ -121,65 +279,138 @@ def get_flight_search_parameters(iata_to_airport: dict, airport_data: list[dict]
     return origin, destination, departure_date, return_date, num_of_passengers
 
 
-def group_segments_by_major_stop(segments: list, major_stops: list) -> dict[str, list[Segment]]:
+def group_segments_by_major_stop(itineraries: Iterable[Itinerary],
+                                 major_stops: frozenset[str]) -> dict[str, list[Segment]]:
     """
-    Groups flight segments into legs based on the occurrence of major stop airports.
-    :param segments: A list of Segment objects representing individual flight segments.
-    :param major_stops: A collection (e.g., list) of airport codes considered as major stops.
+    Groups the segments of an offer into legs, closing a leg on every arrival at a major stop airport and at the end
+    of every itinerary. Amadeus returns itineraries and their segments in travel order, so nothing is re-sorted.
+    :param itineraries: The itineraries of an offer.
+    :param major_stops: Airport codes considered as major stops, see `expand_major_stops`.
     :return: A dictionary where keys are leg identifiers (e.g., "leg_1") and values are lists of Segment objects.
     """
-    segments = sorted(segments, key=lambda seg: seg.departure_time)
-    current_leg, flight_legs = [], dict()
-    for seg in segments:
-        current_leg.append(seg)
-        if seg.arrival_airport in major_stops:
+    flight_legs = dict()
+    for itinerary in itineraries:
+        current_leg = []
+        for seg in itinerary.segments:
+            current_leg.append(seg)
+            if seg.arrival_airport in major_stops:
+                flight_legs[f'leg_{len(flight_legs) + 1}'] = current_leg
+                current_leg = []
+        if current_leg:
+            # The itinerary ends away from the major stops, e.g. at an airport of a city that wasn't searched
             flight_legs[f'leg_{len(flight_legs) + 1}'] = current_leg
-            current_leg = []
-    if current_leg:
-        flight_legs['remaining_leg'] = current_leg
     return flight_legs
 
 
-def update_major_stops(major_stops: list, alternative_airports: dict, locations: dict) -> list[str]:
+def group_offers_by_major_stop(offers: Iterable[Offer],
+                               major_stops: frozenset[str]) -> list[dict[str, list[Segment]]]:
+    """Groups every offer of a response into legs in one pass, linear in the total number of segments."""
+    return [group_segments_by_major_stop(offer.itineraries, major_stops) for offer in offers]
+
+
+def expand_major_stops(major_stops: Iterable[str], city_airports: dict[str, frozenset[str]],
+                       locations: dict[str, dict]) -> frozenset[str]:
     """
-    Updates the list of major stop airport codes by incorporating alternative airport codes for given cities.
-    :param major_stops: List of initial major stop airport codes.
-    :param alternative_airports: Dictionary mapping city codes to alternative airport codes.
+    Expands the major stop airports into every airport of the cities they serve, so an itinerary landing at LGA
+    closes a leg of a search to JFK.
+    :param major_stops: Initial major stop airport codes.
+    :param city_airports: Output of `get_city_airports` for the response.
     :param locations: Dictionary containing location details keyed by airport code.
-    :return: An updated list of major stop airport codes.
+    :return: The set of major stop airport codes.
     """
-    updated_stop = major_stops.copy()
+    expanded_stops = set(major_stops)
     for stop in major_stops:
-        city_code = locations[stop]['cityCode']
-        if isinstance(alternative_airports[city_code], list):
-            updated_stop.remove(stop)
-            updated_stop.extend(alternative_airports[city_code])
-    return updated_stop
+        if stop in locations:
+            expanded_stops |= city_airports.get(locations[stop]['cityCode'], frozenset())
+    return frozenset(expanded_stops)
+
+@st.cache_data(ttl=RESPONSE_CACHE_TTL_SECONDS, max_entries=64, show_spinner=False)
+def get_simple_search_cards(search_key: tuple, _search_results: dict,
+                            major_stops: tuple[str, ...]) -> list[dict[str, list[Segment]]]:
+    """
+    Groups the segments of every offer of a simple search into legs, one flight card per offer. Cached across sessions
+    by search key, the response itself is excluded from the cache key so it is never hashed.
+    :param search_key: Output of `get_search_key` for the search that returned `_search_results`.
+    :param _search_results: Dictionary containing flight search results and associated dictionaries.
+    :param major_stops: Major stop airport codes.
+    :return: The flight legs of each card.
+    """
+    with tracing.span('app.group_cards', num_offers=len(_search_results['data'])):
+        dictionaries = get_flight_dictionaries(_search_results)
+        city_airports = get_city_airports(dictionaries.locations)
+        expanded_major_stops = expand_major_stops(major_stops, city_airports, dictionaries.locations)
+        return group_offers_by_major_stop(iter_flight_offers(_search_results['data']), expanded_major_stops)
 
-def display_simple_search_results(search_results: dict, major_stops: list[str]) -> None:
+def load_simple_search_results(search_results: dict, major_stops: list[str], search_key: tuple) -> None:
     """
-    Processes and displays flight search results using a simple search format.
+    Processes the results of a simple search into flight cards stored in the session under `search_key`.
     :param search_results: Dictionary containing flight search results and associated dictionaries.
     :param major_stops: List of major stop airport codes.
+    :param search_key: Output of `get_search_key` for the search.
     :return: None.
     """
     try:
-        alternative_airports = get_alternative_airport_codes(search_results['dictionaries']['locations'])
-        updated_major_stops = update_major_stops(major_stops, alternative_airports,
-                                                 search_results['dictionaries']['locations'])
-        if search_results.get("data") and search_results.get('dictionaries'):
-            flight_offers = get_flight_offer_segments(search_results)
-            for offer_key, flight_offer in flight_offers.items():
-                flight_legs = group_segments_by_major_stop(segments=list(flight_offer.values()),
-                                                           major_stops=updated_major_stops)
-                display_flight_card(flight_legs, carriers=search_results['dictionaries']['carriers'])
-                display_collapsable_card(flight_legs, carriers=search_results['dictionaries']['carriers'])
+        if search_results and search_results.get("data") and search_results.get('dictionaries'):
+            carriers = get_flight_dictionaries(search_results).carriers
+            set_session_results(search_key, get_simple_search_cards(search_key, search_results, tuple(major_stops)),
+                                carriers)
         else:
             st.error("No flight data available.")
     except Exception as e:
         st.exception(f"Uh oh something went wrong. Error for the nerds: {e}")
         st.stop()
 
+def load_route_matrix_results(responses: dict[str, dict], search_key: tuple) -> None:
+    """
+    Processes the responses of a route-matrix search into one set of flight cards stored in the session under
+    `search_key`, each airport pair grouped into legs by its own origin and destination.
+    :param responses: Output of `fetch_route_matrix`.
+    :param search_key: Output of `get_search_key` for the search.
+    :return: None.
+    """
+    try:
+        cards, carriers = [], dict()
+        for route_key, search_results in responses.items():
+            if search_results.get("data") and search_results.get('dictionaries'):
+                origin, destination = route_key.split(' ')[0].split('-to-')
+                cards.extend(get_simple_search_cards((*search_key, route_key), search_results, (origin, destination)))
+                carriers.update(get_flight_dictionaries(search_results).carriers)
+        if cards:
+            set_session_results(search_key, cards, carriers)
+        else:
+            st.error("No flight data available.")
+    except Exception as e:
+        st.exception(f"Uh oh something went wrong. Error for the nerds: {e}")
+        st.stop()
+
+def load_streamed_search_results(offer_stream: FlightOfferStream, search_key: tuple) -> None:
+    """
+    Displays flight cards as the offers are decoded from the response stream, then stores them in the session under
+    `search_key`. Each itinerary of an offer is shown as a leg, since the location dictionaries needed for major-stop
+    grouping only arrive after the last offer. The first page fills in every STREAM_RENDER_BATCH_SIZE offers and is
+    cleared once the stream ends, when the sortable view takes over.
+    :param offer_stream: Stream of flight offers from `fetch_flight_stream`.
+    :param search_key: Output of `get_search_key` for the search.
+    :return: None.
+    """
+    try:
+        known_carriers = get_known_carriers()
+        progress = st.empty()
+        cards = []
+        for offer in iter_flight_offers(offer_stream):
+            cards.append({f'leg_{i + 1}': list(itinerary.segments) for i, itinerary in enumerate(offer.itineraries)})
+            if len(cards) <= DEFAULT_PAGE_SIZE and len(cards) % STREAM_RENDER_BATCH_SIZE == 0:
+                progress.markdown(render_flight_cards_html(cards, known_carriers), unsafe_allow_html=True)
+        progress.empty()
+        known_carriers.update(offer_stream.dictionaries.get('carriers', {}))
+        if not offer_stream.num_offers:
+            st.error("No flight data available.")
+            return
+        set_session_results(search_key, cards, known_carriers)
+    except Exception as e:
+        st.exception(f"Uh oh something went wrong. Error for the nerds: {e}")
+        st.stop()
+
 def confirm_origin_and_destination_provided(origin: str, destination: str) -> None:
     """
     Ensures that the minimum required search information (origin, destination, departure date) is provided.
@@ -191,24 +422,48 @@ def confirm_origin_and_destination_provided(origin: str, destination: str) -> No
         st.error("No origin or destination provided. Please enter a valid city name or airport code.")
         st.stop()
 
+def display_debug_panel() -> None:
+    """
+    Shows the spans and counters recorded by `tracing` in the sidebar, along with the profile of the last profiled
+    search. Only displayed while tracing is enabled.
+    :return: None.
+    """
+    with st.sidebar.expander("Debug", expanded=False):
+        spans = tracing.recent_spans()
+        if spans:
+            st.dataframe(pd.DataFrame(spans).iloc[::-1], hide_index=True)
+        counters = [{'counter': name, **dict(labels), 'value': value}
+                    for (name, labels), value in tracing.counters().items()]
+        if counters:
+            st.dataframe(pd.DataFrame(counters), hide_index=True)
+        if st.session_state.get('profile_report'):
+            st.code(st.session_state['profile_report'], language=None)
+        if st.button("Reset traces"):
+            tracing.reset()
+            st.session_state.pop('profile_report', None)
+
 # For the plots consider using plotly if the streamlit plots are insufficient
 # TODO: Crash the app when the amadeus search fails AND when there are no results
 def main():
-    with open('data/airports_data.json', 'r') as infile:
-        airport_data = json.load(infile)
-    iata_to_airport = {details['iata_code']: (f"{details['name']}, {details['country_code']} "
-                                                  f"({details['iata_code']})") for details in airport_data}
+    if tracing.is_enabled() and os.environ.get(tracing.METRICS_PORT_ENV_VAR):
+        tracing.start_metrics_server(int(os.environ[tracing.METRICS_PORT_ENV_VAR]))
+    airport_index = get_airport_index()
+    iata_to_airport = airport_index.iata_to_airport
 
     st.title("Flight Search Engine")
     st.header("Search Flights")
 
     (origin, destination, departure_date, return_date,
-     num_of_passengers) = get_flight_search_parameters(iata_to_airport, airport_data)
+     num_of_passengers) = get_flight_search_parameters(iata_to_airport, airport_index)
 
     search_type = st.selectbox("Select Search Type", options=["Simple Search",
                                                             "Unidirectional Wide Search (WIP)",
                                                             "Bidirectional Wide Search (WIP)"])
 
+    nearby_airports = st.checkbox("Include nearby airports", value=False,
+                                  help="Also search the other major airports around the origin and destination")
+    stream_results = st.checkbox("Show flights as they arrive", value=True, disabled=nearby_airports)
+
     search_range, direction = None, None
     if search_type == "Unidirectional Wide Search":
         search_range = st.number_input("Search Range (in days)", min_value=1, step=1)
@@ -216,14 +471,42 @@ def main():
     elif search_type == "Bidirectional Wide Search":
         search_range = st.number_input("Search Range (in days)", min_value=1, step=1)
 
+    search_key = get_search_key(search_type, origin, destination, departure_date, return_date, num_of_passengers,
+                                search_range, direction, nearby_airports)
+    profile_search = tracing.is_enabled() and st.sidebar.checkbox("Profile the next search", value=False)
+
     with st.spinner(text='Finding the cheapest flights, hang tight!'):
         if st.button("Search Flights"):
             confirm_origin_and_destination_provided(origin, destination)
-            if search_type == 'Simple Search':
-                search_results = fetch_flights(search_type, origin, destination, departure_date, return_date,
-                                               num_of_passengers, search_range, direction)
-                display_simple_search_results(search_results, major_stops=[origin, destination])
+            # A new search starts again from the first page
+            st.session_state.pop('results_num_shown', None)
+            profile = tracing.ProfileCapture() if profile_search else nullcontext()
+            with profile, tracing.span('app.search', search_type=search_type, nearby_airports=nearby_airports):
+                if get_session_results(search_key) is None:
+                    if search_type == 'Simple Search' and nearby_airports:
+                        responses = fetch_route_matrix(origin, destination, departure_date, return_date,
+                                                       num_of_passengers, airport_index)
+                        load_route_matrix_results(responses, search_key)
+                    elif search_type == 'Simple Search' and stream_results:
+                        offer_stream = fetch_flight_stream(origin, destination, departure_date, return_date,
+                                                           num_of_passengers)
+                        if offer_stream is not None:
+                            load_streamed_search_results(offer_stream, search_key)
+                    elif search_type == 'Simple Search':
+                        search_results = fetch_flights(search_type, origin, destination, departure_date, return_date,
+                                                       num_of_passengers, search_range, direction)
+                        load_simple_search_results(search_results, major_stops=[origin, destination],
+                                                   search_key=search_key)
+            if profile_search:
+                st.session_state['profile_report'] = profile.report
 
+    # Reruns that don't change the search (sorting, paging, ...) show the session's results without any API or
+    # parsing work
+    session_results = get_session_results(search_key)
+    if session_results is not None:
+        display_flight_cards(*session_results)
+    if tracing.is_enabled():
+        display_debug_panel()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,52 @@
+from typing import Any
+
+from airport_index import AirportIndex
+from response_cache import ResponseCache, LRUResponseCache
+
+
+class CityGeocoder:
+    """
+    Resolves city names to coordinates. Cities with a large airport in the airport data are resolved locally from
+    their large airports' centroid (the gazetteer), anything else goes through a memoized remote geocoder. Failed remote lookups are cached
+    too, for a shorter time, so misspelled cities don't trigger a network call on every rerun.
+    """
+    CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+    NEGATIVE_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+    def __init__(self, airport_index: AirportIndex, remote_geocoder: Any = None, cache: ResponseCache = None,
+                 use_gazetteer: bool = True):
+        """
+        :param airport_index: Shared index over the airport reference data.
+        :param remote_geocoder: Optional geopy geocoder used when the gazetteer can't resolve a city.
+        :param cache: Cache in front of the remote geocoder, an in-memory one is used when omitted.
+        :param use_gazetteer: Whether to resolve cities from the airport data before going remote.
+        """
+        self.airport_index = airport_index
+        self.remote_geocoder = remote_geocoder
+        self.cache = cache if cache is not None else LRUResponseCache(ttl_seconds=self.CACHE_TTL_SECONDS)
+        self.use_gazetteer = use_gazetteer
+
+    @staticmethod
+    def _make_key(city: str) -> str:
+        return f"geocode:{' '.join(city.lower().split())}"
+
+    def geocode(self, city: str) -> tuple[float, float] | None:
+        if self.use_gazetteer:
+            centroid = self.airport_index.municipality_centroid(city)
+            if centroid is not None:
+                return centroid
+
+        key = self._make_key(city)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return (cached['latitude'], cached['longitude']) if cached['found'] else None
+        if self.remote_geocoder is None:
+            return None
+
+        location = self.remote_geocoder.geocode(city)
+        if location:
+            self.cache.set(key, {'found': True, 'latitude': location.latitude, 'longitude': location.longitude},
+                           ttl_seconds=self.CACHE_TTL_SECONDS)
+            return location.latitude, location.longitude
+        self.cache.set(key, {'found': False}, ttl_seconds=self.NEGATIVE_CACHE_TTL_SECONDS)
+        return None
@@ -0,0 +1,325 @@
+import gzip
+import itertools
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import serialization
+from response_cache import ResponseCache
+
+CARRIERS = {'UA': 'UNITED AIRLINES', 'AA': 'AMERICAN AIRLINES', 'DL': 'DELTA AIR LINES', 'B6': 'JETBLUE AIRWAYS',
+            'AS': 'ALASKA AIRLINES'}
+AIRCRAFT = {'789': 'BOEING 787-9', '32N': 'AIRBUS A320NEO', '738': 'BOEING 737-800', '223': 'AIRBUS A220-300'}
+HUBS = ['ORD', 'DEN', 'DFW', 'ATL', 'IAH', 'PHX', 'CLT', 'SEA']
+CITY_CODES = {'JFK': 'NYC', 'LGA': 'NYC', 'EWR': 'NYC', 'ORD': 'CHI', 'IAH': 'HOU', 'OAK': 'SFO'}
+CABINS = ['ECONOMY', 'ECONOMY', 'ECONOMY', 'PREMIUM_ECONOMY', 'BUSINESS']
+
+
+def _iso_duration(duration: timedelta) -> str:
+    hours, minutes = divmod(int(duration.total_seconds()) // 60, 60)
+    return f"PT{hours}H{minutes}M" if minutes else f"PT{hours}H"
+
+
+def generate_flight_offers(origin: str = 'SFO', destination: str = 'JFK', departure_date: str = '2025-03-01',
+                           return_date: str = None, num_offers: int = 250, segments_per_itinerary: tuple = (1, 2, 3),
+                           num_travelers: int = 1, seed: int = 0,
+                           multi_city: list[tuple[str, str, str]] = None) -> dict:
+    """
+    Generates a flight-offers response shaped like the Amadeus one (offers, itineraries, segments, traveler pricings,
+    meta and dictionaries), e.g. to benchmark the parsing pipeline without calling the paid API.
+    :param origin: Origin airport code.
+    :param destination: Destination airport code.
+    :param departure_date: Departure date as "YYYY-MM-DD".
+    :param return_date: Return date as "YYYY-MM-DD", a round trip adds a second itinerary to every offer.
+    :param num_offers: Number of offers.
+    :param segments_per_itinerary: Segment counts cycled through the itineraries, e.g. (1, 2, 3) mixes nonstop,
+    one-stop and two-stop itineraries.
+    :param num_travelers: Number of traveler pricings per offer.
+    :param seed: Seed of the random generator, the same arguments always give the same response.
+    :param multi_city: (origin, destination, date) of every itinerary of a multi-city trip, replacing the origin,
+    destination and dates above.
+    :return: The response.
+    """
+    rng = random.Random(seed)
+    segment_counts = itertools.cycle(segments_per_itinerary)
+    if multi_city:
+        directions = list(multi_city)
+    else:
+        directions = [(origin, destination, departure_date)] + (
+            [(destination, origin, return_date)] if return_date else [])
+    locations = {airport for itinerary_origin, itinerary_destination, _ in directions
+                 for airport in (itinerary_origin, itinerary_destination)}
+
+    offers = []
+    for offer_id in range(1, num_offers + 1):
+        itineraries, segment_ids = [], []
+        for itinerary_origin, itinerary_destination, date in directions:
+            num_segments = next(segment_counts)
+            connections = [hub for hub in HUBS if hub not in (itinerary_origin, itinerary_destination)]
+            airports = [itinerary_origin] + rng.sample(connections, num_segments - 1) + [itinerary_destination]
+            locations.update(airports)
+            departure = datetime.fromisoformat(date) + timedelta(hours=rng.randint(6, 21),
+                                                                  minutes=rng.choice(range(0, 60, 5)))
+            itinerary_start, segments = departure, []
+            for i in range(num_segments):
+                flight_duration = timedelta(minutes=rng.randint(55, 330))
+                arrival = departure + flight_duration
+                carrier_code = rng.choice(list(CARRIERS))
+                segment_id = str(len(segment_ids) + 1)
+                segment_ids.append(segment_id)
+                segments.append({
+                    'departure': {'iataCode': airports[i], 'terminal': str(rng.randint(1, 3)),
+                                  'at': departure.isoformat()},
+                    'arrival': {'iataCode': airports[i + 1], 'at': arrival.isoformat()},
+                    'carrierCode': carrier_code,
+                    'number': str(rng.randint(100, 2999)),
+                    'aircraft': {'code': rng.choice(list(AIRCRAFT))},
+                    'operating': {'carrierCode': carrier_code},
+                    'duration': _iso_duration(flight_duration),
+                    'id': segment_id,
+                    'numberOfStops': 0,
+                    'blacklistedInEU': False
+                })
+                departure = arrival + timedelta(minutes=rng.randint(45, 240))
+            itineraries.append({'duration': _iso_duration(arrival - itinerary_start), 'segments': segments})
+
+        base_price = rng.uniform(90, 1400) * len(directions)
+        total = f"{base_price * 1.12 * num_travelers:.2f}"
+        cabin = rng.choice(CABINS)
+        offers.append({
+            'type': 'flight-offer',
+            'id': str(offer_id),
+            'source': 'GDS',
+            'instantTicketingRequired': False,
+            'nonHomogeneous': False,
+            'oneWay': False,
+            'lastTicketingDate': directions[0][2],
+            'numberOfBookableSeats': rng.randint(1, 9),
+            'itineraries': itineraries,
+            'price': {'currency': 'USD', 'total': total, 'base': f"{base_price * num_travelers:.2f}",
+                      'fees': [{'amount': '0.00', 'type': 'SUPPLIER'}, {'amount': '0.00', 'type': 'TICKETING'}],
+                      'grandTotal': total},
+            'pricingOptions': {'fareType': ['PUBLISHED'], 'includedCheckedBagsOnly': False},
+            'validatingAirlineCodes': [itineraries[0]['segments'][0]['carrierCode']],
+            'travelerPricings': [{
+                'travelerId': str(traveler_id),
+                'fareOption': 'STANDARD',
+                'travelerType': 'ADULT',
+                'price': {'currency': 'USD', 'total': f"{base_price * 1.12:.2f}", 'base': f"{base_price:.2f}"},
+                'fareDetailsBySegment': [{'segmentId': segment_id, 'cabin': cabin, 'fareBasis': 'KAA0AFEN',
+                                          'class': 'K', 'includedCheckedBags': {'quantity': 0}}
+                                         for segment_id in segment_ids]
+            } for traveler_id in range(1, num_travelers + 1)]
+        })
+
+    return {
+        'meta': {'count': len(offers)},
+        'data': offers,
+        'dictionaries': {
+            'locations': {code: {'cityCode': CITY_CODES.get(code, code), 'countryCode': 'US'}
+                          for code in sorted(locations)},
+            'aircraft': AIRCRAFT,
+            'currencies': {'USD': 'US DOLLAR'},
+            'carriers': CARRIERS
+        }
+    }
+
+
+def recording_key(url: str) -> str:
+    """
+    Key of a recorded response: the normalized search url without its host, so that searches recorded against
+    Amadeus are replayed by a server listening on any local port.
+    """
+    return ResponseCache.make_key(urlsplit(url)._replace(scheme='', netloc='').geturl())
+
+
+def record_responses(responses_by_url: dict[str, dict], path: str) -> None:
+    """
+    Saves responses so MockAmadeusServer can replay them, keyed by `recording_key`. E.g. record a live search once
+    with `{url: client.find_flights(url) for url in urls}` and benchmark against it offline.
+    """
+    serialization.dump_file({recording_key(url): response for url, response in responses_by_url.items()}, path)
+
+
+class MockAmadeusServer:
+    """
+    Local stand-in for the Amadeus OAuth and flight-offers endpoints, served from a background thread. Flight searches
+    replay a recorded response when the search url was recorded and otherwise a synthetic one generated from the query
+    parameters (see `generate_flight_offers`). Latency, 429 responses and timeouts can be injected to exercise the
+    client's retries and error handling, and `revoke_tokens` makes searches with the tokens issued so far fail with a
+    401 as an early revocation would.
+
+    Run against it by setting `FlightSearchParameters.base_url` to `server.url`:
+        with MockAmadeusServer(latency_seconds=0.05) as server:
+            params = FlightSearchParameters(..., base_url=server.url)
+    """
+    TOKEN_EXPIRES_IN = 1799
+
+    def __init__(self, recordings: dict[str, dict] = None, num_offers: int = 250,
+                 segments_per_itinerary: tuple = (1, 2, 3), latency_seconds: float = 0.0,
+                 rate_limit_every: int = 0, retry_after_seconds: int = 0, timeout_every: int = 0,
+                 timeout_seconds: float = 35.0, use_gzip: bool = True):
+        """
+        :param recordings: Responses to replay, keyed by `recording_key` of the search url.
+        :param num_offers: Number of offers of the synthetic responses.
+        :param segments_per_itinerary: Segment counts cycled through the synthetic itineraries.
+        :param latency_seconds: Delay added before every response.
+        :param rate_limit_every: Answer every n-th flight search with a 429, 0 to disable.
+        :param retry_after_seconds: Retry-After header of the 429 responses.
+        :param timeout_every: Stall every n-th flight search for `timeout_seconds`, 0 to disable.
+        :param timeout_seconds: How long a stalled search waits before answering, longer than the client read timeout.
+        :param use_gzip: Gzip the flight-offers responses when the client accepts it, as Amadeus does.
+        """
+        self.recordings = recordings or dict()
+        self.num_offers = num_offers
+        self.segments_per_itinerary = segments_per_itinerary
+        self.latency_seconds = latency_seconds
+        self.rate_limit_every = rate_limit_every
+        self.retry_after_seconds = retry_after_seconds
+        self.timeout_every = timeout_every
+        self.timeout_seconds = timeout_seconds
+        self.use_gzip = use_gzip
+
+        self.request_counts = {'token': 0, 'flight_offers': 0, 'rate_limited': 0, 'timed_out': 0,
+                               'unauthorized': 0}
+        self._valid_tokens: set[str] = set()
+        self._bodies: dict[tuple[str, bool], bytes] = dict()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        # Stalled handlers must not hold up stop()
+        self._server.daemon_threads = True
+        self._server.block_on_close = False
+        self._thread = None
+
+    @classmethod
+    def from_recording(cls, path: str, **kwargs) -> 'MockAmadeusServer':
+        return cls(recordings=serialization.load_file(path), **kwargs)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> 'MockAmadeusServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'MockAmadeusServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def revoke_tokens(self) -> None:
+        """Rejects every access token issued so far, the next searches using one of them get a 401."""
+        with self._lock:
+            self._valid_tokens.clear()
+
+    def _issue_token(self) -> str:
+        with self._lock:
+            self.request_counts['token'] += 1
+            token = f"mock-{self.request_counts['token']}-{time.time_ns()}"
+            self._valid_tokens.add(token)
+        return token
+
+    def _is_authorized(self, authorization: str) -> bool:
+        token = authorization.split(' ', 1)[-1] if authorization else None
+        with self._lock:
+            if token in self._valid_tokens:
+                return True
+            self.request_counts['unauthorized'] += 1
+            return False
+
+    def flight_offers_body(self, path: str, compressed: bool = False) -> bytes:
+        """
+        Serialized (and optionally gzipped) response of a flight search path, built once per distinct search so the
+        server's own CPU time stays out of the client's timings.
+        """
+        key = recording_key(path)
+        with self._lock:
+            body = self._bodies.get((key, compressed))
+        if body is None:
+            response = self.recordings.get(key)
+            if response is None:
+                query = dict(parse_qsl(urlsplit(path).query))
+                response = generate_flight_offers(
+                    origin=query.get('originLocationCode', 'SFO'),
+                    destination=query.get('destinationLocationCode', 'JFK'),
+                    departure_date=query.get('departureDate', '2025-03-01'), return_date=query.get('returnDate'),
+                    num_offers=self.num_offers, segments_per_itinerary=self.segments_per_itinerary,
+                    num_travelers=int(query.get('adults', 1)), seed=zlib.crc32(key.encode()))
+            body = serialization.dumps(response)
+            if compressed:
+                body = gzip.compress(body, compresslevel=5)
+            with self._lock:
+                self._bodies[(key, compressed)] = body
+        return body
+
+    def _next_search_outcome(self) -> str:
+        with self._lock:
+            self.request_counts['flight_offers'] += 1
+            count = self.request_counts['flight_offers']
+            if self.rate_limit_every and count % self.rate_limit_every == 0:
+                self.request_counts['rate_limited'] += 1
+                return 'rate_limited'
+            if self.timeout_every and count % self.timeout_every == 0:
+                self.request_counts['timed_out'] += 1
+                return 'timed_out'
+        return 'ok'
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class MockAmadeusHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately, with Nagle's algorithm every response would wait on a delayed ACK
+            disable_nagle_algorithm = True
+
+            def _send(self, status: int, body: bytes, headers: dict[str, str] = None) -> None:
+                try:
+                    self.send_response(status)
+                    for name, value in {'Content-Type': 'application/json', **(headers or dict())}.items():
+                        self.send_header(name, value)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on a stalled search
+                    self.close_connection = True
+
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                time.sleep(server.latency_seconds)
+                if not self.path.startswith('/v1/security/oauth2/token'):
+                    return self._send(404, b'{"errors": [{"status": 404}]}')
+                self._send(200, serialization.dumps({'type': 'amadeusOAuth2Token', 'token_type': 'Bearer',
+                                                     'access_token': server._issue_token(),
+                                                     'expires_in': server.TOKEN_EXPIRES_IN, 'state': 'approved'}))
+
+            def do_GET(self) -> None:
+                if '/shopping/flight-offers' not in self.path:
+                    return self._send(404, b'{"errors": [{"status": 404}]}')
+                if not server._is_authorized(self.headers.get('Authorization')):
+                    return self._send(401, b'{"errors": [{"status": 401, "title": "Invalid access token"}]}')
+                outcome = server._next_search_outcome()
+                time.sleep(server.latency_seconds + (server.timeout_seconds if outcome == 'timed_out' else 0))
+                if outcome == 'rate_limited':
+                    return self._send(429, b'{"errors": [{"status": 429, "title": "Too many requests"}]}',
+                                      headers={'Retry-After': str(server.retry_after_seconds)})
+
+                compressed = server.use_gzip and 'gzip' in self.headers.get('Accept-Encoding', '')
+                self._send(200, server.flight_offers_body(self.path, compressed=compressed),
+                           headers={'Content-Encoding': 'gzip'} if compressed else None)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return MockAmadeusHandler
@@ -1,37 +1,67 @@
+import hashlib
 import re
-from datetime import datetime
-from flight_info import Segment
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Iterable, Iterator
 
-def get_flight_time(time_str: str) -> str:
-    date_time_obj = datetime.fromisoformat(time_str)
-    return date_time_obj.strftime('%I:%M %p').lower()
+import tracing
+from flight_info import Fare, FareObservations, FlightDictionaries, Itinerary, Offer, Segment
 
-def get_next_day_arrival_str(departure_time: str, arrival_time: str) -> str:
-    departure_time = datetime.strptime(departure_time, "%Y-%m-%dT%H:%M:%S")
-    arrival_time = datetime.strptime(arrival_time, "%Y-%m-%dT%H:%M:%S")
-    day_measure = (arrival_time - departure_time).days
-    return f"+{day_measure}" if day_measure > 0 else ''
+DURATION_PATTERN = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+UNKNOWN_CABIN_TYPE = 'Cabin Type'
 
-def transform_duration_str(duration: str) -> str:
-    match = re.match(r'PT(?:(\d+)H)?(?:(\d+)M)?', duration)
+def parse_duration(duration: str) -> timedelta:
+    match = DURATION_PATTERN.match(duration)
     if match:
-        hours = int(match.group(1)) if match.group(1) else 0
-        minutes = int(match.group(2)) if match.group(2) else 0
-        return f"{hours}h {minutes:02d}m"
+        days, hours, minutes, seconds = match.groups('0')
+        # Positional (days, seconds) skips timedelta's keyword normalization, a third of the cost of parsing one
+        return timedelta(int(days), int(hours) * 3600 + int(minutes) * 60 + int(seconds))
     else:
         raise ValueError("Invalid duration format.")
 
-def calc_time_difference(start_str: str, end_str: str) -> str:
+# Durations under a day in the forms Amadeus sends them ("PT2H35M", "PT2H", "PT45M"), built once so that nearly every
+# segment and itinerary duration is a lookup instead of a parse. Parsing was most of the cost of the typed model.
+COMMON_DURATIONS = {f"PT{hours}H{minutes}M": timedelta(hours=hours, minutes=minutes)
+                    for hours in range(24) for minutes in range(60)}
+COMMON_DURATIONS.update({f"PT{hours}H": timedelta(hours=hours) for hours in range(24)})
+COMMON_DURATIONS.update({f"PT{minutes}M": timedelta(minutes=minutes) for minutes in range(60)})
+
+class ParsedDurations(dict):
     """
-    Calculates the time difference between two datetime strings (typically arrival and departure times).
-    :param start_str: Start time as a string in the format "%Y-%m-%dT%H:%M:%S".
-    :param end_str: End time as a string in the same format.
-    :return: A string representing the time difference (e.g., "2h 15m" or "45m").
+    Durations by their raw string, starting from COMMON_DURATIONS. Any other duration is parsed on first lookup, and
+    shared by the segments and offers of the response from then on.
     """
-    start_dt = datetime.strptime(start_str, "%Y-%m-%dT%H:%M:%S")
-    end_dt = datetime.strptime(end_str, "%Y-%m-%dT%H:%M:%S")
+    def __init__(self):
+        super().__init__(COMMON_DURATIONS)
+
+    def __missing__(self, duration: str) -> timedelta:
+        parsed = self[duration] = parse_duration(duration)
+        return parsed
+
+def _as_datetime(time: datetime | str) -> datetime:
+    return datetime.fromisoformat(time) if isinstance(time, str) else time
 
-    diff = end_dt - start_dt
+def get_flight_time(time: datetime | str) -> str:
+    return _as_datetime(time).strftime('%I:%M %p').lower()
+
+def get_next_day_arrival_str(departure_time: datetime | str, arrival_time: datetime | str) -> str:
+    day_measure = (_as_datetime(arrival_time) - _as_datetime(departure_time)).days
+    return f"+{day_measure}" if day_measure > 0 else ''
+
+def transform_duration_str(duration: timedelta | str) -> str:
+    if isinstance(duration, str):
+        duration = parse_duration(duration)
+    total_minutes = int(duration.total_seconds() // 60)
+    return f"{total_minutes // 60}h {total_minutes % 60:02d}m"
+
+def calc_time_difference(start: datetime | str, end: datetime | str) -> str:
+    """
+    Calculates the time difference between two datetimes (typically arrival and departure times).
+    :param start: Start time as a datetime or a string in the format "%Y-%m-%dT%H:%M:%S".
+    :param end: End time in the same form.
+    :return: A string representing the time difference (e.g., "2h 15m" or "45m").
+    """
+    diff = _as_datetime(end) - _as_datetime(start)
 
     total_minutes = int(diff.total_seconds() // 60)
     hours = total_minutes // 60
@@ -42,37 +72,157 @@ def calc_time_difference(start_str: str, end_str: str) -> str:
     else:
         return f"{hours}h {minutes}m"
 
-def get_cabin_type(flight_offer: dict, segment_id: str) -> str:
-    for fair_details_segment in flight_offer['travelerPricings'][0]['fareDetailsBySegment']:
-        if fair_details_segment['segmentId'] == segment_id:
-            return fair_details_segment['cabin']
-    return 'Cabin Type'
+def index_segment_cabins(flight_offer: dict) -> dict[str, str]:
+    """
+    Indexes the cabin of every segment of an offer by segment id in a single pass over the fare details. Travelers
+    may be booked in different cabins on the same segment, e.g. an infant or an upgraded companion, so distinct
+    cabins are joined with "/" in traveler order. Segments without any cabin are left out.
+    :param flight_offer: A single flight offer from the response.
+    :return: A dictionary mapping segment ids to their cabin type.
+    """
+    segment_cabins = dict()
+    for traveler_pricing in flight_offer.get('travelerPricings', []):
+        for fare_details_segment in traveler_pricing.get('fareDetailsBySegment', []):
+            cabin = fare_details_segment.get('cabin')
+            if cabin:
+                cabin_type = segment_cabins.setdefault(fare_details_segment['segmentId'], cabin)
+                if cabin_type != cabin and cabin not in cabin_type.split('/'):
+                    segment_cabins[fare_details_segment['segmentId']] = f"{cabin_type}/{cabin}"
+    return segment_cabins
+
+def get_flight_dictionaries(flight_results: dict) -> FlightDictionaries:
+    dictionaries = flight_results.get('dictionaries', {})
+    return FlightDictionaries(carriers=dictionaries.get('carriers', {}), aircraft=dictionaries.get('aircraft', {}),
+                              locations=dictionaries.get('locations', {}))
+
+def parse_flight_offer(flight_offer: dict, durations: ParsedDurations = None,
+                       timestamps: dict[str, datetime] = None) -> Offer:
+    """
+    Parses a single flight offer into typed Offer -> Itinerary -> Segment objects. Prices, timestamps and durations
+    are converted once here so rendering doesn't re-parse strings.
+    :param flight_offer: A single flight offer from the response.
+    :param durations: Durations parsed so far, shared by the offers of a response to parse each one once.
+    :param timestamps: Timestamps parsed so far, shared likewise so that offers on the same flights share datetimes.
+    :return: The parsed offer.
+    """
+    durations = ParsedDurations() if durations is None else durations
+    timestamps = {} if timestamps is None else timestamps
+    fromisoformat = datetime.fromisoformat
+    fare = Fare(Decimal(flight_offer['price']['total']), flight_offer['price']['currency'],
+                int(flight_offer['numberOfBookableSeats']), max(len(flight_offer.get('travelerPricings', [])), 1))
+    segment_cabins = index_segment_cabins(flight_offer)
+    itineraries = []
+    for itinerary in flight_offer['itineraries']:
+        total_duration = durations[itinerary['duration']]
+        segments = []
+        for segment in itinerary['segments']:
+            departure, arrival = segment['departure'], segment['arrival']
+            # Timestamps are parsed ahead of the lookup, fromisoformat costs less than a __missing__ call on a miss.
+            # Positional arguments in field order (as for Fare, Itinerary and Offer), keywords made building a Segment
+            # the bulk of the parse time.
+            departure_time = timestamps.setdefault(departure['at'], fromisoformat(departure['at']))
+            arrival_time = timestamps.setdefault(arrival['at'], fromisoformat(arrival['at']))
+            seg = Segment(fare, total_duration, segment['id'], departure['iataCode'], departure_time,
+                          arrival['iataCode'], arrival_time, segment['carrierCode'], segment['number'],
+                          segment['aircraft']['code'], int(segment['numberOfStops']), durations[segment['duration']],
+                          segment_cabins.get(segment['id'], UNKNOWN_CABIN_TYPE))
+            segments.append(seg)
+        itineraries.append(Itinerary(total_duration, tuple(segments)))
+    return Offer(flight_offer['id'], fare, tuple(itineraries))
+
+def iter_flight_offers(flight_offers: Iterable[dict]) -> Iterator[Offer]:
+    """
+    Lazily parses raw flight offers, e.g. the offers of an AmadeusClient.FlightOfferStream as they are downloaded.
+    :param flight_offers: Iterable of raw flight offers.
+    :return: An iterator over the parsed offers.
+    """
+    durations, timestamps = ParsedDurations(), {}
+    for flight_offer in flight_offers:
+        yield parse_flight_offer(flight_offer, durations, timestamps)
+
+def get_flight_offers(flight_results: dict) -> list[Offer]:
+    with tracing.span('parse.flight_offers', num_offers=len(flight_results['data'])):
+        return list(iter_flight_offers(flight_results['data']))
+
+# Keys of the segments of an offer, shared by every offer instead of formatted per offer
+FLIGHT_KEYS = tuple(f"flight_{i + 1}" for i in range(64))
 
 def get_flight_offer_segments(flight_results: dict) -> dict[str, dict[str, Segment]]:
     flight_offers = {}
-    for flight_offer in flight_results['data']:
-        itineraries = []
-        for itinerary in flight_offer['itineraries']:
-            segments = []
-            for segment in itinerary['segments']:
-                seg = Segment(
-                    offer_price=flight_offer['price']['total'],
-                    currency=flight_offer['price']['currency'],
-                    total_duration=itinerary['duration'],
-                    bookable_seats=flight_offer['numberOfBookableSeats'],
-                    segment_id=segment['id'],
-                    departure_airport=segment['departure']['iataCode'],
-                    departure_time=segment['departure']['at'],
-                    arrival_airport=segment['arrival']['iataCode'],
-                    arrival_time=segment['arrival']['at'],
-                    carrier_code=segment['carrierCode'],
-                    flight_number=segment['number'],
-                    aircraft_code=segment['aircraft']['code'],
-                    stops=segment['numberOfStops'],
-                    flight_duration=segment['duration'],
-                    cabin_type=get_cabin_type(flight_offer, segment['id'])
-                    )
-                segments.append(seg)
-            itineraries.extend(segments)
-        flight_offers[f"flight_offer_{flight_offer['id']}"] = dict(zip([f"flight_{i+1}" for i in range(len(itineraries))], itineraries))
-    return flight_offers
\ No newline at end of file
+    for offer in get_flight_offers(flight_results):
+        segments = offer.segments
+        flight_keys = FLIGHT_KEYS if len(segments) <= len(FLIGHT_KEYS) else \
+            [f"flight_{i + 1}" for i in range(len(segments))]
+        flight_offers[f"flight_offer_{offer.offer_id}"] = dict(zip(flight_keys, segments))
+    return flight_offers
+
+def segment_key(carrier_code: str, flight_number: str, departure_time: datetime | str, cabin: str | None) -> str:
+    """
+    Canonical key of a flown segment, e.g. "UA1234@2025-03-01T08:15/ECONOMY". Offer ids, prices and segment ids are
+    left out since they change between responses for the very same flights.
+    """
+    return f"{carrier_code}{flight_number}@{_as_datetime(departure_time):%Y-%m-%dT%H:%M}/{cabin or ''}"
+
+def fingerprint_from_keys(itinerary_keys: Iterable[str]) -> int:
+    """
+    Hashes the segment keys of every itinerary of an offer (comma-joined per itinerary, itineraries joined by "|") into
+    a signed 64-bit fingerprint. blake2b keeps it stable across processes, unlike the built-in `hash` of a string.
+    """
+    digest = hashlib.blake2b('|'.join(itinerary_keys).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+def offer_fingerprint(offer: Offer) -> int:
+    """
+    Canonical fingerprint of the flights of an offer: the same carriers, flight numbers, departure times and cabins
+    give the same fingerprint whichever search, date window or run returned them.
+    """
+    return fingerprint_from_keys(
+        ','.join(segment_key(segment.carrier_code, segment.flight_number, segment.departure_time,
+                             None if segment.cabin_type == UNKNOWN_CABIN_TYPE else segment.cabin_type)
+                 for segment in itinerary.segments)
+        for itinerary in offer.itineraries)
+
+class OfferDeduplicator:
+    """
+    Keeps the cheapest offer per fingerprint across any number of searches, and how its price moved between the
+    observations. Offers are fed in observation order, e.g. search by search or as they are streamed.
+    """
+    def __init__(self):
+        self.offers: dict[int, Offer] = dict()
+        self.observations: dict[int, FareObservations] = dict()
+
+    def add(self, offer: Offer) -> bool:
+        """
+        Records an observation of `offer`.
+        :return: True when the offer is kept, i.e. its itinerary wasn't seen before or it is cheaper than the kept one.
+        """
+        fingerprint = offer_fingerprint(offer)
+        price = offer.fare.price
+        observations = self.observations.get(fingerprint)
+        if observations is None:
+            self.observations[fingerprint] = FareObservations(num_observations=1, first_price=price,
+                                                              last_price=price, min_price=price, max_price=price)
+            self.offers[fingerprint] = offer
+            return True
+
+        observations.num_observations += 1
+        observations.last_price = price
+        observations.max_price = max(observations.max_price, price)
+        if price < observations.min_price:
+            observations.min_price = price
+            self.offers[fingerprint] = offer
+            return True
+        return False
+
+    def unique_offers(self) -> list[Offer]:
+        return list(self.offers.values())
+
+    def __len__(self) -> int:
+        return len(self.offers)
+
+def deduplicate_flight_offers(flight_offers: Iterable[Offer]) -> list[Offer]:
+    """Keeps the cheapest offer per fingerprint, in order of first appearance."""
+    deduplicator = OfferDeduplicator()
+    for offer in flight_offers:
+        deduplicator.add(offer)
+    return deduplicator.unique_offers()
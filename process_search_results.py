@@ -2,64 +2,285 @@ import os
 import pandas as pd
 from datetime import datetime
 
+import serialization
+from parse_flight_offers import fingerprint_from_keys, index_segment_cabins, segment_key
+from result_store import RESULT_STORE_ROOT, FlightResultStore
 
-def aggregate_bulk_flight_search(flight_search_responses: list[dict]) -> pd.DataFrame:
-    all_search_results = pd.DataFrame()
-    for search_subset in flight_search_responses:
-        subset_data = pd.DataFrame()
-        for k, search in search_subset.items():
-            flight_df = create_flights_dataframe(flight_results=search)
-            flight_df = map_flight_metadata(flight_data=flight_df, flight_dictionaries=search['dictionaries'])
-            flight_df = add_num_of_stops(flight_df)
-            subset_data = pd.concat([subset_data, flight_df])
-        all_search_results = pd.concat([all_search_results, subset_data])
+SEGMENT_FIELDS = ['origin', 'destination', 'departure_time', 'arrival_time', 'carrier_code', 'flight_number',
+                  'aircraft_code', 'duration', 'cabin']
+ITINERARY_FIELDS = ['offer_id', 'itinerary_id', 'itinerary_index', 'segment_number', 'total_price', 'currency',
+                    'validating_airline', 'fingerprint']
+SEARCH_FIELDS = ['search_key', 'search_group']
+DEDUPLICATION_FIELDS = ['fingerprint', 'num_observations', 'price_delta']
+CATEGORICAL_FIELDS = ['validating_airline', 'origin', 'destination', 'carrier_code', 'aircraft_code', 'cabin',
+                      'search_key']
+ISO_DURATION_PATTERN = r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$'
+SEARCH_KEY_DATES_PATTERN = r'\((\d{4}-\d{2}-\d{2})/(\d{4}-\d{2}-\d{2}|None)\)$'
+# pyarrow's extract_regex needs named groups
+ARROW_ISO_DURATION_PATTERN = (r'^P(?:(?P<days>\d+)D)?'
+                              r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$')
+ARROW_SEARCH_KEY_DATES_PATTERN = r'\((?P<departure>\d{4}-\d{2}-\d{2})/(?P<return>\d{4}-\d{2}-\d{2}|None)\)$'
+
+
+def aggregate_bulk_flight_search(flight_search_responses: list[dict], deduplicate: bool = True) -> pd.DataFrame:
+    """
+    Combines the responses of a bulk search into one wide DataFrame, one row per itinerary, tagged with the search it
+    came from (search_key, search_group and the queried dates).
+    :param flight_search_responses: List of {search key: flight-offers response} dicts, e.g. the output of
+    `dual_direction_bulk_flight_search`.
+    :param deduplicate: Keep only the cheapest observation of offers returned by several searches (see
+    `deduplicate_offers`).
+    :return: The aggregated DataFrame, empty when no search returned any offer.
+    """
+    segments_table = aggregate_bulk_segments(flight_search_responses)
+    if segments_table.empty:
+        return pd.DataFrame()
+    if deduplicate:
+        segments_table = deduplicate_offers(segments_table)
+    dictionaries = merge_flight_dictionaries(flight_search_responses)
 
+    all_search_results = segments_to_wide(segments_table)
+    all_search_results = map_flight_metadata(flight_data=all_search_results, flight_dictionaries=dictionaries)
+    all_search_results = add_num_of_stops(all_search_results)
     all_search_results['departure_date'] = all_search_results['departure_time_1'].dt.date
     return all_search_results
 
 
-def create_flights_dataframe(flight_results: dict[str, any]) -> pd.DataFrame:
-    rows = []
+def aggregate_bulk_segments(flight_search_responses: list[dict]) -> pd.DataFrame:
+    """
+    Flattens every response of a bulk search into a single long segments table. Columns are accumulated across all the
+    searches and materialized once, so the cost stays linear in the number of segments.
+    :param flight_search_responses: List of {search key: flight-offers response} dicts.
+    :return: The segments table of `create_segments_table` plus search_key, search_group and the queried dates.
+    """
+    columns = _new_segment_columns(with_search_fields=True)
     itinerary_counter = 1
+    for search_group, search_subset in enumerate(flight_search_responses):
+        for search_key, search in search_subset.items():
+            itinerary_counter = _append_segment_columns(columns, search, itinerary_counter,
+                                                        search_key=search_key, search_group=search_group)
+    segments_table = _materialize_segment_columns(columns)
+
+    query_dates = segments_table['search_key'].astype(str).str.extract(SEARCH_KEY_DATES_PATTERN)
+    segments_table['query_departure_date'] = pd.to_datetime(query_dates[0], format='%Y-%m-%d')
+    segments_table['query_return_date'] = pd.to_datetime(query_dates[1], format='%Y-%m-%d', errors='coerce')
+    return segments_table
+
+
+def aggregate_bulk_segments_arrow(flight_search_responses: list[dict]):
+    """
+    Same columns as `aggregate_bulk_segments` but builds a pyarrow Table straight from the accumulated columns,
+    skipping the intermediate pandas objects: timestamps in seconds, durations as `duration('s')` and categoricals as
+    dictionary arrays. Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = _new_segment_columns(with_search_fields=True)
+    itinerary_counter = 1
+    for search_group, search_subset in enumerate(flight_search_responses):
+        for search_key, search in search_subset.items():
+            itinerary_counter = _append_segment_columns(columns, search, itinerary_counter,
+                                                        search_key=search_key, search_group=search_group)
+
+    arrays = dict()
+    for name, values in columns.items():
+        if name in ('departure_time', 'arrival_time'):
+            arrays[name] = pc.strptime(pa.array(values, pa.string()), format='%Y-%m-%dT%H:%M:%S', unit='s')
+        elif name == 'duration':
+            arrays[name] = _parse_iso_durations_arrow(pa.array(values, pa.string()))
+        elif name in CATEGORICAL_FIELDS:
+            arrays[name] = pa.array(values, pa.string()).dictionary_encode()
+        elif name == 'total_price':
+            arrays[name] = pa.array(values, pa.float64())
+        else:
+            arrays[name] = pa.array(values)
+
+    query_dates = pc.extract_regex(pa.array(columns['search_key'], pa.string()), ARROW_SEARCH_KEY_DATES_PATTERN)
+    arrays['query_departure_date'] = pc.strptime(query_dates.field('departure'), format='%Y-%m-%d', unit='s',
+                                                 error_is_null=True)
+    arrays['query_return_date'] = pc.strptime(query_dates.field('return'), format='%Y-%m-%d', unit='s',
+                                              error_is_null=True)
+    return pa.table(arrays)
+
+
+def _parse_iso_durations_arrow(durations):
+    """Arrow counterpart of `parse_iso_durations`, null where the string is missing or malformed."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    parts = pc.extract_regex(durations, ARROW_ISO_DURATION_PATTERN)
+    seconds = None
+    for field, unit_seconds in (('days', 86400), ('hours', 3600), ('minutes', 60), ('seconds', 1)):
+        # Groups that did not take part in the match are empty strings
+        values = parts.field(field)
+        values = pc.multiply(pc.cast(pc.if_else(pc.equal(values, ''), '0', values), pa.int64()), unit_seconds)
+        seconds = values if seconds is None else pc.add(seconds, values)
+    seconds = pc.if_else(pc.is_valid(parts), seconds, pa.scalar(None, pa.int64()))
+    return pc.cast(seconds, pa.duration('s'))
+
+
+def merge_flight_dictionaries(flight_search_responses: list[dict]) -> dict[str, dict]:
+    merged = {'carriers': dict(), 'aircraft': dict(), 'locations': dict()}
+    for search_subset in flight_search_responses:
+        for search in search_subset.values():
+            for name, mapping in search.get('dictionaries', {}).items():
+                merged.setdefault(name, dict()).update(mapping)
+    return merged
+
+
+def parse_iso_durations(durations: pd.Series) -> pd.Series:
+    """
+    Vectorized conversion of ISO-8601 durations (e.g. "PT2H35M" or "P1DT3H") into timedeltas.
+    :param durations: Series of duration strings.
+    :return: Series of timedeltas, NaT where the string is missing or malformed.
+    """
+    parts = durations.str.extract(ISO_DURATION_PATTERN).astype(float)
+    seconds = (parts[0].fillna(0) * 86400 + parts[1].fillna(0) * 3600 + parts[2].fillna(0) * 60 + parts[3].fillna(0))
+    seconds[parts.isna().all(axis=1)] = float('nan')
+    return pd.to_timedelta(seconds, unit='s')
+
+
+def _new_segment_columns(with_search_fields: bool = False) -> dict[str, list]:
+    names = ITINERARY_FIELDS + SEGMENT_FIELDS + (SEARCH_FIELDS if with_search_fields else [])
+    return {name: [] for name in names}
+
 
+def _append_segment_columns(columns: dict[str, list], flight_results: dict[str, any], itinerary_counter: int,
+                            **search_fields) -> int:
+    """
+    Appends one row per segment of `flight_results` to `columns`, plus the constant `search_fields` values. The
+    offer's fingerprint (see `parse_flight_offers.offer_fingerprint`) is hashed in the same pass.
+    :return: The next free itinerary id.
+    """
     for flight in flight_results['data']:
-        price = flight.get('price', {}).get('total', None)
+        segment_cabins = index_segment_cabins(flight)
+        price = flight.get('price', {})
+        total_price = float(price['total']) if price.get('total') is not None else None
         validating_codes = flight.get('validatingAirlineCodes', [])
         airline = validating_codes[0] if validating_codes else None
+        itineraries = [itinerary for itinerary in flight.get('itineraries', []) if itinerary.get('segments')]
+        fingerprint = fingerprint_from_keys(
+            ','.join(segment_key(segment.get('carrierCode'), segment.get('number'), segment['departure'].get('at'),
+                                 segment_cabins.get(segment.get('id')))
+                     for segment in itinerary['segments'])
+            for itinerary in itineraries)
 
-        # Each flight can contain one or more itineraries
-        itineraries = flight.get('itineraries', [])
-        if not itineraries:
-            continue
-
-        for itinerary in itineraries:
+        for itinerary_index, itinerary in enumerate(flight.get('itineraries', [])):
             segments = itinerary.get('segments', [])
             if not segments:
                 continue
 
-            row = {'total_price': float(price)}
             for i, segment in enumerate(segments, start=1):
-                departure_time_str = segment['departure'].get('at')
-                arrival_time_str = segment['arrival'].get('at')
-
-                departure_time = (datetime.fromisoformat(departure_time_str) if departure_time_str else None)
-                arrival_time = (datetime.fromisoformat(departure_time_str) if arrival_time_str else None)
-
-                row.update({
-                    'itinerary_id': itinerary_counter,
-                    f'origin_{i}': segment['departure'].get('iataCode'),
-                    f'destination_{i}': segment['arrival'].get('iataCode'),
-                    f'departure_time_{i}': departure_time,
-                    f'arrival_time_{i}': arrival_time,
-                    f'carrier_code_{i}': segment.get('carrierCode'),
-                    f'flight_number_{i}': segment.get('number'),
-                    f'aircraft_code_{i}': segment.get('aircraft').get('code'),
-                    f'duration_{i}': segment.get('duration'),
-                })
-
-            rows.append(row)
+                columns['offer_id'].append(flight.get('id'))
+                columns['itinerary_id'].append(itinerary_counter)
+                columns['itinerary_index'].append(itinerary_index)
+                columns['segment_number'].append(i)
+                columns['total_price'].append(total_price)
+                columns['currency'].append(price.get('currency'))
+                columns['validating_airline'].append(airline)
+                columns['fingerprint'].append(fingerprint)
+                columns['origin'].append(segment['departure'].get('iataCode'))
+                columns['destination'].append(segment['arrival'].get('iataCode'))
+                columns['departure_time'].append(segment['departure'].get('at'))
+                columns['arrival_time'].append(segment['arrival'].get('at'))
+                columns['carrier_code'].append(segment.get('carrierCode'))
+                columns['flight_number'].append(segment.get('number'))
+                columns['aircraft_code'].append(segment.get('aircraft', {}).get('code'))
+                columns['duration'].append(segment.get('duration'))
+                columns['cabin'].append(segment_cabins.get(segment.get('id')))
+                for name, value in search_fields.items():
+                    columns[name].append(value)
             itinerary_counter += 1
-    return pd.DataFrame(rows)
+    return itinerary_counter
+
+
+def _materialize_segment_columns(columns: dict[str, list]) -> pd.DataFrame:
+    segments_table = pd.DataFrame(columns)
+    segments_table['total_price'] = segments_table['total_price'].astype(float)
+    segments_table['departure_time'] = pd.to_datetime(segments_table['departure_time'], format='ISO8601')
+    segments_table['arrival_time'] = pd.to_datetime(segments_table['arrival_time'], format='ISO8601')
+    segments_table['duration'] = parse_iso_durations(segments_table['duration'].astype(object))
+    for col in CATEGORICAL_FIELDS:
+        if col in segments_table:
+            segments_table[col] = segments_table[col].astype('category')
+    return segments_table
+
+
+def create_segments_table(flight_results: dict[str, any]) -> pd.DataFrame:
+    """
+    Flattens a flight-offers response into a long table with one row per segment. Columns are filled in a single pass
+    over data -> itineraries -> segments and converted afterward with vectorized datetime, duration and categorical
+    conversions.
+    :param flight_results: Flight-offers response from the Amadeus API.
+    :return: A DataFrame with one row per segment, keyed by offer_id, itinerary_id and segment_number.
+    """
+    columns = _new_segment_columns()
+    _append_segment_columns(columns, flight_results, itinerary_counter=1)
+    return _materialize_segment_columns(columns)
+
+
+def segments_to_wide(segments_table: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pivots the long segments table into the wide one-row-per-itinerary layout (origin_1, destination_1, ...).
+    :param segments_table: Output of `create_segments_table` or `aggregate_bulk_segments`.
+    :return: A DataFrame with the itinerary-level columns followed by the per-segment columns suffixed by segment
+    number.
+    """
+    if segments_table.empty:
+        return pd.DataFrame()
+
+    segment_columns = segments_table[['itinerary_id', 'segment_number'] + SEGMENT_FIELDS].copy()
+    for col in CATEGORICAL_FIELDS:
+        if col in segment_columns:
+            segment_columns[col] = segment_columns[col].astype(object)
+    wide = segment_columns.set_index(['itinerary_id', 'segment_number']).unstack('segment_number')
+
+    num_segments = segments_table['segment_number'].max()
+    ordered_columns = [(field, i) for i in range(1, num_segments + 1) for field in SEGMENT_FIELDS]
+    wide = wide[ordered_columns]
+    wide.columns = [f"{field}_{i}" for field, i in ordered_columns]
+
+    itinerary_level_columns = ['total_price', 'offer_id', 'itinerary_index'] + [
+        col for col in segments_table.columns
+        if col in SEARCH_FIELDS or col in DEDUPLICATION_FIELDS or col.startswith('query_')]
+    itinerary_columns = segments_table.groupby('itinerary_id', sort=True, observed=True)[itinerary_level_columns].first()
+    wide = pd.concat([itinerary_columns[['total_price']], wide, itinerary_columns.drop(columns='total_price')], axis=1)
+    return wide.reset_index()[['total_price', 'itinerary_id'] + [col for col in wide.columns if col != 'total_price']]
+
+
+def _offer_key_columns(segments_table: pd.DataFrame) -> list[str]:
+    # Offer ids are only unique within a response, bulk tables also need the search they came from
+    return [col for col in ('search_group', 'search_key', 'offer_id') if col in segments_table]
+
+
+def deduplicate_offers(segments_table: pd.DataFrame) -> pd.DataFrame:
+    """
+    Collapses offers with the same fingerprint, e.g. returned by overlapping date windows or repeated runs, into their
+    cheapest observation (the earliest one on ties).
+    :param segments_table: Output of `create_segments_table` or `aggregate_bulk_segments`, in observation order.
+    :return: The segments of the kept offers, plus num_observations and price_delta (latest minus first observed price)
+    columns.
+    """
+    if segments_table.empty:
+        return segments_table
+
+    offer_keys = _offer_key_columns(segments_table)
+    offers = segments_table.drop_duplicates(offer_keys)[offer_keys + ['fingerprint', 'total_price']]
+    observed_prices = offers.groupby('fingerprint', sort=False)['total_price']
+    num_observations = observed_prices.size()
+    price_delta = observed_prices.last() - observed_prices.first()
+
+    cheapest = offers.sort_values('total_price', kind='stable').drop_duplicates('fingerprint')
+    kept = pd.MultiIndex.from_frame(segments_table[offer_keys]).isin(pd.MultiIndex.from_frame(cheapest[offer_keys]))
+    deduplicated = segments_table[kept].copy()
+    deduplicated['num_observations'] = deduplicated['fingerprint'].map(num_observations).astype('int32')
+    deduplicated['price_delta'] = deduplicated['fingerprint'].map(price_delta)
+    return deduplicated.reset_index(drop=True)
+
+
+def create_flights_dataframe(flight_results: dict[str, any]) -> pd.DataFrame:
+    return segments_to_wide(create_segments_table(flight_results))
 
 def _rename_code_cols(old_cols: list) -> dict:
     return dict(zip(old_cols, [col.replace('_code', '') for col in old_cols]))
@@ -97,3 +318,31 @@ def map_flight_metadata(flight_data: pd.DataFrame, flight_dictionaries: dict) ->
 def write_bulk_results(bulk_results: pd.DataFrame, origin: str, destination: str, root: str = 'amadeus') -> None:
     flight_file_name = f"{datetime.now().strftime('%Y-%m-%d %H:%M')}_{origin}_{destination}.csv"
     bulk_results.to_csv(os.path.join(root, 'search_results', flight_file_name), index=False)
+
+def write_bulk_responses(flight_search_responses: list[dict], origin: str, destination: str,
+                         root: str = 'amadeus') -> str:
+    """
+    Persists the raw responses of a bulk search so they can be re-aggregated later without calling the API again.
+    :return: Path of the written file.
+    """
+    responses_file_name = f"{datetime.now().strftime('%Y-%m-%d %H:%M')}_{origin}_{destination}.json"
+    path = os.path.join(root, 'search_responses', responses_file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    serialization.dump_file(flight_search_responses, path)
+    return path
+
+def read_bulk_responses(path: str) -> list[dict]:
+    return serialization.load_file(path)
+
+def store_bulk_results(flight_search_responses: list[dict], root: str = RESULT_STORE_ROOT,
+                       deduplicate: bool = True) -> str:
+    """
+    Appends the responses of a bulk search to the Parquet result store, the typed and partitioned replacement for the
+    CSV dumps of `write_bulk_results`. Duplicate offers are dropped first unless `deduplicate` is False, the stored
+    fingerprint links observations of the same flights across batches.
+    :return: The id of the appended batch.
+    """
+    segments_table = aggregate_bulk_segments(flight_search_responses)
+    if deduplicate:
+        segments_table = deduplicate_offers(segments_table)
+    return FlightResultStore(root).append(segments_table)
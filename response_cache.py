@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlsplit
+
+import serialization
+
+
+class ResponseCache(ABC):
+    """
+    Base class for flight-offer response caches. Entries expire after `ttl_seconds` and the cache holds at most
+    `max_entries` responses, evicting the least recently used ones first. Subclasses implement `_get`, `_set` and
+    `clear` over serialized responses, the serialization and hit/miss bookkeeping live here. Every `get` decodes a fresh
+    copy of the response, so callers may mutate it without corrupting the cache.
+    """
+    def __init__(self, ttl_seconds: float = 900, max_entries: int = 512):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        """
+        Normalizes a search url into its canonical form: the scheme, host and endpoint path followed by its non-empty
+        query parameters sorted by name, so that urls differing only in parameter order share an entry. The host is
+        kept so that test, production and mock server responses never share the on-disk cache.
+        """
+        split_url = urlsplit(url)
+        params = sorted((k, v) for k, v in parse_qsl(split_url.query) if k)
+        origin = f"{split_url.scheme}://{split_url.netloc.lower()}" if split_url.netloc else ''
+        return f"{origin}{split_url.path}?" + '&'.join(f"{k}={v}" for k, v in params)
+
+    def get(self, key: str) -> dict | None:
+        body = self._get(key)
+        with self._stats_lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if body is None else serialization.loads(body)
+
+    def set(self, key: str, value: dict, ttl_seconds: float = None) -> None:
+        self.set_serialized(key, serialization.dumps(value), ttl_seconds)
+
+    def set_serialized(self, key: str, body: bytes, ttl_seconds: float = None) -> None:
+        """Adds a response that is already JSON-encoded, e.g. the raw body of a streamed response, as is."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._set(key, body, time.time() + ttl)
+
+    def stats(self) -> dict[str, int]:
+        with self._stats_lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    @abstractmethod
+    def _get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    def _set(self, key: str, body: bytes, expires_at: float) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class LRUResponseCache(ResponseCache):
+    """
+    In-memory cache, shared by every thread (and Streamlit session) of a process. Responses are kept serialized, like
+    in the SQLite cache, so they are compact and no session can mutate another one's results.
+    """
+    def __init__(self, ttl_seconds: float = 900, max_entries: int = 512):
+        super().__init__(ttl_seconds, max_entries)
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, body = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return body
+
+    def _set(self, key: str, body: bytes, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteResponseCache(ResponseCache):
+    """
+    On-disk cache that can be shared by several processes. The database runs in WAL mode so readers never block the
+    writer, and each thread keeps its own connection since sqlite3 connections can't be shared across threads.
+    """
+    def __init__(self, path: str, ttl_seconds: float = 900, max_entries: int = 4096):
+        super().__init__(ttl_seconds, max_entries)
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS responses "
+                         "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, "
+                         "last_access REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> bytes | None:
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            body, expires_at = row
+            if expires_at <= now:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return body
+
+    def _set(self, key: str, body: bytes, expires_at: float) -> None:
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                         (key, body, expires_at, now))
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                         "ORDER BY last_access DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
@@ -0,0 +1,107 @@
+import os
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from datetime import date, datetime
+
+RESULT_STORE_ROOT = 'amadeus/result_store'
+PARTITION_COLUMNS = ['route', 'search_date']
+ROUTE_PATTERN = r'^(\w+)-to-(\w+)'
+# Offer ids are only unique within a response
+OFFER_KEY_COLUMNS = ['search_group', 'search_key', 'offer_id']
+
+
+class FlightResultStore:
+    """
+    Parquet dataset of collected flight search results, one row per segment, partitioned by route (e.g. "SFO-JFK") and
+    the date the search ran. Queries filter on the partition columns and on row-group statistics, so a fare-history
+    query only reads the files and row groups it needs.
+    Itinerary ids, like offer ids, are only unique within a batch: an itinerary is identified by (batch_id,
+    itinerary_id) and an offer by (batch_id, search_key, offer_id).
+    """
+    def __init__(self, root: str = RESULT_STORE_ROOT):
+        self.root = root
+
+    def append(self, segments_table: pd.DataFrame, search_date: date = None) -> str:
+        """
+        Appends the output of `process_search_results.aggregate_bulk_segments` to the dataset.
+        :param segments_table: Long segments table of a bulk search.
+        :param search_date: Date the searches ran, today by default.
+        :return: The id of the appended batch, stored in the batch_id column.
+        """
+        if segments_table.empty:
+            return None
+
+        batch_id = uuid.uuid4().hex
+        table = segments_table.copy()
+        routes = table['search_key'].astype(str).str.extract(ROUTE_PATTERN)
+        table['route'] = (routes[0] + '-' + routes[1]).astype('category')
+        table['search_date'] = (search_date or date.today()).isoformat()
+        table['searched_at'] = pd.Timestamp(datetime.now())
+        table['batch_id'] = batch_id
+        table['itinerary_stops'] = (table.groupby('itinerary_id')['segment_number'].transform('size') - 1).astype('int16')
+        # An offer has as many stops as its worst itinerary, e.g. a nonstop outbound with a one-stop return has one
+        table['offer_stops'] = (table.groupby(OFFER_KEY_COLUMNS, observed=True)['itinerary_stops']
+                                .transform('max').astype('int16'))
+
+        os.makedirs(self.root, exist_ok=True)
+        ds.write_dataset(pa.Table.from_pandas(table, preserve_index=False), self.root, format='parquet',
+                         partitioning=PARTITION_COLUMNS, partitioning_flavor='hive',
+                         basename_template=f'{batch_id}-{{i}}.parquet', existing_data_behavior='overwrite_or_ignore')
+        return batch_id
+
+    def dataset(self) -> ds.Dataset:
+        return ds.dataset(self.root, format='parquet', partitioning='hive')
+
+    def query(self, route: str = None, departure_from: date = None, departure_to: date = None, carrier: str = None,
+              max_stops: int = None, searched_from: date = None, searched_to: date = None,
+              columns: list[str] = None) -> pd.DataFrame:
+        """
+        Reads the stored segments matching every given filter.
+        :param route: Route as "ORIGIN-DESTINATION" of the original search, e.g. "SFO-JFK".
+        :param departure_from: Earliest queried departure date (inclusive).
+        :param departure_to: Latest queried departure date (inclusive).
+        :param carrier: Validating airline code.
+        :param max_stops: Maximum number of stops of every itinerary of the offer, e.g. 0 for offers that are nonstop
+        both ways.
+        :param searched_from: Earliest search date (inclusive).
+        :param searched_to: Latest search date (inclusive).
+        :param columns: Columns to read, all of them by default.
+        :return: The matching segments.
+        """
+        if not os.path.isdir(self.root):
+            return pd.DataFrame(columns=columns)
+
+        filters = []
+        if route is not None:
+            filters.append(ds.field('route') == route)
+        if searched_from is not None:
+            filters.append(ds.field('search_date') >= searched_from.isoformat())
+        if searched_to is not None:
+            filters.append(ds.field('search_date') <= searched_to.isoformat())
+        if departure_from is not None:
+            filters.append(ds.field('query_departure_date') >= pd.Timestamp(departure_from))
+        if departure_to is not None:
+            filters.append(ds.field('query_departure_date') <= pd.Timestamp(departure_to))
+        if carrier is not None:
+            filters.append(ds.field('validating_airline') == carrier)
+        if max_stops is not None:
+            filters.append(ds.field('offer_stops') <= max_stops)
+
+        expression = None
+        for condition in filters:
+            expression = condition if expression is None else expression & condition
+        return self.dataset().to_table(columns=columns, filter=expression).to_pandas()
+
+    def sql(self, query: str) -> pd.DataFrame:
+        """
+        Runs a SQL query with DuckDB against the dataset, exposed as the `results` view. Requires duckdb.
+        e.g. `store.sql("SELECT query_departure_date, min(total_price) FROM results WHERE route = 'SFO-JFK' GROUP BY 1")`
+        """
+        import duckdb
+
+        with duckdb.connect() as conn:
+            conn.execute(f"CREATE VIEW results AS SELECT * FROM read_parquet('{self.root}/**/*.parquet', "
+                         f"hive_partitioning = true)")
+            return conn.execute(query).df()
@@ -0,0 +1,183 @@
+import heapq
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from AmadeusClient import AmadeusAPIError, AmadeusFlightSearch
+from airport_index import AirportIndex
+from nearby_airport_suggestions import NearbyAirportSuggestions
+from process_search_results import aggregate_bulk_flight_search
+
+SEARCH_KEY_PAIR_PATTERN = r'^(\w+)-to-(\w+)'
+
+
+def nearby_airport_codes(airport_code: str, airport_index: AirportIndex,
+                         radius_miles: float = NearbyAirportSuggestions.SEARCH_RADIUS_MILES,
+                         airport_type: str = NearbyAirportSuggestions.AIRPORT_TYPE) -> list[str]:
+    """
+    Expands an airport into the set of airports serving the same area, e.g. SFO into SFO, OAK and SJC.
+    :param airport_code: IATA code of the selected airport.
+    :param airport_index: Shared index over the airport reference data.
+    :param radius_miles: Search radius around the selected airport.
+    :param airport_type: Type of the nearby airports to include.
+    :return: The selected airport followed by the nearby ones, nearest first.
+    """
+    row = airport_index.iata_to_row.get(airport_code)
+    if row is None or np.isnan(airport_index.latitudes[row]) or np.isnan(airport_index.longitudes[row]):
+        return [airport_code]
+
+    coords = (airport_index.latitudes[row], airport_index.longitudes[row])
+    nearby_rows, _ = airport_index.query_radius(coords, radius_miles=radius_miles)
+    nearby_rows = nearby_rows[airport_index.types[nearby_rows] == airport_type]
+    return [airport_code] + [code for code in airport_index.iata_codes[nearby_rows] if code and code != airport_code]
+
+
+class RouteMatrixSearch:
+    """
+    Searches every origin airport x destination airport x travel dates combination with a single client, so all the
+    requests share its connection pool, token and rate limiter, and at most `max_requests` searches are made.
+
+    The grid runs in two rounds. The first travel dates are probed for every airport pair, then the remaining dates
+    are searched pair by pair, cheapest probe first. A pair is pruned, and its remaining searches skipped, once its
+    probe fare minus `max_date_discount` can't beat the `top_k` cheapest fares found so far, or when its probe returned
+    no offers at all.
+    """
+    MAX_DATE_DISCOUNT = 0.25
+
+    def __init__(self, client: AmadeusFlightSearch, origins: list[str], destinations: list[str],
+                 inclusive_search: bool = True, max_requests: int = None, top_k: int = 10,
+                 max_date_discount: float = MAX_DATE_DISCOUNT):
+        """
+        :param client: Client holding the credentials, dates, date range and direction, concurrency and rate limit.
+        :param origins: Origin airport codes, e.g. the output of `nearby_airport_codes`.
+        :param destinations: Destination airport codes.
+        :param inclusive_search: Whether the original dates are searched along with the shifted ones.
+        :param max_requests: Maximum number of searches, unlimited by default.
+        :param top_k: Number of cheapest fares a pair must be able to enter to keep being searched.
+        :param max_date_discount: Largest assumed fare drop (as a fraction) between the probed and the other dates.
+        """
+        self.client = client
+        self.pairs = [(origin, destination) for origin in origins for destination in destinations
+                      if origin != destination]
+        self.inclusive_search = inclusive_search
+        self.max_requests = max_requests
+        self.top_k = top_k
+        self.max_date_discount = max_date_discount
+
+        self.num_searches = 0
+        self.pair_min_prices: dict[tuple[str, str], float] = dict()
+        self.pruned_pairs: set[tuple[str, str]] = set()
+        self.skipped_searches: list[str] = []
+        self.failed_searches: dict[str, str] = dict()
+        self._probe_prices: dict[tuple[str, str], float] = dict()
+        self._top_prices: list[float] = []  # Max-heap (negated) of the top_k cheapest fares
+        self._lock = threading.Lock()
+
+    def plan_travel_dates(self) -> list[tuple]:
+        if not self.client.search_params.search_range:
+            return [(self.client.departure_date, self.client.return_date)]
+        return self.client.plan_travel_dates(self.inclusive_search)
+
+    def plan_searches(self) -> dict[tuple[str, str], list[tuple[str, str]]]:
+        """Plans the (key, url) searches of every airport pair, in travel-date order."""
+        return {(origin, destination): [(AmadeusFlightSearch.make_search_key(origin, destination, departure_date,
+                                                                             return_date),
+                                         self.client.make_search_url(departure_date, return_date, origin=origin,
+                                                                     destination=destination))
+                                        for departure_date, return_date in self.plan_travel_dates()]
+                for origin, destination in self.pairs}
+
+    def _is_dominated(self, pair: tuple[str, str]) -> bool:
+        probe_price = self._probe_prices.get(pair)
+        if probe_price is None or len(self._top_prices) < self.top_k:
+            return False
+        return probe_price * (1 - self.max_date_discount) > -self._top_prices[0]
+
+    def _record_prices(self, pair: tuple[str, str], response: dict, is_probe: bool) -> None:
+        prices = [float(offer['price']['total']) for offer in response.get('data', [])]
+        with self._lock:
+            if not prices:
+                if is_probe:
+                    # Nothing flies this route on the probed dates, e.g. two airports without service between them
+                    self.pruned_pairs.add(pair)
+                return
+
+            cheapest = min(prices)
+            self.pair_min_prices[pair] = min(self.pair_min_prices.get(pair, cheapest), cheapest)
+            if is_probe:
+                self._probe_prices[pair] = cheapest
+            for price in heapq.nsmallest(self.top_k, prices):
+                if len(self._top_prices) < self.top_k:
+                    heapq.heappush(self._top_prices, -price)
+                elif price < -self._top_prices[0]:
+                    heapq.heapreplace(self._top_prices, -price)
+                else:
+                    break
+
+    def _search(self, pair: tuple[str, str], key: str, url: str, is_probe: bool) -> dict | None:
+        with self._lock:
+            if pair in self.pruned_pairs or self._is_dominated(pair):
+                self.pruned_pairs.add(pair)
+                self.skipped_searches.append(key)
+                return None
+            if self.max_requests is not None and self.num_searches >= self.max_requests:
+                self.skipped_searches.append(key)
+                return None
+            self.num_searches += 1
+
+        try:
+            response = self.client.find_flights(url)
+        except AmadeusAPIError as e:
+            # One failing airport pair shouldn't sink the whole matrix
+            with self._lock:
+                self.failed_searches[key] = str(e)
+            return None
+        self._record_prices(pair, response, is_probe)
+        return response
+
+    def _run(self, tasks: list[tuple[tuple[str, str], str, str, bool]]) -> dict[str, dict]:
+        max_workers = min(self.client.search_params.max_workers or 1, len(tasks)) or 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [(key, executor.submit(self._search, pair, key, url, is_probe))
+                       for pair, key, url, is_probe in tasks]
+            return {key: future.result() for key, future in futures}
+
+    def run(self) -> dict[str, dict]:
+        """
+        Runs the search grid.
+        :return: The responses of the searches that ran, keyed like `AmadeusFlightSearch` bulk searches
+        ("ORIGIN-to-DESTINATION (departure/return)") and ordered by airport pair, then travel dates.
+        """
+        planned_searches = self.plan_searches()
+        probes = [(pair, *searches[0], True) for pair, searches in planned_searches.items()]
+        responses = self._run(probes)
+
+        # The executor picks the tasks up in submission order, so the most promising pairs are searched first and the
+        # others are checked against the best fares found by then
+        remaining_pairs = sorted((pair for pair in planned_searches if pair in self._probe_prices),
+                                 key=lambda pair: self._probe_prices[pair])
+        responses.update(self._run([(pair, key, url, False) for pair in remaining_pairs
+                                    for key, url in planned_searches[pair][1:]]))
+
+        return {key: responses[key] for searches in planned_searches.values() for key, _ in searches
+                if responses.get(key) is not None}
+
+    def ranked_results(self, responses: dict[str, dict]) -> pd.DataFrame:
+        """
+        Merges the responses of `run` into one wide DataFrame ranked by price, tagged with the airport pair of each
+        itinerary.
+        """
+        results = aggregate_bulk_flight_search([responses])
+        if results.empty:
+            return results
+        airports = results['search_key'].astype(str).str.extract(SEARCH_KEY_PAIR_PATTERN)
+        results['airport_pair'] = airports[0] + '-' + airports[1]
+        return results.sort_values('total_price', kind='stable').reset_index(drop=True)
+
+    def pair_summary(self) -> pd.DataFrame:
+        """Cheapest fare found per airport pair and whether the pair was pruned, cheapest first."""
+        return pd.DataFrame([{'origin': origin, 'destination': destination,
+                              'min_price': self.pair_min_prices.get((origin, destination)),
+                              'pruned': (origin, destination) in self.pruned_pairs}
+                             for origin, destination in self.pairs]).sort_values('min_price', na_position='last')
@@ -0,0 +1,51 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# JSON backend for Amadeus responses, the airport reference data and persisted results: orjson or msgspec when one
+# of them is installed, the standard library otherwise
+if orjson is not None:
+    BACKEND = 'orjson'
+elif msgspec is not None:
+    BACKEND = 'msgspec'
+else:
+    BACKEND = 'json'
+
+if msgspec is not None:
+    _msgspec_decoder = msgspec.json.Decoder()
+    _msgspec_encoder = msgspec.json.Encoder()
+
+
+def loads(data: bytes | str) -> Any:
+    if BACKEND == 'orjson':
+        return orjson.loads(data)
+    elif BACKEND == 'msgspec':
+        return _msgspec_decoder.decode(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    if BACKEND == 'orjson':
+        return orjson.dumps(obj)
+    elif BACKEND == 'msgspec':
+        return _msgspec_encoder.encode(obj)
+    return json.dumps(obj).encode()
+
+
+def load_file(path: str) -> Any:
+    with open(path, 'rb') as infile:
+        return loads(infile.read())
+
+
+def dump_file(obj: Any, path: str) -> None:
+    with open(path, 'wb') as outfile:
+        outfile.write(dumps(obj))
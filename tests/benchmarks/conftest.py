@@ -0,0 +1,54 @@
+"""
+Benchmarks of every stage of a search, from the OAuth token to the rendered cards, against MockAmadeusServer and
+synthetic responses mixing nonstop, one-stop and two-stop itineraries.
+
+With the rest of the suite they run once as smoke tests (pytest.ini disables timing). To time them and fail on a
+regression against the baseline stored for this machine under tests/benchmarks/baselines:
+
+    pytest tests/benchmarks --benchmark-enable --benchmark-compare --benchmark-compare-fail=median:25%
+
+After an intended change in performance, or on a new machine, store a new baseline:
+
+    pytest tests/benchmarks --benchmark-enable --benchmark-save=baseline
+"""
+from datetime import datetime, timedelta
+import pytest
+
+from AmadeusClient import AmadeusFlightSearch
+from mock_amadeus import generate_flight_offers
+
+NUM_OFFERS = 250
+NUM_QUERY_DATES = 60
+MULTI_CITY_TRIP = [('SFO', 'LHR', '2025-03-01'), ('LHR', 'CDG', '2025-03-05'), ('CDG', 'JFK', '2025-03-09')]
+
+
+@pytest.fixture(scope='session')
+def flight_results():
+    return generate_flight_offers(return_date='2025-03-08', num_offers=NUM_OFFERS)
+
+
+@pytest.fixture(scope='session')
+def multi_city_results():
+    """Offers of a three-city trip with eight segments per itinerary, priced for four travelers."""
+    return generate_flight_offers(num_offers=NUM_OFFERS, segments_per_itinerary=(8,), num_travelers=4,
+                                  multi_city=MULTI_CITY_TRIP)
+
+
+@pytest.fixture(scope='session')
+def single_traveler_multi_city_results():
+    """The three-city trip priced for one traveler, the fares whose cabins the legacy first-traveler scan gets right."""
+    return generate_flight_offers(num_offers=NUM_OFFERS, segments_per_itinerary=(8,), multi_city=MULTI_CITY_TRIP)
+
+
+@pytest.fixture(scope='session')
+def bulk_responses():
+    """Responses of a 60-day window of round trips, in the shape of AmadeusFlightSearch.run_searches."""
+    responses = {}
+    for day in range(NUM_QUERY_DATES):
+        departure_date = datetime(2025, 3, 1) + timedelta(days=day)
+        return_date = departure_date + timedelta(days=7)
+        search_key = AmadeusFlightSearch.make_search_key('SFO', 'JFK', departure_date, return_date)
+        responses[search_key] = generate_flight_offers(departure_date=str(departure_date.date()),
+                                                       return_date=str(return_date.date()), num_offers=NUM_OFFERS,
+                                                       seed=day)
+    return [responses]
@@ -0,0 +1,81 @@
+"""
+The string-typed Segment model and parser that Offer/Itinerary/Segment replaced, kept verbatim as the reference of the
+parse benchmarks. Only parses the first traveler's cabin, so it is not a drop-in replacement for multi-traveler fares.
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass
+class Segment:
+    offer_price: str
+    currency: str
+    total_duration: str
+    bookable_seats: str
+    segment_id: str
+    departure_airport: str
+    departure_time: str
+    arrival_airport: str
+    arrival_time: str
+    carrier_code: str
+    flight_number: str
+    aircraft_code: str
+    stops: str
+    flight_duration: str
+    cabin_type: str
+
+
+def get_flight_time(time_str: str) -> str:
+    date_time_obj = datetime.fromisoformat(time_str)
+    return date_time_obj.strftime('%I:%M %p').lower()
+
+def get_next_day_arrival_str(departure_time: str, arrival_time: str) -> str:
+    departure_time = datetime.strptime(departure_time, "%Y-%m-%dT%H:%M:%S")
+    arrival_time = datetime.strptime(arrival_time, "%Y-%m-%dT%H:%M:%S")
+    day_measure = (arrival_time - departure_time).days
+    return f"+{day_measure}" if day_measure > 0 else ''
+
+def transform_duration_str(duration: str) -> str:
+    match = re.match(r'PT(?:(\d+)H)?(?:(\d+)M)?', duration)
+    if match:
+        hours = int(match.group(1)) if match.group(1) else 0
+        minutes = int(match.group(2)) if match.group(2) else 0
+        return f"{hours}h {minutes:02d}m"
+    else:
+        raise ValueError("Invalid duration format.")
+
+def get_cabin_type(flight_offer: dict, segment_id: str) -> str:
+    for fair_details_segment in flight_offer['travelerPricings'][0]['fareDetailsBySegment']:
+        if fair_details_segment['segmentId'] == segment_id:
+            return fair_details_segment['cabin']
+    return 'Cabin Type'
+
+def get_flight_offer_segments(flight_results: dict) -> dict[str, dict[str, Segment]]:
+    flight_offers = {}
+    for flight_offer in flight_results['data']:
+        itineraries = []
+        for itinerary in flight_offer['itineraries']:
+            segments = []
+            for segment in itinerary['segments']:
+                seg = Segment(
+                    offer_price=flight_offer['price']['total'],
+                    currency=flight_offer['price']['currency'],
+                    total_duration=itinerary['duration'],
+                    bookable_seats=flight_offer['numberOfBookableSeats'],
+                    segment_id=segment['id'],
+                    departure_airport=segment['departure']['iataCode'],
+                    departure_time=segment['departure']['at'],
+                    arrival_airport=segment['arrival']['iataCode'],
+                    arrival_time=segment['arrival']['at'],
+                    carrier_code=segment['carrierCode'],
+                    flight_number=segment['number'],
+                    aircraft_code=segment['aircraft']['code'],
+                    stops=segment['numberOfStops'],
+                    flight_duration=segment['duration'],
+                    cabin_type=get_cabin_type(flight_offer, segment['id'])
+                    )
+                segments.append(seg)
+            itineraries.extend(segments)
+        flight_offers[f"flight_offer_{flight_offer['id']}"] = dict(zip([f"flight_{i+1}" for i in range(len(itineraries))], itineraries))
+    return flight_offers
@@ -0,0 +1,34 @@
+import pytest
+
+from fare_matrix import FareMatrix
+from process_search_results import aggregate_bulk_flight_search, aggregate_bulk_segments, \
+    aggregate_bulk_segments_arrow, deduplicate_offers
+
+
+@pytest.mark.parametrize('deduplicate', [False, True])
+def test_aggregate(benchmark, bulk_responses, deduplicate):
+    benchmark.group = 'aggregate'
+    benchmark.extra_info['num_responses'] = len(bulk_responses[0])
+    results = benchmark.pedantic(aggregate_bulk_flight_search, args=(bulk_responses,),
+                                 kwargs={'deduplicate': deduplicate}, rounds=3)
+    assert results['search_key'].nunique() == len(bulk_responses[0])
+
+
+def test_aggregate_segments_arrow(benchmark, bulk_responses):
+    benchmark.group = 'aggregate'
+    benchmark.pedantic(aggregate_bulk_segments_arrow, args=(bulk_responses,), rounds=3)
+
+
+def test_deduplicate(benchmark, bulk_responses):
+    # The same searches twice, as overlapping date windows return them
+    segments_table = aggregate_bulk_segments(bulk_responses + bulk_responses)
+    benchmark.group = 'aggregate'
+    benchmark.extra_info['num_segments'] = len(segments_table)
+    unique_segments = benchmark.pedantic(deduplicate_offers, args=(segments_table,), rounds=3)
+    assert 2 * len(unique_segments) == len(segments_table)
+
+
+def test_fare_matrix(benchmark, bulk_responses):
+    bulk_results = aggregate_bulk_flight_search(bulk_responses)
+    benchmark.group = 'aggregate'
+    benchmark(lambda: FareMatrix(bulk_results).price_grid)
@@ -0,0 +1,63 @@
+import random
+import time
+import numpy as np
+import pytest
+
+from airport_autocomplete import AirportAutocomplete
+from airport_index import AirportIndex
+from nearby_airport_suggestions import NearbyAirportSuggestions
+
+CORPUS_SIZE = 100_000
+P99_BUDGET_SECONDS = 0.001
+SYLLABLES = ['ka', 'lo', 'mi', 'san', 'ber', 'ton', 'ville', 'port', 'ri', 'do', 'na', 'fe', 'ha', 'gu', 'ar', 'el',
+             'os', 'ta', 'wen', 'burg', 'field', 'lan', 'mar', 'sta', 'kin', 'po', 'zu', 've', 'chi', 'co']
+
+
+def _synthetic_names(num_names: int, rng: random.Random) -> list[str]:
+    """Place-like names of one to three words of two to four syllables, e.g. "Kamiport Elburg"."""
+    return [' '.join(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+                     for _ in range(rng.randint(1, 3)))
+            for _ in range(num_names)]
+
+
+@pytest.fixture(scope='module')
+def airport_index():
+    return AirportIndex.load()
+
+
+@pytest.fixture(scope='module')
+def synthetic_autocomplete():
+    names = _synthetic_names(CORPUS_SIZE, random.Random(0))
+    return AirportAutocomplete(names, ['municipality'] * len(names), list(range(len(names))))
+
+
+@pytest.fixture(scope='module')
+def keystrokes(synthetic_autocomplete):
+    """What a user has typed after 2, 4 and 6 keystrokes and once done, for 250 names of the corpus."""
+    names = random.Random(1).sample(synthetic_autocomplete.labels, 250)
+    return [name[:length] for name in names for length in (2, 4, 6, len(name))]
+
+
+def test_airport_index_load(benchmark):
+    benchmark.group = 'airports'
+    benchmark(AirportIndex.load)
+
+
+def test_airport_suggestions(benchmark, airport_index):
+    benchmark.group = 'airports'
+    benchmark(lambda: NearbyAirportSuggestions('San Francisco', airport_index).fetch_airport_suggestions())
+
+
+def test_autocomplete_keystrokes(benchmark, synthetic_autocomplete, keystrokes):
+    """Suggestions for every keystroke over a 100k-name corpus, with the per-keystroke p50/p99 latency."""
+    latencies = []
+    for query in keystrokes:
+        start = time.perf_counter()
+        synthetic_autocomplete.suggest(query)
+        latencies.append(time.perf_counter() - start)
+    benchmark.group = 'autocomplete'
+    benchmark.extra_info.update(corpus_size=CORPUS_SIZE, num_keystrokes=len(keystrokes),
+                                p50_seconds=float(np.percentile(latencies, 50)),
+                                p99_seconds=float(np.percentile(latencies, 99)))
+    benchmark(lambda: [synthetic_autocomplete.suggest(query) for query in keystrokes])
+    assert benchmark.extra_info['p99_seconds'] < P99_BUDGET_SECONDS
@@ -0,0 +1,54 @@
+import pytest
+
+from AmadeusClient import AmadeusFlightSearch, AmadeusTokenManager
+from mock_amadeus import MockAmadeusServer
+
+MOCK_LATENCY_SECONDS = 0.05
+# Small responses, decoding 250 offers would hold the GIL the in-process server and the workers share (see test_fetch)
+DATE_WINDOW_NUM_OFFERS = 20
+
+
+@pytest.fixture(scope='module')
+def server():
+    with MockAmadeusServer(num_offers=250) as server:
+        yield server
+
+
+@pytest.fixture(scope='module')
+def client(server, search_params):
+    return AmadeusFlightSearch(search_params(server))
+
+
+def test_auth(benchmark, client):
+    benchmark.group = 'fetch'
+    benchmark(lambda: AmadeusTokenManager(client.auth_endpoint, client.auth_payload,
+                                          client.AUTH_HEADER).get_token(client._send))
+
+
+def test_fetch(benchmark, client):
+    url = client.make_search_url(client.departure_date, client.return_date)
+    client.find_flights(url)
+    benchmark.group = 'fetch'
+    benchmark.extra_info['num_bytes'] = client.request_timings[-1].num_bytes
+    benchmark(client.find_flights, url)
+
+
+def test_stream(benchmark, client):
+    url = client.make_search_url(client.departure_date, client.return_date)
+    benchmark.group = 'fetch'
+    num_offers = benchmark(lambda: sum(1 for _ in client.stream_flights(url)))
+    assert num_offers == 250
+
+
+@pytest.mark.parametrize('max_workers', [1, 8])
+@pytest.mark.parametrize('search_range', [4, 16, 32])
+def test_fetch_date_window(benchmark, search_params, search_range, max_workers):
+    """Wall clock of a single-direction bulk search as the date window grows, sequential and with 8 workers."""
+    with MockAmadeusServer(num_offers=DATE_WINDOW_NUM_OFFERS, latency_seconds=MOCK_LATENCY_SECONDS) as server:
+        client = AmadeusFlightSearch(search_params(server, search_range=search_range, direction='later',
+                                                   max_workers=max_workers))
+        planned_searches = client._plan_single_direction_searches(inclusive_search=True)
+        benchmark.group = 'fetch_date_window'
+        benchmark.extra_info['sequential_latency_seconds'] = round(MOCK_LATENCY_SECONDS * len(planned_searches), 3)
+        responses = benchmark.pedantic(client.run_searches, args=(planned_searches,), rounds=3, warmup_rounds=1)
+    assert len(responses) == len(planned_searches)
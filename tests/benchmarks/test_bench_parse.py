@@ -0,0 +1,86 @@
+import tracemalloc
+import pytest
+
+import legacy_model
+import parse_flight_offers
+import serialization
+
+# Modules of each model's parser and formatters, the slotted model and the string-typed one it replaced
+MODELS = {'slotted': parse_flight_offers, 'legacy': legacy_model}
+
+
+def _retained_bytes(parse, flight_results: dict) -> int:
+    tracemalloc.start()
+    try:
+        parsed = parse(flight_results)  # Kept referenced until the traced memory is read
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def _parse_and_format(model, flight_results: dict) -> list[tuple[str, ...]]:
+    """Parses a response and formats the times and durations shown on the cards, as a render does."""
+    return [(model.get_flight_time(segment.departure_time), model.get_flight_time(segment.arrival_time),
+             model.get_next_day_arrival_str(segment.departure_time, segment.arrival_time),
+             model.transform_duration_str(segment.flight_duration))
+            for segments in model.get_flight_offer_segments(flight_results).values()
+            for segment in segments.values()]
+
+
+def _indexed_cabins(flight_results: dict) -> list[str]:
+    cabins = []
+    for flight_offer in flight_results['data']:
+        segment_cabins = parse_flight_offers.index_segment_cabins(flight_offer)
+        for itinerary in flight_offer['itineraries']:
+            for segment in itinerary['segments']:
+                cabins.append(segment_cabins.get(segment['id'], parse_flight_offers.UNKNOWN_CABIN_TYPE))
+    return cabins
+
+
+def _scanned_cabins(flight_results: dict) -> list[str]:
+    cabins = []
+    for flight_offer in flight_results['data']:
+        for itinerary in flight_offer['itineraries']:
+            for segment in itinerary['segments']:
+                cabins.append(legacy_model.get_cabin_type(flight_offer, segment['id']))
+    return cabins
+
+
+# The cabin of every segment, from the per-offer index or from the legacy scan of the first traveler's fare details
+CABIN_LOOKUPS = {'indexed': _indexed_cabins, 'legacy': _scanned_cabins}
+
+
+def test_decode(benchmark, flight_results):
+    body = serialization.dumps(flight_results)
+    benchmark.group = 'decode'
+    benchmark.extra_info.update(num_bytes=len(body), backend=serialization.BACKEND)
+    assert benchmark(serialization.loads, body) == flight_results
+
+
+@pytest.mark.parametrize('model', MODELS)
+def test_parse(benchmark, flight_results, model):
+    parse = MODELS[model].get_flight_offer_segments
+    benchmark.group = 'parse'
+    benchmark.extra_info['retained_bytes'] = _retained_bytes(parse, flight_results)
+    benchmark(parse, flight_results)
+
+
+@pytest.mark.parametrize('model', MODELS)
+def test_parse_and_format(benchmark, flight_results, model):
+    benchmark.group = 'parse_and_format'
+    formatted = benchmark(_parse_and_format, MODELS[model], flight_results)
+    assert formatted == _parse_and_format(legacy_model, flight_results)
+
+
+@pytest.mark.parametrize('model', MODELS)
+def test_parse_multi_city(benchmark, multi_city_results, model):
+    benchmark.group = 'parse_multi_city'
+    benchmark(MODELS[model].get_flight_offer_segments, multi_city_results)
+
+
+@pytest.mark.parametrize('lookup', CABIN_LOOKUPS)
+@pytest.mark.parametrize('results', ['flight_results', 'single_traveler_multi_city_results'])
+def test_cabin_lookup(benchmark, request, results, lookup):
+    flight_results = request.getfixturevalue(results)
+    benchmark.group = f'cabin_lookup[{results}]'
+    assert benchmark(CABIN_LOOKUPS[lookup], flight_results) == _scanned_cabins(flight_results)
@@ -0,0 +1,26 @@
+import pytest
+
+from flight_card_logic import DEFAULT_PAGE_SIZE, render_flight_cards_html
+from flight_search_app import group_offers_by_major_stop
+from parse_flight_offers import get_flight_offers
+
+MAJOR_STOPS = frozenset({'SFO', 'JFK'})
+
+
+@pytest.fixture(scope='module')
+def cards(flight_results):
+    return group_offers_by_major_stop(get_flight_offers(flight_results), major_stops=MAJOR_STOPS)
+
+
+def test_group(benchmark, flight_results):
+    offers = get_flight_offers(flight_results)
+    benchmark.group = 'render'
+    assert len(benchmark(group_offers_by_major_stop, offers, major_stops=MAJOR_STOPS)) == len(offers)
+
+
+@pytest.mark.parametrize('num_cards', [DEFAULT_PAGE_SIZE, None], ids=['page', 'all'])
+def test_render(benchmark, flight_results, cards, num_cards):
+    carriers = flight_results['dictionaries']['carriers']
+    benchmark.group = 'render'
+    html = benchmark(render_flight_cards_html, cards[:num_cards], carriers)
+    benchmark.extra_info['num_bytes'] = len(html)
@@ -0,0 +1,34 @@
+import uuid
+import pytest
+
+from AmadeusClient import AmadeusFlightSearch
+from flight_info import FlightSearchParameters
+from mock_amadeus import MockAmadeusServer
+
+
+def make_search_params(server: MockAmadeusServer, **kwargs) -> FlightSearchParameters:
+    """Search parameters pointed at `server`, with a fresh api key so every client gets its own token manager."""
+    params = dict(api_key=uuid.uuid4().hex, api_secret='test', env='test', version='v2', origin='SFO',
+                  destination='JFK', departure_date='2025-03-01', adults_passengers=1, return_date='2025-03-08',
+                  max_requests_per_second=1000, base_url=server.url)
+    params.update(kwargs)
+    return FlightSearchParameters(**params)
+
+
+@pytest.fixture(scope='session')
+def search_params():
+    return make_search_params
+
+
+@pytest.fixture
+def mock_server():
+    with MockAmadeusServer(num_offers=20) as server:
+        yield server
+
+
+@pytest.fixture
+def make_client(mock_server):
+    def make_client(client_class: type[AmadeusFlightSearch] = AmadeusFlightSearch, cache=None,
+                    **kwargs) -> AmadeusFlightSearch:
+        return client_class(make_search_params(mock_server, **kwargs), cache=cache)
+    return make_client
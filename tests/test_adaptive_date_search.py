@@ -0,0 +1,24 @@
+from adaptive_date_search import adaptive_date_search, synthetic_price_curve
+
+
+def _recording_lookup(price_curve, lookups: list[list[int]]):
+    def price_of(offsets: list[int]) -> dict[int, float]:
+        lookups.append(list(offsets))
+        return {offset: float(price_curve[offset]) for offset in offsets}
+    return price_of
+
+
+def test_small_budget_samples_the_whole_window():
+    lookups = []
+    adaptive_date_search(_recording_lookup(synthetic_price_curve(60), lookups), 60, max_requests=5)
+
+    assert lookups == [[0, 16, 32, 48, 59]]
+
+
+def test_budget_is_never_exceeded():
+    lookups = []
+    prices = adaptive_date_search(_recording_lookup(synthetic_price_curve(60, seed=3), lookups), 60,
+                                  max_requests=20, batch_size=4)
+
+    assert len(prices) == sum(len(offsets) for offsets in lookups) == 20
+    assert all(len(offsets) <= 4 for offsets in lookups[1:])
@@ -0,0 +1,53 @@
+import pytest
+
+from airport_autocomplete import AirportAutocomplete
+from airport_index import AirportIndex
+
+
+@pytest.fixture(scope='module')
+def autocomplete():
+    return AirportIndex.load().autocomplete
+
+
+@pytest.mark.parametrize('query, expected_label', [
+    ('PARIS', 'Paris'),
+    ('San Francsico', 'San Francisco'),
+    ('new yrok', 'New York'),
+    ('Tokio', 'Tokyo'),
+    ('JFK', 'JFK'),
+])
+def test_misspelled_and_cased_queries_find_the_city(autocomplete, query, expected_label):
+    label, score, _, _ = autocomplete.suggest(query, limit=1)[0]
+
+    assert label == expected_label
+    assert score >= 60
+
+
+def test_kinds_restrict_the_suggestions(autocomplete):
+    suggestions = autocomplete.suggest('Paris', limit=10, kinds=('iata',))
+
+    assert suggestions and all(kind == 'iata' for _, _, kind, _ in suggestions)
+
+
+def test_suggestions_are_ranked_and_above_the_cutoff(autocomplete):
+    scores = [score for _, score, _, _ in autocomplete.suggest('Frankfurt', limit=5, score_cutoff=70)]
+
+    assert scores == sorted(scores, reverse=True)
+    assert all(score >= 70 for score in scores)
+
+
+def test_batch_agrees_with_single_queries(autocomplete):
+    queries = ['Los Angeles', 'Chicago', 'Frankfurt am Main']
+
+    batch = autocomplete.suggest_batch(queries, limit=1, workers=1)
+
+    assert [suggestions[0][0] for suggestions in batch] == \
+           [autocomplete.suggest(query, limit=1)[0][0] for query in queries]
+
+
+def test_common_trigrams_do_not_hide_the_typed_label():
+    # Every label shares " ne", "new" and "ewp" with the query, only the last one holds "xyz"
+    labels = [f"Newport {i}" for i in range(AirportAutocomplete.MAX_PREFILTER_IDS)] + ['Newport Xyz']
+    autocomplete = AirportAutocomplete(labels, ['municipality'] * len(labels), list(range(len(labels))))
+
+    assert autocomplete.suggest('Newport Xyz', limit=1)[0][0] == 'Newport Xyz'
@@ -0,0 +1,37 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from airport_dataset import AIRPORT_DATA_PATH, compile_airport_dataset, is_artifact_current, load_airport_columns
+
+
+def test_artifact_matches_the_json(tmp_path):
+    artifact_dir = str(tmp_path / 'airports_compiled')
+    from_json = load_airport_columns(AIRPORT_DATA_PATH, artifact_dir, compile_if_stale=False)
+    from_artifact = load_airport_columns(AIRPORT_DATA_PATH, artifact_dir)
+
+    assert isinstance(from_artifact['latitude_rad'], np.memmap)
+    assert list(from_artifact['iata_code']) == ['' if code is None else code for code in from_json['iata_code']]
+    np.testing.assert_array_equal(from_artifact['latitude_rad'], from_json['latitude_rad'])
+
+
+def test_concurrent_compilations_leave_a_complete_artifact(tmp_path):
+    artifact_dir = str(tmp_path / 'airports_compiled')
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: compile_airport_dataset(AIRPORT_DATA_PATH, artifact_dir), range(4)))
+
+    assert is_artifact_current(AIRPORT_DATA_PATH, artifact_dir)
+    assert os.listdir(tmp_path) == ['airports_compiled']
+
+
+def test_truncated_artifact_falls_back_to_the_json(tmp_path):
+    artifact_dir = str(tmp_path / 'airports_compiled')
+    compile_airport_dataset(AIRPORT_DATA_PATH, artifact_dir)
+    codes_path = os.path.join(artifact_dir, 'name.codes.npy')
+    with open(codes_path, 'r+b') as codes_file:
+        codes_file.truncate(64)
+
+    columns = load_airport_columns(AIRPORT_DATA_PATH, artifact_dir)
+
+    assert not isinstance(columns['latitude_rad'], np.memmap)
+    assert len(columns['name']) == len(columns['iata_code']) > 0
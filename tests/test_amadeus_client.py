@@ -0,0 +1,226 @@
+import io
+import time
+import tracemalloc
+import pytest
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import AmadeusClient
+import serialization
+from AmadeusClient import AmadeusAPIError, AmadeusFlightSearch, AmadeusTokenManager, FlightOfferStream
+from mock_amadeus import generate_flight_offers
+from response_cache import LRUResponseCache
+
+
+class BufferedResponse:
+    """Stands in for a streamed requests.Response whose whole body is already downloaded."""
+    def __init__(self, body: bytes):
+        self.raw = io.BytesIO(body)
+
+    def close(self) -> None:
+        pass
+
+
+class NoBackoffFlightSearch(AmadeusFlightSearch):
+    BACKOFF_FACTOR = 0
+
+
+class ShortTimeoutFlightSearch(AmadeusFlightSearch):
+    TIMEOUT = (1, 0.5)
+
+
+def _search_urls(client: AmadeusFlightSearch, num_searches: int) -> list[str]:
+    return [client.make_search_url(datetime(2025, 3, day), datetime(2025, 4, day)) for day in range(1, num_searches + 1)]
+
+
+def test_token_is_shared_by_clients_with_the_same_credentials(mock_server, search_params):
+    params = search_params(mock_server)
+    first, second = AmadeusFlightSearch(params), AmadeusFlightSearch(params)
+    first.single_flight_search()
+    second.single_flight_search()
+
+    assert first.token_manager is second.token_manager
+    assert mock_server.request_counts['token'] == 1
+
+
+def test_concurrent_callers_wait_on_a_single_token_request(make_client, mock_server):
+    client = make_client()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        tokens = list(executor.map(lambda _: client._get_access_token(), range(16)))
+
+    assert mock_server.request_counts['token'] == 1
+    assert all(token is tokens[0] for token in tokens)
+
+
+def test_token_invalidated_while_it_is_returned_is_still_returned(monkeypatch):
+    def send_token(method: str, url: str, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"token_type": "Bearer", "access_token": "token", "expires_in": 1799}'
+        return response
+
+    token_manager = AmadeusTokenManager('http://auth', 'credentials', AmadeusFlightSearch.AUTH_HEADER)
+    token = token_manager.get_token(send_token)
+    monotonic = time.monotonic
+
+    def monotonic_then_invalidate() -> float:
+        # Another thread invalidating the token right after the expiry check of the lock-free path
+        now = monotonic()
+        token_manager._token, token_manager._expires_at = None, 0.0
+        return now
+
+    monkeypatch.setattr(AmadeusClient.time, 'monotonic', monotonic_then_invalidate)
+    assert token_manager.get_token(send_token) is token
+
+
+def test_revoked_token_is_refreshed_and_the_search_retried(make_client, mock_server):
+    client = make_client()
+    first_url, second_url = _search_urls(client, 2)
+    client.find_flights(first_url)
+    mock_server.revoke_tokens()
+
+    flight_results = client.find_flights(second_url)
+
+    assert len(flight_results['data']) == mock_server.num_offers
+    assert mock_server.request_counts['unauthorized'] == 1
+    assert mock_server.request_counts['token'] == 2
+
+
+def test_concurrent_401s_refresh_the_token_once(make_client, mock_server):
+    client = make_client(max_workers=8)
+    urls = _search_urls(client, 8)
+    client.find_flights(urls[0])
+    mock_server.revoke_tokens()
+
+    responses = client.run_searches([(str(i), url) for i, url in enumerate(urls)])
+
+    assert all(len(response['data']) == mock_server.num_offers for response in responses.values())
+    assert 1 <= mock_server.request_counts['unauthorized'] <= len(urls)
+    assert mock_server.request_counts['token'] == 2
+
+
+def test_rate_limited_search_is_retried_after_retry_after(make_client, mock_server):
+    mock_server.rate_limit_every = 2
+    mock_server.retry_after_seconds = 1
+    client = make_client()
+    first_url, second_url = _search_urls(client, 2)
+    client.find_flights(first_url)
+
+    start = time.perf_counter()
+    flight_results = client.find_flights(second_url)
+
+    assert time.perf_counter() - start >= 0.9
+    assert len(flight_results['data']) == mock_server.num_offers
+    assert mock_server.request_counts['rate_limited'] == 1
+    assert mock_server.request_counts['flight_offers'] == 3
+
+
+def test_exhausted_retries_raise_an_api_error(make_client, mock_server):
+    mock_server.rate_limit_every = 1
+    client = make_client(NoBackoffFlightSearch)
+
+    with pytest.raises(AmadeusAPIError):
+        client.single_flight_search()
+    assert mock_server.request_counts['flight_offers'] == client.MAX_RETRIES + 1
+
+
+def test_stalled_search_is_retried(make_client, mock_server):
+    mock_server.timeout_every = 2
+    mock_server.timeout_seconds = 1.5
+    client = make_client(ShortTimeoutFlightSearch)
+    first_url, second_url = _search_urls(client, 2)
+    client.find_flights(first_url)
+
+    flight_results = client.find_flights(second_url)
+
+    assert len(flight_results['data']) == mock_server.num_offers
+    assert mock_server.request_counts['timed_out'] == 1
+
+
+def test_concurrent_searches_overlap_and_keep_the_plan_order(make_client, mock_server):
+    mock_server.latency_seconds = 0.05
+    client = make_client(max_workers=8)
+    planned_searches = [(f"search_{i}", url) for i, url in enumerate(_search_urls(client, 16))]
+    client.find_flights(planned_searches[0][1])
+
+    start = time.perf_counter()
+    responses = client.run_searches(planned_searches)
+
+    # Run one after the other the searches would take 16 x 50ms
+    assert time.perf_counter() - start < len(planned_searches) * mock_server.latency_seconds / 2
+    assert list(responses) == [key for key, _ in planned_searches]
+
+
+def test_clients_with_the_same_credentials_share_the_rate_limit(mock_server, search_params):
+    params = search_params(mock_server, max_requests_per_second=20, max_workers=4)
+    first, second = AmadeusFlightSearch(params), AmadeusFlightSearch(params)
+    first_urls, second_urls = _search_urls(first, 5), _search_urls(second, 10)[5:]
+    first.find_flights(first_urls[0])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(lambda client, urls: client.run_searches([(url, url) for url in urls]),
+                          [first, second], [first_urls[1:], second_urls]))
+
+    # 9 more searches at 20 per second, each client alone would be allowed twice that rate
+    assert first.rate_limiter is second.rate_limiter
+    assert time.perf_counter() - start >= 8 / 20
+
+
+def test_stream_yields_the_offers_of_find_flights(make_client):
+    client = make_client()
+    url = client.make_search_url(client.departure_date, client.return_date)
+
+    offer_stream = client.stream_flights(url)
+    streamed_offers = list(offer_stream)
+
+    flight_results = client.find_flights(url)
+    assert streamed_offers == flight_results['data']
+    assert offer_stream.dictionaries == flight_results['dictionaries']
+    assert offer_stream.num_offers == len(flight_results['data'])
+
+
+def test_finished_stream_is_added_to_the_cache(make_client, mock_server):
+    cache = LRUResponseCache()
+    client = make_client(cache=cache)
+    url = client.make_search_url(client.departure_date, client.return_date)
+
+    streamed_offers = list(client.stream_flights(url))
+    replayed_stream = client.stream_flights(url)
+
+    assert len(cache) == 1
+    assert list(replayed_stream) == streamed_offers
+    assert replayed_stream.response is None
+    assert mock_server.request_counts['flight_offers'] == 1
+
+
+def test_stream_hands_over_its_raw_body_without_keeping_the_offers():
+    body = serialization.dumps(generate_flight_offers(return_date='2025-03-08', num_offers=250))
+    completed_bodies = []
+
+    def peak_streaming_bytes(on_complete) -> int:
+        tracemalloc.start()
+        try:
+            for _ in FlightOfferStream(response=BufferedResponse(body), on_complete=on_complete):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    uncached_peak = peak_streaming_bytes(None)
+    cached_peak = peak_streaming_bytes(completed_bodies.append)
+
+    assert completed_bodies == [body]
+    # The chunks of the body and their join, where keeping the decoded offers took over ten times the body size
+    assert cached_peak < uncached_peak + 2 * len(body)
+
+
+def test_abandoned_stream_is_not_cached(make_client):
+    cache = LRUResponseCache()
+    client = make_client(cache=cache)
+    offer_stream = iter(client.single_flight_search_stream())
+    next(offer_stream)
+    offer_stream.close()
+
+    assert len(cache) == 0
@@ -0,0 +1,42 @@
+from fare_matrix import FareMatrix
+from mock_amadeus import generate_flight_offers
+from process_search_results import aggregate_bulk_flight_search
+
+SEARCH_KEY = 'SFO-to-JFK (2025-03-01/2025-03-08)'
+
+
+def _two_groups(first: dict, second: dict) -> list[dict]:
+    # Both directions of a dual-direction search, whose responses reuse offer ids under the same search key
+    return [{SEARCH_KEY: first}, {SEARCH_KEY: second}]
+
+
+def test_offers_of_search_groups_sharing_a_search_key_are_kept_apart():
+    responses = _two_groups(generate_flight_offers(return_date='2025-03-08', num_offers=10, seed=1),
+                            generate_flight_offers(return_date='2025-03-08', num_offers=10, seed=2))
+
+    fare_matrix = FareMatrix(aggregate_bulk_flight_search(responses, deduplicate=False))
+
+    assert len(fare_matrix.results) == 20
+
+
+def test_max_stops_is_checked_per_offer_of_each_search_group():
+    responses = _two_groups(
+        generate_flight_offers(return_date='2025-03-08', num_offers=10, segments_per_itinerary=(1,), seed=1),
+        generate_flight_offers(return_date='2025-03-08', num_offers=10, segments_per_itinerary=(3,), seed=2))
+
+    fare_matrix = FareMatrix(aggregate_bulk_flight_search(responses, deduplicate=False), max_stops=0)
+
+    assert len(fare_matrix.results) == 10
+    assert (fare_matrix.results['search_group'] == 0).all()
+
+
+def test_price_grid_holds_the_cheapest_fare_per_date_pair():
+    responses = [{SEARCH_KEY: generate_flight_offers(return_date='2025-03-08', num_offers=10),
+                  'SFO-to-JFK (2025-03-02/2025-03-09)': generate_flight_offers(
+                      departure_date='2025-03-02', return_date='2025-03-09', num_offers=10, seed=1)}]
+    results = aggregate_bulk_flight_search(responses)
+
+    fare_matrix = FareMatrix(results)
+
+    assert fare_matrix.price_grid.stack().tolist() == results.groupby('search_key', observed=True)['total_price'].min().tolist()
+    assert fare_matrix.cheapest_pair() == tuple(fare_matrix.price_grid.stack().idxmin())
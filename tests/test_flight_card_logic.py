@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from flight_card_logic import leg_duration, sort_flight_cards
+from flight_info import Fare, Segment
+
+
+def _segment(price: str, origin: str, departure: str, destination: str, arrival: str, itinerary_hours: int) -> Segment:
+    departure_time, arrival_time = datetime.fromisoformat(departure), datetime.fromisoformat(arrival)
+    return Segment(fare=Fare(price=Decimal(price), currency='USD', bookable_seats=9),
+                   total_duration=timedelta(hours=itinerary_hours), segment_id='1', departure_airport=origin,
+                   departure_time=departure_time, arrival_airport=destination, arrival_time=arrival_time,
+                   carrier_code='UA', flight_number='1', aircraft_code='738', stops=0,
+                   flight_duration=arrival_time - departure_time, cabin_type='ECONOMY')
+
+
+# A 5h itinerary split into two legs at a major stop (ORD), 2h of flights each and an hour at ORD in between
+SPLIT_CARD = {'leg_1': [_segment('300', 'SFO', '2025-03-01T08:00', 'ORD', '2025-03-01T10:00', 5)],
+              'leg_2': [_segment('300', 'ORD', '2025-03-01T11:00', 'JFK', '2025-03-01T13:00', 5)]}
+NONSTOP_CARD = {'leg_1': [_segment('400', 'SFO', '2025-03-01T08:00', 'JFK', '2025-03-01T14:00', 6)]}
+ONE_STOP_CARD = {'leg_1': [_segment('200', 'SFO', '2025-03-01T08:00', 'DEN', '2025-03-01T10:30', 7),
+                           _segment('200', 'DEN', '2025-03-01T12:00', 'JFK', '2025-03-01T15:00', 7)]}
+
+
+def test_leg_duration_counts_flights_and_connections():
+    assert leg_duration(ONE_STOP_CARD['leg_1']) == timedelta(hours=7)
+    assert leg_duration(SPLIT_CARD['leg_1']) == timedelta(hours=2)
+
+
+def test_cards_are_sorted_by_price():
+    assert sort_flight_cards([NONSTOP_CARD, SPLIT_CARD, ONE_STOP_CARD], 'Price') == [ONE_STOP_CARD, SPLIT_CARD,
+                                                                                   NONSTOP_CARD]
+
+
+def test_duration_sort_counts_an_itinerary_split_into_legs_once():
+    assert sort_flight_cards([ONE_STOP_CARD, NONSTOP_CARD, SPLIT_CARD], 'Duration') == [SPLIT_CARD, NONSTOP_CARD,
+                                                                                      ONE_STOP_CARD]
+
+
+def test_stops_sort_breaks_ties_by_price():
+    assert sort_flight_cards([NONSTOP_CARD, ONE_STOP_CARD, SPLIT_CARD], 'Stops') == [SPLIT_CARD, NONSTOP_CARD,
+                                                                                   ONE_STOP_CARD]
+
+
+def test_unknown_sort_option_is_rejected():
+    with pytest.raises(ValueError):
+        sort_flight_cards([NONSTOP_CARD], 'Airline')
+
+
+def _flight_cards_app():
+    from flight_card_logic import display_flight_cards
+    from mock_amadeus import generate_flight_offers
+    from parse_flight_offers import get_flight_offers
+
+    offers = get_flight_offers(generate_flight_offers(num_offers=25))
+    display_flight_cards([{'leg_1': list(offer.itineraries[0].segments)} for offer in offers], carriers={})
+
+
+def test_cards_are_shown_a_page_at_a_time():
+    app = AppTest.from_function(_flight_cards_app).run()
+    app.selectbox(key='results_page_size').set_value(10).run()
+    assert app.caption[0].value == "Showing 10 of 25 flights"
+
+    app.button(key='results_load_more').click().run()
+    assert app.caption[0].value == "Showing 20 of 25 flights"
+
+    app.button(key='results_load_more').click().run()
+    assert app.caption[0].value == "Showing 25 of 25 flights"
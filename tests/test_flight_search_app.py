@@ -0,0 +1,61 @@
+from flight_search_app import expand_major_stops, get_city_airports, group_offers_by_major_stop
+from mock_amadeus import generate_flight_offers
+from parse_flight_offers import get_flight_offers
+
+LOCATIONS = {code: {'cityCode': city_code, 'countryCode': 'US'} for code, city_code in
+             {'SFO': 'SFO', 'OAK': 'SFO', 'JFK': 'NYC', 'LGA': 'NYC', 'EWR': 'NYC', 'ORD': 'CHI', 'DEN': 'DEN'}.items()}
+
+
+def _offer(*itineraries: list[str]):
+    """Parses a single offer whose itineraries fly through the given airports, e.g. ['SFO', 'ORD', 'JFK']."""
+    flight_results = generate_flight_offers(num_offers=1, multi_city=[(airports[0], airports[-1], '2025-03-01')
+                                                                      for airports in itineraries],
+                                            segments_per_itinerary=tuple(len(airports) - 1
+                                                                         for airports in itineraries))
+    for itinerary, airports in zip(flight_results['data'][0]['itineraries'], itineraries):
+        for segment, origin, destination in zip(itinerary['segments'], airports, airports[1:]):
+            segment['departure']['iataCode'], segment['arrival']['iataCode'] = origin, destination
+    return get_flight_offers(flight_results)[0]
+
+
+def _leg_routes(flight_legs) -> list[list[str]]:
+    return [[leg[0].departure_airport] + [segment.arrival_airport for segment in leg] for leg in flight_legs.values()]
+
+
+def test_city_airports_index_every_co_located_airport():
+    city_airports = get_city_airports(LOCATIONS)
+
+    assert city_airports['NYC'] == frozenset({'JFK', 'LGA', 'EWR'})
+    assert city_airports['SFO'] == frozenset({'SFO', 'OAK'})
+
+
+def test_major_stops_expand_to_every_airport_of_their_city():
+    major_stops = expand_major_stops(['SFO', 'JFK'], get_city_airports(LOCATIONS), LOCATIONS)
+
+    assert major_stops == frozenset({'SFO', 'OAK', 'JFK', 'LGA', 'EWR'})
+
+
+def test_round_trip_is_split_per_itinerary():
+    offer = _offer(['SFO', 'ORD', 'JFK'], ['JFK', 'DEN', 'SFO'])
+
+    [flight_legs] = group_offers_by_major_stop([offer], frozenset({'SFO', 'JFK'}))
+
+    assert _leg_routes(flight_legs) == [['SFO', 'ORD', 'JFK'], ['JFK', 'DEN', 'SFO']]
+
+
+def test_leg_closes_at_a_co_located_airport():
+    offer = _offer(['SFO', 'LGA', 'ORD'])
+    major_stops = expand_major_stops(['SFO', 'JFK'], get_city_airports(LOCATIONS), LOCATIONS)
+
+    [flight_legs] = group_offers_by_major_stop([offer], major_stops)
+
+    assert _leg_routes(flight_legs) == [['SFO', 'LGA'], ['LGA', 'ORD']]
+
+
+def test_itinerary_ending_away_from_the_major_stops_is_its_own_leg():
+    offer = _offer(['SFO', 'ORD', 'DEN'], ['DEN', 'JFK'])
+
+    [flight_legs] = group_offers_by_major_stop([offer], frozenset({'SFO', 'JFK'}))
+
+    assert _leg_routes(flight_legs) == [['SFO', 'ORD', 'DEN'], ['DEN', 'JFK']]
+    assert list(flight_legs) == ['leg_1', 'leg_2']
@@ -0,0 +1,49 @@
+from collections import namedtuple
+import pytest
+
+from airport_index import AirportIndex
+from geocoding import CityGeocoder
+from nearby_airport_suggestions import NearbyAirportSuggestions
+
+Location = namedtuple('Location', ['latitude', 'longitude'])
+
+
+class RecordingGeocoder:
+    """Remote geocoder stand-in that places every city at the same coordinates and records the lookups."""
+    def __init__(self, location: Location):
+        self.location = location
+        self.queries = []
+
+    def geocode(self, city: str) -> Location:
+        self.queries.append(city)
+        return self.location
+
+
+@pytest.fixture(scope='module')
+def airport_index():
+    return AirportIndex.load()
+
+
+@pytest.mark.parametrize('user_input, expected_iata_codes', [
+    ('PARIS', {'CDG', 'ORY'}),
+    ('London', {'LHR', 'STN'}),
+])
+def test_city_resolves_to_its_large_airports(airport_index, user_input, expected_iata_codes):
+    suggestions = NearbyAirportSuggestions(user_input, airport_index).fetch_airport_suggestions()
+
+    assert expected_iata_codes <= set(suggestions.values())
+
+
+def test_districts_resolve_to_the_city(airport_index):
+    assert (airport_index.municipality_centroid("Paris (Orly, Val-de-Marne)")
+            == airport_index.municipality_centroid('Paris'))
+
+
+def test_city_without_a_large_airport_goes_to_the_remote_geocoder(airport_index):
+    remote_geocoder = RecordingGeocoder(Location(38.44, -122.71))
+    geocoder = CityGeocoder(airport_index, remote_geocoder=remote_geocoder)
+
+    assert geocoder.geocode('Santa Rosa') == (38.44, -122.71)
+    assert geocoder.geocode('Santa Rosa') == (38.44, -122.71)
+    assert geocoder.geocode('Tokyo') != (38.44, -122.71)
+    assert remote_geocoder.queries == ['Santa Rosa']
@@ -0,0 +1,113 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from mock_amadeus import generate_flight_offers
+from parse_flight_offers import (COMMON_DURATIONS, ParsedDurations, deduplicate_flight_offers, get_flight_offers,
+                                 offer_fingerprint, parse_duration)
+from process_search_results import aggregate_bulk_segments, create_segments_table, deduplicate_offers
+
+
+def _fingerprints_by_offer(segments_table) -> dict[str, int]:
+    return dict(zip(segments_table['offer_id'], segments_table['fingerprint']))
+
+
+def test_parse_duration():
+    assert parse_duration('PT2H35M') == timedelta(hours=2, minutes=35)
+    assert parse_duration('P1DT3H') == timedelta(days=1, hours=3)
+    assert parse_duration('PT45M') == timedelta(minutes=45)
+
+
+def test_common_durations_match_their_parse():
+    assert all(parse_duration(duration) == parsed for duration, parsed in COMMON_DURATIONS.items())
+
+
+def test_durations_missing_from_the_common_ones_are_parsed():
+    durations = ParsedDurations()
+
+    assert durations['PT27H10M'] == timedelta(hours=27, minutes=10)
+    assert durations['P1DT3H'] == timedelta(days=1, hours=3)
+
+
+def test_offers_of_a_response_share_parsed_values():
+    flight_results = generate_flight_offers(num_offers=2)
+    first_segments, second_segments = (offer['itineraries'][0]['segments'] for offer in flight_results['data'])
+    # The second offer sells the first offer's first flight again
+    second_segments[0] = dict(first_segments[0], id=second_segments[0]['id'])
+
+    first, second = get_flight_offers(flight_results)
+
+    assert second.segments[0].departure_time is first.segments[0].departure_time
+    assert second.segments[0].flight_duration is first.segments[0].flight_duration
+
+
+def test_offers_are_parsed_into_typed_fields():
+    flight_results = generate_flight_offers(return_date='2025-03-08', num_offers=5, num_travelers=2)
+    offer = get_flight_offers(flight_results)[0]
+    raw_offer = flight_results['data'][0]
+
+    assert offer.fare.price == Decimal(raw_offer['price']['total'])
+    assert offer.fare.traveler_count == 2
+    assert len(offer.itineraries) == 2
+    assert all(segment.fare is offer.fare for segment in offer.segments)
+    assert offer.segments[0].departure_time.isoformat() == raw_offer['itineraries'][0]['segments'][0]['departure']['at']
+
+
+def test_cabin_type_combines_every_traveler():
+    flight_results = generate_flight_offers(num_offers=1, num_travelers=2, segments_per_itinerary=(2,))
+    flight_results['data'][0]['travelerPricings'][1]['fareDetailsBySegment'][1]['cabin'] = 'BUSINESS'
+    cabin = flight_results['data'][0]['travelerPricings'][0]['fareDetailsBySegment'][1]['cabin']
+
+    offer = get_flight_offers(flight_results)[0]
+
+    assert offer.segments[1].cabin_type == '/'.join(dict.fromkeys([cabin, 'BUSINESS']))
+
+
+def test_cabin_type_is_taken_from_any_traveler_listing_one():
+    flight_results = generate_flight_offers(num_offers=1, num_travelers=2, segments_per_itinerary=(2,))
+    flight_results['data'][0]['travelerPricings'][0]['fareDetailsBySegment'][0].pop('cabin')
+    cabin = flight_results['data'][0]['travelerPricings'][1]['fareDetailsBySegment'][0]['cabin']
+
+    offer = get_flight_offers(flight_results)[0]
+
+    assert offer.segments[0].cabin_type == cabin
+
+
+def test_fingerprints_match_between_the_object_and_columnar_pipelines():
+    flight_results = generate_flight_offers(return_date='2025-03-08', num_offers=50, num_travelers=2)
+    # An offer without cabins, which the object model shows as a placeholder and the table stores as missing
+    for fare_details in flight_results['data'][3]['travelerPricings'][0]['fareDetailsBySegment']:
+        fare_details.pop('cabin')
+    for traveler_pricing in flight_results['data'][4]['travelerPricings']:
+        for fare_details in traveler_pricing['fareDetailsBySegment']:
+            fare_details.pop('cabin')
+
+    offer_fingerprints = {offer.offer_id: offer_fingerprint(offer) for offer in get_flight_offers(flight_results)}
+
+    assert offer_fingerprints == _fingerprints_by_offer(create_segments_table(flight_results))
+
+
+def test_fingerprint_ignores_offer_ids_and_prices():
+    flight_results = generate_flight_offers(num_offers=10)
+    repriced_results = generate_flight_offers(num_offers=10)
+    for offer in repriced_results['data']:
+        offer['id'] = f"repriced-{offer['id']}"
+        offer['price']['total'] = str(float(offer['price']['total']) + 10)
+
+    assert ([offer_fingerprint(offer) for offer in get_flight_offers(flight_results)]
+            == [offer_fingerprint(offer) for offer in get_flight_offers(repriced_results)])
+
+
+def test_deduplication_agrees_between_the_object_and_columnar_pipelines():
+    first = generate_flight_offers(return_date='2025-03-08', num_offers=30, seed=1)
+    second = generate_flight_offers(return_date='2025-03-08', num_offers=30, seed=1)
+    for offer in second['data'][::2]:
+        offer['price']['total'] = f"{float(offer['price']['total']) - 5:.2f}"
+    bulk_responses = [{'SFO-to-JFK (2025-03-01/2025-03-08)': first}, {'SFO-to-JFK (2025-03-01/2025-03-08)': second}]
+
+    unique_offers = deduplicate_flight_offers(get_flight_offers(first) + get_flight_offers(second))
+    deduplicated = deduplicate_offers(aggregate_bulk_segments(bulk_responses)).drop_duplicates('fingerprint')
+
+    assert len(unique_offers) == len(deduplicated) == 30
+    assert ({offer_fingerprint(offer): float(offer.fare.price) for offer in unique_offers}
+            == dict(zip(deduplicated['fingerprint'], deduplicated['total_price'])))
+    assert (deduplicated['num_observations'] == 2).all()
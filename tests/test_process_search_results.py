@@ -0,0 +1,44 @@
+import pandas as pd
+
+from mock_amadeus import generate_flight_offers
+from process_search_results import aggregate_bulk_flight_search, aggregate_bulk_segments, \
+    aggregate_bulk_segments_arrow, create_segments_table
+
+BULK_RESPONSES = [{
+    'SFO-to-JFK (2025-03-01/2025-03-08)': generate_flight_offers(return_date='2025-03-08', num_offers=20),
+    'SFO-to-JFK (2025-03-02/None)': generate_flight_offers(departure_date='2025-03-02', num_offers=10, seed=1),
+}]
+
+
+def test_segments_table_has_one_row_per_segment():
+    flight_results = generate_flight_offers(return_date='2025-03-08', num_offers=20)
+    segments_table = create_segments_table(flight_results)
+
+    assert len(segments_table) == sum(len(itinerary['segments']) for offer in flight_results['data']
+                                      for itinerary in offer['itineraries'])
+    first_segment = flight_results['data'][0]['itineraries'][0]['segments'][0]
+    assert segments_table['arrival_time'].iloc[0] == pd.Timestamp(first_segment['arrival']['at'])
+
+
+def test_bulk_aggregation_tags_the_queried_dates():
+    results = aggregate_bulk_flight_search(BULK_RESPONSES, deduplicate=False)
+
+    one_way = results[results['search_key'] == 'SFO-to-JFK (2025-03-02/None)']
+    assert len(results) == 20 * 2 + 10
+    assert (one_way['query_departure_date'] == pd.Timestamp('2025-03-02')).all()
+    assert one_way['query_return_date'].isna().all()
+
+
+def test_bulk_aggregation_of_empty_responses_is_empty():
+    results = aggregate_bulk_flight_search([{'SFO-to-JFK (2025-03-01/None)': {'data': []}}])
+
+    assert results.empty
+
+
+def test_arrow_table_matches_the_pandas_table():
+    segments_table = aggregate_bulk_segments(BULK_RESPONSES)
+    arrow_table = aggregate_bulk_segments_arrow(BULK_RESPONSES).to_pandas()
+
+    assert list(arrow_table.columns) == list(segments_table.columns)
+    for column in segments_table.columns:
+        assert (arrow_table[column].astype(str) == segments_table[column].astype(str)).all(), column
@@ -0,0 +1,107 @@
+import time
+import pytest
+
+from response_cache import LRUResponseCache, ResponseCache, SQLiteResponseCache
+
+SEARCH_PATH = '/v2/shopping/flight-offers?'
+
+
+@pytest.fixture(params=['lru', 'sqlite'])
+def make_cache(request, tmp_path):
+    def make_cache(**kwargs) -> ResponseCache:
+        if request.param == 'lru':
+            return LRUResponseCache(**kwargs)
+        return SQLiteResponseCache(str(tmp_path / 'responses.sqlite'), **kwargs)
+    return make_cache
+
+
+def test_key_ignores_parameter_order():
+    assert (ResponseCache.make_key(f"https://api.amadeus.com{SEARCH_PATH}&adults=1&originLocationCode=SFO")
+            == ResponseCache.make_key(f"https://api.amadeus.com{SEARCH_PATH}originLocationCode=SFO&adults=1"))
+
+
+def test_key_keeps_the_host():
+    query = 'originLocationCode=SFO&destinationLocationCode=JFK&departureDate=2025-03-01&adults=1'
+    keys = {ResponseCache.make_key(f"{host}{SEARCH_PATH}{query}")
+            for host in ('https://test.api.amadeus.com', 'https://api.amadeus.com', 'http://127.0.0.1:8080')}
+    assert len(keys) == 3
+
+
+def test_hits_and_misses_are_counted(make_cache):
+    cache = make_cache()
+    cache.set('a', {'data': [1]})
+
+    assert cache.get('a') == {'data': [1]}
+    assert cache.get('b') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_entries_expire_after_their_ttl(make_cache):
+    cache = make_cache(ttl_seconds=0.05)
+    cache.set('a', {'data': [1]})
+    cache.set('b', {'data': [2]}, ttl_seconds=60)
+    time.sleep(0.1)
+
+    assert cache.get('a') is None
+    assert cache.get('b') == {'data': [2]}
+
+
+def test_least_recently_used_entry_is_evicted(make_cache):
+    cache = make_cache(max_entries=2)
+    cache.set('a', {'data': [1]})
+    time.sleep(0.01)
+    cache.set('b', {'data': [2]})
+    time.sleep(0.01)
+    cache.get('a')
+    time.sleep(0.01)
+    cache.set('c', {'data': [3]})
+
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == {'data': [1]}
+    assert cache.get('c') == {'data': [3]}
+
+
+def test_mutating_a_response_leaves_the_cache_intact(make_cache):
+    cache = make_cache()
+    response = {'data': [{'id': '1'}]}
+    cache.set('a', response)
+    response['data'].clear()
+    cache.get('a')['data'].append({'id': '2'})
+
+    assert cache.get('a') == {'data': [{'id': '1'}]}
+
+
+def test_backend_missing_a_method_fails_when_created():
+    class IncompleteResponseCache(ResponseCache):
+        def _get(self, key: str) -> bytes | None:
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteResponseCache()
+
+
+def test_serialized_responses_are_stored_as_is(make_cache):
+    cache = make_cache()
+    cache.set_serialized('a', b'{"data": [1]}')
+
+    assert cache.get('a') == {'data': [1]}
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'responses.sqlite')
+    SQLiteResponseCache(path).set('a', {'data': [1]})
+
+    assert SQLiteResponseCache(path).get('a') == {'data': [1]}
+
+
+def test_find_flights_reads_through_the_cache(make_client, mock_server):
+    cache = LRUResponseCache()
+    client = make_client(cache=cache)
+
+    first = client.single_flight_search()
+    second = client.single_flight_search()
+
+    assert first == second
+    assert mock_server.request_counts['flight_offers'] == 1
+    assert cache.stats() == {'hits': 1, 'misses': 1}
@@ -0,0 +1,17 @@
+from mock_amadeus import generate_flight_offers
+from process_search_results import store_bulk_results
+from result_store import FlightResultStore
+
+
+def test_max_stops_applies_to_every_itinerary_of_an_offer(tmp_path):
+    # Cycling (1, 1, 2) segments gives nonstop round trips and ones with a single one-stop itinerary
+    flight_results = generate_flight_offers(return_date='2025-03-08', num_offers=30, segments_per_itinerary=(1, 1, 2))
+    store_bulk_results([{'SFO-to-JFK (2025-03-01/2025-03-08)': flight_results}], root=str(tmp_path),
+                       deduplicate=False)
+
+    nonstop = FlightResultStore(str(tmp_path)).query(route='SFO-JFK', max_stops=0)
+
+    nonstop_offer_ids = {offer['id'] for offer in flight_results['data']
+                         if all(len(itinerary['segments']) == 1 for itinerary in offer['itineraries'])}
+    assert set(nonstop['offer_id']) == nonstop_offer_ids
+    assert (nonstop.groupby('offer_id').size() == 2).all()
@@ -0,0 +1,85 @@
+from urllib.parse import parse_qsl, urlsplit
+import pytest
+
+from AmadeusClient import AmadeusAPIError, AmadeusFlightSearch
+from mock_amadeus import generate_flight_offers
+from route_matrix import RouteMatrixSearch
+
+ORIGINS = ['SFO', 'OAK', 'SJC']
+DESTINATIONS = ['JFK', 'EWR']
+# Cheapest fare of every airport pair, None for pairs without any flight
+PAIR_FARES = {('SFO', 'JFK'): 100, ('SFO', 'EWR'): None, ('OAK', 'JFK'): 200, ('OAK', 'EWR'): 1000,
+              ('SJC', 'JFK'): 120, ('SJC', 'EWR'): 'error'}
+
+
+class PricedFlightSearch(AmadeusFlightSearch):
+    """Answers every search with three offers from the cheapest fare of its airport pair, without a request."""
+    def find_flights(self, url: str) -> dict:
+        params = dict(parse_qsl(urlsplit(url).query))
+        origin, destination = params['originLocationCode'], params['destinationLocationCode']
+        fare = PAIR_FARES[(origin, destination)]
+        if fare == 'error':
+            raise AmadeusAPIError(f"No service between {origin} and {destination}")
+        flight_results = generate_flight_offers(origin=origin, destination=destination,
+                                                departure_date=params['departureDate'],
+                                                return_date=params['returnDate'], num_offers=0 if fare is None else 3,
+                                                seed=list(PAIR_FARES).index((origin, destination)))
+        for i, offer in enumerate(flight_results['data']):
+            offer['price']['total'] = f"{fare + i:.2f}"
+        return flight_results
+
+
+@pytest.fixture
+def make_route_matrix(make_client):
+    def make_route_matrix(**kwargs) -> RouteMatrixSearch:
+        # A single worker runs the searches in submission order, so the pruning decisions are deterministic
+        client = make_client(PricedFlightSearch, search_range=2, direction='later', max_workers=1)
+        return RouteMatrixSearch(client, ORIGINS, DESTINATIONS, **kwargs)
+    return make_route_matrix
+
+
+def test_pairs_that_cant_enter_the_top_fares_are_pruned_after_their_probe(make_route_matrix):
+    route_matrix = make_route_matrix(top_k=3)
+    responses = route_matrix.run()
+
+    # OAK-JFK and OAK-EWR can't get below the third cheapest fare (102) even 25% cheaper on the other dates
+    assert route_matrix.pruned_pairs == {('SFO', 'EWR'), ('OAK', 'JFK'), ('OAK', 'EWR')}
+    assert route_matrix.num_searches == 6 + 2 * 2
+    assert len(route_matrix.skipped_searches) == 2 * 2
+    assert ({key.split(' ')[0] for key, response in responses.items() if response['data']}
+            == {'SFO-to-JFK', 'SJC-to-JFK', 'OAK-to-JFK', 'OAK-to-EWR'})
+
+
+def test_a_larger_date_discount_keeps_more_pairs(make_route_matrix):
+    route_matrix = make_route_matrix(top_k=3, max_date_discount=0.6)
+    route_matrix.run()
+
+    assert route_matrix.pruned_pairs == {('SFO', 'EWR'), ('OAK', 'EWR')}
+
+
+def test_failed_searches_are_recorded_without_stopping_the_grid(make_route_matrix):
+    route_matrix = make_route_matrix()
+    responses = route_matrix.run()
+
+    assert list(route_matrix.failed_searches) == ['SJC-to-EWR (2025-03-01/2025-03-08)']
+    assert not any(key.startswith('SJC-to-EWR') for key in responses)
+
+
+def test_searches_stop_at_the_request_budget(make_route_matrix):
+    route_matrix = make_route_matrix(max_requests=4)
+    responses = route_matrix.run()
+
+    assert route_matrix.num_searches == 4
+    assert len(responses) + len(route_matrix.failed_searches) == 4
+    # Both SJC probes, then the other dates of the three pairs whose probe had offers
+    assert len(route_matrix.skipped_searches) == 2 + 3 * 2
+
+
+def test_results_are_ranked_by_price_and_tagged_by_airport_pair(make_route_matrix):
+    route_matrix = make_route_matrix(top_k=3)
+    results = route_matrix.ranked_results(route_matrix.run())
+
+    assert results['total_price'].is_monotonic_increasing
+    assert results['airport_pair'].iloc[0] == 'SFO-JFK'
+    assert set(results['airport_pair']) == {'SFO-JFK', 'SJC-JFK', 'OAK-JFK', 'OAK-EWR'}
+    assert route_matrix.pair_summary()['min_price'].iloc[0] == 100
@@ -0,0 +1,155 @@
+import socket
+import urllib.request
+import pytest
+
+import serialization
+import tracing
+from response_cache import LRUResponseCache
+
+
+@pytest.fixture
+def enable_tracing():
+    def enable_tracing(**kwargs) -> None:
+        tracing.reset()
+        tracing.enable(**kwargs)
+    yield enable_tracing
+    tracing.disable()
+    tracing.reset()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_disabled_tracing_records_nothing():
+    tracing.reset()
+    with tracing.span('search') as span:
+        span.set(num_offers=20)
+    tracing.increment('api_requests', status=200)
+
+    assert tracing.recent_spans() == []
+    assert tracing.counters() == {}
+
+
+def test_nested_spans_share_the_trace_of_their_parent(enable_tracing):
+    enable_tracing()
+    with tracing.span('search'):
+        with tracing.span('decode', num_bytes=10) as decode:
+            decode.set(num_offers=2)
+    with tracing.span('render'):
+        pass
+
+    decode, search, render = tracing.recent_spans()
+    assert (search['name'], decode['name'], render['name']) == ('search', 'decode', 'render')
+    assert search['parent_id'] is None and search['trace_id'] == search['span_id']
+    assert decode['parent_id'] == search['span_id'] and decode['trace_id'] == search['trace_id']
+    assert render['parent_id'] is None and render['trace_id'] != search['trace_id']
+    assert (decode['num_bytes'], decode['num_offers']) == (10, 2)
+
+
+def test_failed_span_records_the_error(enable_tracing):
+    enable_tracing()
+    with pytest.raises(KeyError):
+        with tracing.span('parse'):
+            raise KeyError('data')
+
+    assert tracing.recent_spans()[0]['error'] == 'KeyError'
+
+
+def test_traced_function_is_named_after_itself(enable_tracing):
+    @tracing.traced()
+    def group_cards():
+        return 1
+
+    enable_tracing()
+    assert group_cards() == 1
+    assert tracing.recent_spans()[0]['name'].endswith('<locals>.group_cards')
+
+
+def test_counters_add_up_per_label_set(enable_tracing):
+    enable_tracing()
+    tracing.increment('api_requests', status=200, method='GET')
+    tracing.increment('api_requests', method='GET', status=200)
+    tracing.increment('api_requests', method='GET', status=429)
+    tracing.increment('payload_bytes', 1024)
+
+    assert tracing.counters() == {
+        ('api_requests', (('method', 'GET'), ('status', 200))): 2,
+        ('api_requests', (('method', 'GET'), ('status', 429))): 1,
+        ('payload_bytes', ()): 1024,
+    }
+
+
+def test_spans_are_appended_to_the_log(enable_tracing, tmp_path):
+    log_path = tmp_path / 'traces' / 'spans.jsonl'
+    enable_tracing(log_path=str(log_path))
+    with tracing.span('search', origin='SFO'):
+        pass
+    with tracing.span('render'):
+        pass
+
+    records = [serialization.loads(line) for line in log_path.read_bytes().splitlines()]
+    assert [record['name'] for record in records] == ['search', 'render']
+    assert records[0]['origin'] == 'SFO'
+
+
+def test_prometheus_text_exports_counters_and_span_totals(enable_tracing):
+    enable_tracing()
+    tracing.increment('api_requests', method='GET', status=200)
+    tracing.increment('api_requests', method='GET', status=200)
+    tracing.increment('cache_lookups', hit=True)
+    tracing.increment('cache_lookups')
+    for _ in range(3):
+        with tracing.span('amadeus.find_flights'):
+            pass
+
+    text = tracing.prometheus_text()
+
+    assert 'travel_app_api_requests_total{method="GET",status="200"} 2.0' in text
+    # Label sets differing between increments of a counter are exported with the missing labels empty
+    assert 'travel_app_cache_lookups_total{hit="True"} 1.0' in text
+    assert 'travel_app_cache_lookups_total{hit=""} 1.0' in text
+    assert 'travel_app_span_seconds_count{span="amadeus.find_flights"} 3.0' in text
+    assert 'travel_app_span_seconds_sum{span="amadeus.find_flights"}' in text
+
+
+def test_reset_clears_the_export(enable_tracing):
+    enable_tracing()
+    tracing.increment('api_requests', status=200)
+    with tracing.span('search'):
+        pass
+    tracing.reset()
+
+    assert tracing.prometheus_text() == ''
+
+
+def test_metrics_server_serves_the_export_once_per_process(enable_tracing):
+    enable_tracing()
+    tracing.increment('payload_bytes', 512)
+    port = _free_port()
+    server = tracing.start_metrics_server(port)
+    try:
+        assert tracing.start_metrics_server(_free_port()) is server
+        assert server.server_address == ('127.0.0.1', port)
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert 'travel_app_payload_bytes_total 512.0' in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+        tracing._metrics_server = None
+
+
+def test_client_counts_its_requests_and_cache_lookups(enable_tracing, make_client):
+    client = make_client(cache=LRUResponseCache())
+    enable_tracing()
+    client.single_flight_search()
+    client.single_flight_search()
+
+    counters = tracing.counters()
+    assert counters[('api_requests', (('method', 'GET'), ('status', 200)))] == 1
+    assert counters[('cache_lookups', (('hit', False),))] == 1
+    assert counters[('cache_lookups', (('hit', True),))] == 1
+    assert counters[('payload_bytes', ())] > 0
+    assert 'amadeus.find_flights' in {record['name'] for record in tracing.recent_spans()}
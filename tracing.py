@@ -0,0 +1,259 @@
+import cProfile
+import functools
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from wsgiref.simple_server import WSGIServer
+from prometheus_client import CollectorRegistry, generate_latest, start_http_server
+from prometheus_client.core import CounterMetricFamily, SummaryMetricFamily
+
+import serialization
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# Tracing is off unless TRAVEL_APP_TRACING is set or `enable` is called, a disabled span is one global lookup
+TRACING_ENV_VAR = 'TRAVEL_APP_TRACING'
+TRACE_LOG_ENV_VAR = 'TRAVEL_APP_TRACE_LOG'
+METRICS_PORT_ENV_VAR = 'TRAVEL_APP_METRICS_PORT'
+METRICS_PREFIX = 'travel_app'
+MAX_RECENT_SPANS = 2000
+
+_enabled = False
+_log_path = None
+_lock = threading.Lock()
+_local = threading.local()
+_span_ids = itertools.count(1)
+_recent_spans: deque[dict] = deque(maxlen=MAX_RECENT_SPANS)
+_span_totals: dict[str, list[float]] = dict()  # Span name -> [count, total seconds]
+_counters: dict[tuple[str, tuple], float] = dict()
+_metrics_server = None
+
+
+def enable(log_path: str = None) -> None:
+    """
+    Turns tracing on for the whole process.
+    :param log_path: Optional JSON-lines file every finished span is appended to.
+    """
+    global _enabled, _log_path
+    if log_path and os.path.dirname(log_path):
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    _log_path = log_path
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        _recent_spans.clear()
+        _span_totals.clear()
+        _counters.clear()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    Timed section of the pipeline. Spans opened inside another span on the same thread become its children and share
+    its trace id, so a JSON-lines log can be regrouped per search.
+    """
+    __slots__ = ('name', 'attributes', 'span_id', 'parent_id', 'trace_id', 'start', 'started_at')
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes) -> None:
+        """Adds attributes known only once the work ran, e.g. a status code or a payload size."""
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> 'Span':
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        parent = stack[-1] if stack else None
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        stack.append(self)
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        duration = time.perf_counter() - self.start
+        _local.stack.pop()
+        record = {'name': self.name, 'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id,
+                  'started_at': self.started_at, 'duration_seconds': duration, **self.attributes}
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        with _lock:
+            _recent_spans.append(record)
+            totals = _span_totals.setdefault(self.name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += duration
+            if _log_path:
+                with open(_log_path, 'ab') as log:
+                    log.write(serialization.dumps(record) + b'\n')
+
+
+def span(name: str, **attributes) -> Span | _NoopSpan:
+    """
+    Times the enclosed block when tracing is enabled, e.g.
+        with tracing.span('amadeus.decode', num_bytes=len(body)):
+            ...
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def traced(name: str = None):
+    """Decorator timing every call of the function as a span, named after the function by default."""
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, dict()):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    """
+    Adds `value` to a counter, e.g. `increment('api_requests', endpoint='flight_offers', status=200)` or
+    `increment('payload_bytes', len(body))`.
+    """
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def recent_spans() -> list[dict]:
+    with _lock:
+        return list(_recent_spans)
+
+
+def counters() -> dict[tuple[str, tuple], float]:
+    with _lock:
+        return dict(_counters)
+
+
+class _TracingCollector:
+    """Exposes the counters and span totals recorded here to prometheus_client when it is scraped."""
+    def collect(self):
+        with _lock:
+            counter_items = sorted(_counters.items())
+            span_items = sorted(_span_totals.items())
+
+        for counter_name in dict.fromkeys(name for (name, _), _ in counter_items):
+            samples = [(dict(labels), value) for (name, labels), value in counter_items if name == counter_name]
+            # Label sets may differ between increments of the same counter, missing labels are exported empty
+            label_names = list(dict.fromkeys(key for labels, _ in samples for key in labels))
+            family = CounterMetricFamily(f"{METRICS_PREFIX}_{counter_name}", f"Tracing counter {counter_name}.",
+                                         labels=label_names)
+            for labels, value in samples:
+                family.add_metric([str(labels.get(key, '')) for key in label_names], value)
+            yield family
+
+        if span_items:
+            family = SummaryMetricFamily(f"{METRICS_PREFIX}_span_seconds", "Time spent in tracing spans.",
+                                         labels=['span'])
+            for span_name, (count, total) in span_items:
+                family.add_metric([span_name], count_value=count, sum_value=total)
+            yield family
+
+
+_registry = CollectorRegistry()
+_registry.register(_TracingCollector())
+
+
+def prometheus_text() -> str:
+    """Counters and span durations in the Prometheus text exposition format."""
+    return generate_latest(_registry).decode()
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1') -> WSGIServer:
+    """
+    Serves the counters and span durations at http://host:port/metrics from a background thread, once per process.
+    Binds to localhost by default, pass host='0.0.0.0' to expose it to a scraper on another machine.
+    """
+    global _metrics_server
+    with _lock:
+        if _metrics_server is None:
+            _metrics_server, _ = start_http_server(port, addr=host, registry=_registry)
+        return _metrics_server
+
+
+class ProfileCapture:
+    """
+    Opt-in profile of the enclosed block, with pyinstrument when it is installed and cProfile otherwise. The report is
+    available as text once the block exits, e.g.
+        with tracing.ProfileCapture() as capture:
+            run_search()
+        print(capture.report)
+    """
+    def __init__(self, top: int = 30):
+        """
+        :param top: Number of functions listed by cProfile reports.
+        """
+        self.top = top
+        self.report = ''
+        self._profiler = None
+
+    def __enter__(self) -> 'ProfileCapture':
+        if pyinstrument is not None:
+            self._profiler = pyinstrument.Profiler()
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if pyinstrument is not None:
+            self._profiler.stop()
+            self.report = self._profiler.output_text()
+        else:
+            self._profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats('cumulative').print_stats(self.top)
+            self.report = stream.getvalue()
+
+
+if os.environ.get(TRACING_ENV_VAR):
+    enable(log_path=os.environ.get(TRACE_LOG_ENV_VAR))